@@ -0,0 +1,215 @@
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import threading
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        return wd
+
+    def read_events(self, timeout):
+        """Yield (wd, mask, name) tuples, waiting up to timeout seconds for the first"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        buffer = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', errors='replace')
+            offset += length
+            yield wd, mask, name
+
+class DirectoryInventory:
+    """Set of entry names with a given suffix in one directory"""
+
+    def __init__(self, path, suffix):
+        self.path = path
+        self.suffix = suffix
+        self.names = set()
+        self.mtime = None
+        self.watched = False
+
+    def rescan(self):
+        try:
+            self.mtime = os.stat(self.path).st_mtime_ns
+            self.names = {
+                entry[:-len(self.suffix)] for entry in os.listdir(self.path)
+                if entry.endswith(self.suffix)
+            }
+        except FileNotFoundError:
+            self.mtime = None
+            self.names = set()
+
+    def is_stale(self):
+        """Cheap mtime check used when the directory is not watched by inotify"""
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except FileNotFoundError:
+            return self.mtime is not None
+
+    def apply(self, mask, name):
+        """Apply one inotify event; return True if the name set changed"""
+        if not name.endswith(self.suffix):
+            return False
+        key = name[:-len(self.suffix)]
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            if key not in self.names:
+                self.names.add(key)
+                return True
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            if key in self.names:
+                self.names.discard(key)
+                return True
+        return False
+
+class ApacheInventory:
+    """In-memory Apache2 site and module inventory kept current by inotify
+
+    Directories are watched with inotify and updated incrementally from
+    create/delete/move events. Directories that cannot be watched (missing,
+    or inotify unavailable) fall back to an mtime check on each read. Every
+    inventory carries a content-derived ETag for conditional requests.
+    """
+
+    def __init__(self, config=Config, poll_interval=5.0):
+        self.dirs = {
+            'sites': {
+                'available': DirectoryInventory(config.APACHE2_SITES_AVAILABLE, '.conf'),
+                'enabled': DirectoryInventory(config.APACHE2_SITES_ENABLED, '.conf')
+            },
+            'modules': {
+                'available': DirectoryInventory(config.APACHE2_MODS_AVAILABLE, '.load'),
+                'enabled': DirectoryInventory(config.APACHE2_MODS_ENABLED, '.load')
+            }
+        }
+        self.poll_interval = poll_interval
+        self._snapshots = {}
+        self._watches = {}
+        self._inotify = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def snapshot(self, kind):
+        """Return ({'available': [...], 'enabled': [...]}, etag) for 'sites' or 'modules'"""
+        with self._lock:
+            if not self._started:
+                self._start()
+
+            for directory in self.dirs[kind].values():
+                if not directory.watched and directory.is_stale():
+                    directory.rescan()
+                    self._snapshots.pop(kind, None)
+
+            if kind not in self._snapshots:
+                data = {
+                    state: sorted(directory.names)
+                    for state, directory in self.dirs[kind].items()
+                }
+                digest = hashlib.sha1(json.dumps(data).encode('utf-8')).hexdigest()
+                self._snapshots[kind] = (data, digest)
+
+            return self._snapshots[kind]
+
+    def _start(self):
+        """Initial scan and inotify setup (caller holds the lock)"""
+        self._started = True
+        for directories in self.dirs.values():
+            for directory in directories.values():
+                directory.rescan()
+
+        try:
+            self._inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify unavailable, polling Apache2 directories instead: {e}")
+            return
+
+        self._watch_all()
+        threading.Thread(target=self._watch_loop, name='apache-inventory', daemon=True).start()
+
+    def _watch_all(self):
+        """Add watches for directories not yet watched (caller holds the lock)"""
+        for kind, directories in self.dirs.items():
+            for directory in directories.values():
+                if directory.watched:
+                    continue
+                try:
+                    wd = self._inotify.add_watch(directory.path)
+                except OSError:
+                    continue
+                # Rescan after the watch exists so no change between the two is missed
+                directory.rescan()
+                directory.watched = True
+                self._watches[wd] = (kind, directory)
+                self._snapshots.pop(kind, None)
+
+    def _watch_loop(self):
+        while True:
+            try:
+                events = list(self._inotify.read_events(self.poll_interval))
+            except OSError as e:
+                logger.error(f"inotify read failed: {e}")
+                events = []
+
+            with self._lock:
+                for wd, mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were lost: rescan everything
+                        for kind, directory in self._watches.values():
+                            directory.rescan()
+                            self._snapshots.pop(kind, None)
+                        continue
+
+                    watch = self._watches.get(wd)
+                    if not watch:
+                        continue
+                    kind, directory = watch
+
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        # Directory went away: fall back to polling until it can be watched again
+                        del self._watches[wd]
+                        directory.watched = False
+                        directory.rescan()
+                        self._snapshots.pop(kind, None)
+                    elif directory.apply(mask, name):
+                        self._snapshots.pop(kind, None)
+
+                # Pick up directories that have been created since startup
+                self._watch_all()
@@ -1,42 +1,93 @@
 import base64
 import hashlib
 import hmac
+import secrets
+import threading
 import time
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.exceptions import InvalidKey
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Keys are parsed on first use: loading a private key validates it, which takes ~70 ms
+_UNLOADED = object()
+
 class RSAAuth:
-    def __init__(self, private_key_path=None, public_key_path=None):
+    def __init__(self, private_key_path=None, public_key_path=None, session_ttl=900,
+                 max_age=300, replay_guard=None, require_nonce=False):
         self.private_key_path = private_key_path
         self.public_key_path = public_key_path
-        self.private_key = None
-        self.public_key = None
-        self._load_keys()
+        self._private_key = _UNLOADED
+        self._public_key = _UNLOADED
+        # Keys may be generated in the background while requests load them
+        self._key_lock = threading.RLock()
+        self.max_age = max_age
+        self.replay_guard = replay_guard
+        # Legacy signatures cover the body only, so once the replay window has
+        # passed they can be resent with a new timestamp
+        self.require_nonce = require_nonce
+        self.sessions = SessionKeyStore(ttl=session_ttl)
+    
+    @property
+    def private_key(self):
+        """Private key (client side), read from private_key_path on first use"""
+        key = self._private_key
+        if key is _UNLOADED:
+            with self._key_lock:
+                if self._private_key is _UNLOADED:
+                    # A missing key stays unloaded, so the next call looks again
+                    loaded = self._load_key(self.private_key_path, private=True)
+                    if loaded is None:
+                        return None
+                    self._private_key = loaded
+                key = self._private_key
+        return key
+    
+    @private_key.setter
+    def private_key(self, key):
+        with self._key_lock:
+            self._private_key = key
+    
+    @property
+    def public_key(self):
+        """Public key (agent side), read from public_key_path on first use"""
+        key = self._public_key
+        if key is _UNLOADED:
+            with self._key_lock:
+                if self._public_key is _UNLOADED:
+                    loaded = self._load_key(self.public_key_path, private=False)
+                    if loaded is None:
+                        return None
+                    self._public_key = loaded
+                key = self._public_key
+        return key
+    
+    @public_key.setter
+    def public_key(self, key):
+        with self._key_lock:
+            self._public_key = key
     
-    def _load_keys(self):
-        """Load RSA keys from files"""
+    def _load_key(self, path, private):
+        """Load one RSA key from a PEM file; None if it is missing or unreadable"""
+        from cryptography.hazmat.primitives import serialization
+        
         try:
-            if self.private_key_path and Path(self.private_key_path).exists():
-                with open(self.private_key_path, 'rb') as key_file:
-                    self.private_key = serialization.load_pem_private_key(
-                        key_file.read(),
-                        password=None
-                    )
-            
-            if self.public_key_path and Path(self.public_key_path).exists():
-                with open(self.public_key_path, 'rb') as key_file:
-                    self.public_key = serialization.load_pem_public_key(
-                        key_file.read()
-                    )
+            if not path or not Path(path).exists():
+                return None
+            
+            with open(path, 'rb') as key_file:
+                data = key_file.read()
+            if private:
+                return serialization.load_pem_private_key(data, password=None)
+            return serialization.load_pem_public_key(data)
         except Exception as e:
-            logger.error(f"Failed to load RSA keys: {e}")
+            logger.error(f"Failed to load RSA key {path}: {e}")
+            return None
     
     def generate_key_pair(self, key_size=2048):
         """Generate new RSA key pair"""
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        
         try:
             private_key = rsa.generate_private_key(
                 public_exponent=65537,
@@ -45,27 +96,29 @@ class RSAAuth:
             
             public_key = private_key.public_key()
             
-            # Save private key
-            if self.private_key_path:
-                os.makedirs(os.path.dirname(self.private_key_path), exist_ok=True)
-                with open(self.private_key_path, 'wb') as f:
-                    f.write(private_key.private_bytes(
-                        encoding=serialization.Encoding.PEM,
-                        format=serialization.PrivateFormat.PKCS8,
-                        encryption_algorithm=serialization.NoEncryption()
-                    ))
-            
-            # Save public key
-            if self.public_key_path:
-                os.makedirs(os.path.dirname(self.public_key_path), exist_ok=True)
-                with open(self.public_key_path, 'wb') as f:
-                    f.write(public_key.public_bytes(
-                        encoding=serialization.Encoding.PEM,
-                        format=serialization.PublicFormat.SubjectPublicKeyInfo
-                    ))
-            
-            self.private_key = private_key
-            self.public_key = public_key
+            # Readers wait rather than load a half-written PEM
+            with self._key_lock:
+                # Save private key
+                if self.private_key_path:
+                    os.makedirs(os.path.dirname(self.private_key_path), exist_ok=True)
+                    with open(self.private_key_path, 'wb') as f:
+                        f.write(private_key.private_bytes(
+                            encoding=serialization.Encoding.PEM,
+                            format=serialization.PrivateFormat.PKCS8,
+                            encryption_algorithm=serialization.NoEncryption()
+                        ))
+                
+                # Save public key
+                if self.public_key_path:
+                    os.makedirs(os.path.dirname(self.public_key_path), exist_ok=True)
+                    with open(self.public_key_path, 'wb') as f:
+                        f.write(public_key.public_bytes(
+                            encoding=serialization.Encoding.PEM,
+                            format=serialization.PublicFormat.SubjectPublicKeyInfo
+                        ))
+                
+                self.private_key = private_key
+                self.public_key = public_key
             
             return True
         except Exception as e:
@@ -74,6 +127,9 @@ class RSAAuth:
     
     def verify_signature(self, data, signature):
         """Verify RSA signature"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
         try:
             if not self.public_key:
                 logger.error("Public key not loaded")
@@ -99,6 +155,9 @@ class RSAAuth:
     
     def sign_data(self, data):
         """Sign data with RSA private key"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
         try:
             if not self.private_key:
                 logger.error("Private key not loaded")
@@ -120,9 +179,10 @@ class RSAAuth:
             logger.error(f"Failed to sign data: {e}")
             return None
     
-    def verify_timestamp(self, timestamp, max_age=300):
+    def verify_timestamp(self, timestamp, max_age=None):
         """Verify timestamp to prevent replay attacks"""
         try:
+            max_age = self.max_age if max_age is None else max_age
             current_time = int(time.time())
             request_time = int(timestamp)
             
@@ -135,15 +195,233 @@ class RSAAuth:
             logger.error(f"Timestamp verification failed: {e}")
             return False
     
-    def verify_request(self, data, signature, timestamp):
-        """Verify complete request (signature + timestamp)"""
+    @staticmethod
+    def build_message(data, timestamp=None, nonce=None):
+        """String covered by an RSA signature
+        
+        Legacy clients sign the body only. Clients that send X-Nonce sign
+        timestamp, nonce and body, so neither can be altered on replay.
+        """
+        if nonce is None:
+            return data
+        return f"{timestamp}\n{nonce}\n{data}"
+    
+    def verify_request(self, data, signature, timestamp, nonce=None):
+        """Verify complete request (signature + timestamp, and not seen before)"""
+        if nonce is None and self.require_nonce:
+            logger.warning("Rejected request without a nonce")
+            return False
+        
+        if not self.verify_timestamp(timestamp):
+            return False
+        
+        if not self.verify_signature(self.build_message(data, timestamp, nonce), signature):
+            return False
+        
+        # Only remember requests that carried a valid signature
+        if self.replay_guard and not self.replay_guard.check(signature, timestamp, nonce is not None):
+            logger.warning("Rejected replayed request signature")
+            return False
+        
+        return True
+    
+    def create_session(self):
+        """Issue a session key encrypted to the RSA public key"""
+        try:
+            if not self.public_key:
+                logger.error("Public key not loaded")
+                return None
+            
+            session_id, key, expires_at = self.sessions.create()
+            
+            return {
+                'session_id': session_id,
+                'encrypted_key': self.encrypt_key(key),
+                'expires_at': int(expires_at),
+                'ttl': self.sessions.ttl
+            }
+        except Exception as e:
+            logger.error(f"Failed to create session key: {e}")
+            return None
+    
+    def encrypt_key(self, key):
+        """Encrypt a symmetric key to the RSA public key (RSA-OAEP, SHA-256), base64 encoded"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        encrypted_key = self.public_key.encrypt(
+            key,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+        return base64.b64encode(encrypted_key).decode('utf-8')
+    
+    def open_session(self, encrypted_key):
+        """Decrypt a session key issued by create_session (client side)"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        try:
+            if not self.private_key:
+                logger.error("Private key not loaded")
+                return None
+            
+            return self.private_key.decrypt(
+                base64.b64decode(encrypted_key),
+                padding.OAEP(
+                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                    algorithm=hashes.SHA256(),
+                    label=None
+                )
+            )
+        except Exception as e:
+            logger.error(f"Failed to open session key: {e}")
+            return None
+    
+    def verify_session_request(self, session_id, method, path, data, signature, timestamp, nonce):
+        """Verify an HMAC-signed request made with a session key (a nonce is required)"""
+        if not nonce:
+            logger.warning("Rejected session request without a nonce")
+            return False
+        
         if not self.verify_timestamp(timestamp):
             return False
         
-        if not self.verify_signature(data, signature):
+        message = SessionKeyStore.build_message(method, path, timestamp, data, nonce)
+        if not self.sessions.verify(session_id, message, signature):
+            return False
+        
+        if self.replay_guard and not self.replay_guard.check(signature, timestamp, True):
+            logger.warning("Rejected replayed session request")
+            return False
+        
+        return True
+
+class SessionKeyStore:
+    """Short-lived symmetric session keys negotiated through an RSA-authenticated handshake"""
+    
+    def __init__(self, ttl=900, max_sessions=256):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def build_message(method, path, timestamp, data, nonce):
+        """Canonical string covered by a session HMAC"""
+        return f"{method.upper()}\n{path}\n{timestamp}\n{nonce}\n{data}"
+    
+    @staticmethod
+    def sign(key, message):
+        """HMAC-SHA256 of message, base64 encoded"""
+        digest = hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+        return base64.b64encode(digest).decode('utf-8')
+    
+    def create(self):
+        """Create a new session key and return (session_id, key, expires_at)"""
+        session_id = secrets.token_urlsafe(16)
+        key = secrets.token_bytes(32)
+        expires_at = time.time() + self.ttl
+        
+        with self._lock:
+            self._purge_expired()
+            if len(self._sessions) >= self.max_sessions:
+                # Drop the session closest to expiry to make room
+                oldest = min(self._sessions, key=lambda sid: self._sessions[sid][1])
+                del self._sessions[oldest]
+            self._sessions[session_id] = (key, expires_at)
+        
+        return session_id, key, expires_at
+    
+    def revoke(self, session_id):
+        """Forget a session before it expires"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+    
+    def verify(self, session_id, message, signature):
+        """Verify an HMAC signature made with the session's key"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and session[1] <= time.time():
+                del self._sessions[session_id]
+                session = None
+        
+        if not session:
+            logger.warning("Unknown or expired session key")
             return False
         
+        expected = self.sign(session[0], message)
+        return hmac.compare_digest(expected, signature)
+    
+    def _purge_expired(self):
+        now = time.time()
+        for session_id in [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]:
+            del self._sessions[session_id]
+
+class ReplayGuard:
+    """Remembers accepted request signatures so each signed request is accepted once
+    
+    Signature hashes are grouped into buckets of bucket_seconds by request
+    timestamp. A bucket is dropped whole once every timestamp in it is
+    outside the accepted window, so expiry never scans entries and memory is
+    bounded by request rate x window. Requests whose signature covers the
+    timestamp are checked against their own bucket only; legacy RSA requests
+    (no nonce, unsigned timestamp) are checked against every live bucket, a
+    fixed window / bucket_seconds set lookups.
+    """
+    
+    def __init__(self, window=300, bucket_seconds=30, max_entries=1000000):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self.entries = 0
+        self._buckets = {}
+        self._next_eviction = 0.0
+        self._lock = threading.Lock()
+    
+    def check(self, signature, timestamp, timestamp_signed=False):
+        """Record a signature; False if it was already accepted inside the window
+        
+        When the signature covers the timestamp, a replay must carry the same
+        timestamp, so only that timestamp's bucket needs checking.
+        """
+        # 64-bit keyed SipHash of the signature; the key is random per process
+        digest = hash(signature)
+        bucket = int(timestamp) // self.bucket_seconds
+        
+        with self._lock:
+            now = time.time()
+            if now >= self._next_eviction:
+                self._evict(now)
+            
+            if timestamp_signed:
+                if digest in self._buckets.get(bucket, ()):
+                    return False
+            else:
+                for entries in self._buckets.values():
+                    if digest in entries:
+                        return False
+            
+            if self.entries >= self.max_entries:
+                # Over budget: give up the oldest bucket rather than refuse traffic
+                logger.warning("Replay guard full, dropping oldest bucket early")
+                self._drop(min(self._buckets))
+            
+            self._buckets.setdefault(bucket, set()).add(digest)
+            self.entries += 1
         return True
+    
+    def _evict(self, now):
+        # Bucket b holds timestamps up to (b + 1) * bucket_seconds - 1
+        for bucket in [b for b in self._buckets if (b + 1) * self.bucket_seconds <= now - self.window]:
+            self._drop(bucket)
+        self._next_eviction = (int(now) // self.bucket_seconds + 1) * self.bucket_seconds
+    
+    def _drop(self, bucket):
+        self.entries -= len(self._buckets.pop(bucket))
 
 # Import statements at the top
 import os
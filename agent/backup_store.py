@@ -0,0 +1,119 @@
+import gzip
+import json
+import os
+import threading
+import time
+import logging
+from config import Config
+from managed_config import atomic_write, content_hash
+
+logger = logging.getLogger(__name__)
+
+class BackupStore:
+    """Content-addressed, deduplicated and compressed config snapshots
+
+    Each distinct file content is stored once as objects/<sha[:2]>/<sha>.gz.
+    A JSON index records the version history of every path. Retention keeps
+    the newest BACKUP_KEEP_VERSIONS versions per path, drops versions older
+    than BACKUP_MAX_AGE_DAYS (always keeping the newest), and removes
+    objects no longer referenced by any path.
+    """
+
+    def __init__(self, root=None, keep_versions=None, max_age_days=None):
+        self.root = root or Config.BACKUP_DIR
+        self.keep_versions = keep_versions or Config.BACKUP_KEEP_VERSIONS
+        self.max_age_days = Config.BACKUP_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.index_path = os.path.join(self.root, 'index.json')
+        self._lock = threading.Lock()
+        self._index = None
+
+    def snapshot(self, path, data=None, reason=None):
+        """Record the current (or given) content of path; returns the version entry or None"""
+        if data is None:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+
+        digest = content_hash(data)
+        with self._lock:
+            index = self._load_index()
+            self._store_object(digest, data)
+
+            versions = index.setdefault(path, [])
+            if versions and versions[-1]['sha256'] == digest:
+                # Unchanged since the last snapshot: nothing new to record
+                return versions[-1]
+
+            entry = {
+                'sha256': digest,
+                'size': len(data),
+                'created': time.time(),
+                'reason': reason
+            }
+            versions.append(entry)
+            self._apply_retention(index, path)
+            self._save_index(index)
+            return entry
+
+    def list_versions(self, path=None):
+        """Version history for one path (newest first), or for every path"""
+        with self._lock:
+            index = self._load_index()
+            if path is not None:
+                return list(reversed(index.get(path, [])))
+            return {p: list(reversed(versions)) for p, versions in index.items()}
+
+    def get(self, path, digest):
+        """Content of a recorded version, or None if path has no such version"""
+        with self._lock:
+            index = self._load_index()
+            if not any(entry['sha256'] == digest for entry in index.get(path, [])):
+                return None
+            with gzip.open(self._object_path(digest), 'rb') as f:
+                data = f.read()
+        if content_hash(data) != digest:
+            raise ValueError(f'Backup object {digest} is corrupt')
+        return data
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.gz')
+
+    def _store_object(self, digest, data):
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            return
+        os.makedirs(os.path.dirname(object_path), mode=0o700, exist_ok=True)
+        atomic_write(object_path, gzip.compress(data), mode=0o600)
+
+    def _apply_retention(self, index, path):
+        versions = index[path]
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        kept = versions[-self.keep_versions:]
+        if cutoff is not None:
+            kept = [entry for entry in kept[:-1] if entry['created'] >= cutoff] + kept[-1:]
+        dropped = {entry['sha256'] for entry in versions} - {entry['sha256'] for entry in kept}
+        index[path] = kept
+
+        if dropped:
+            referenced = {entry['sha256'] for entries in index.values() for entry in entries}
+            for digest in dropped - referenced:
+                try:
+                    os.unlink(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    def _load_index(self):
+        """Load the index once and keep it in memory (caller holds the lock)"""
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+        return self._index
+
+    def _save_index(self, index):
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        atomic_write(self.index_path, json.dumps(index, indent=1).encode('utf-8'), mode=0o600)
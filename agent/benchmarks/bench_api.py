@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the agent API
+Runs the Flask app in-process (or against a local agent with --url), over
+HTTP or the framed transport (--framed), using a stubbed subprocess layer
+and freshly generated RSA keys. Every route is hit once with a signed
+request, then each scenario is measured at several concurrency levels and
+throughput and p50/p99 latency are printed as JSON.
+"""
+
+import argparse
+import json
+import os
+import platform
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, AGENT_DIR)
+
+WHITELIST_SAMPLE = [
+    'systemctl restart apache2',
+    'a2ensite example.com',
+    'apt install -y php8.4-curl',
+    'df -h',
+    'whoami',
+    'rm -rf /tmp/x',
+]
+
+class SubprocessStub:
+    """Canned results for every command the agent runs
+
+    subprocess.run never spawns anything. Popen (used for streamed commands
+    and jobs) runs `echo` so the streaming machinery is still exercised.
+    """
+
+    def __init__(self):
+        self.real_run = subprocess.run
+        self.real_popen = subprocess.Popen
+        self.calls = 0
+
+    def install(self):
+        subprocess.run = self.run
+        subprocess.Popen = self.popen
+
+    def uninstall(self):
+        subprocess.run = self.real_run
+        subprocess.Popen = self.real_popen
+
+    def run(self, argv, *args, **kwargs):
+        self.calls += 1
+        stdout = self.output(argv)
+        if not kwargs.get('text'):
+            stdout = stdout.encode('utf-8')
+        return subprocess.CompletedProcess(argv, 0, stdout, '' if kwargs.get('text') else b'')
+
+    def popen(self, argv, *args, **kwargs):
+        self.calls += 1
+        return self.real_popen(['echo', ' '.join(argv)], *args, **kwargs)
+
+    @staticmethod
+    def output(argv):
+        if argv[:2] == ['systemctl', 'show']:
+            units = [arg for arg in argv[2:] if not arg.startswith('-')]
+            return '\n\n'.join(
+                f'Id={unit}.service\nLoadState=loaded\nActiveState=active\nSubState=running'
+                for unit in units
+            ) + '\n'
+        if argv[:2] == ['systemctl', 'is-active']:
+            return 'active\n'
+        return 'ok\n'
+
+class Signer:
+    """Builds auth headers with a fresh nonce per request, the way fleet_client signs
+
+    RSA signing costs far more than verifying, so the time each thread
+    spends here is tracked and taken out of the measured latencies.
+    """
+
+    def __init__(self, private_key_path, session=None):
+        from auth import RSAAuth
+        self.auth = RSAAuth(private_key_path=private_key_path)
+        self.session = session
+        self._local = threading.local()
+
+    def take_signing_time(self):
+        """Seconds the calling thread spent signing since the previous call"""
+        spent = getattr(self._local, 'spent', 0.0)
+        self._local.spent = 0.0
+        return spent
+
+    def headers(self, method, path, body=''):
+        started = time.perf_counter()
+        try:
+            return self._headers(method, path, body)
+        finally:
+            self._local.spent = getattr(self._local, 'spent', 0.0) + time.perf_counter() - started
+
+    def _headers(self, method, path, body):
+        from auth import RSAAuth, SessionKeyStore
+
+        timestamp = str(int(time.time()))
+        nonce = secrets.token_urlsafe(16)
+        if self.session:
+            session_id, key = self.session
+            message = SessionKeyStore.build_message(method, urlsplit(path).path, timestamp, body, nonce)
+            return {
+                'X-Session-Id': session_id,
+                'X-Timestamp': timestamp,
+                'X-Nonce': nonce,
+                'X-Signature': SessionKeyStore.sign(key, message)
+            }
+
+        signature = self.auth.sign_data(RSAAuth.build_message(body, timestamp, nonce))
+        return {'X-Signature': signature, 'X-Timestamp': timestamp, 'X-Nonce': nonce}
+
+class InProcessTransport:
+    """Calls the WSGI app directly through one Flask test client per thread"""
+
+    mode = 'in-process'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body='', headers=None, first_chunk=False):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = dict(headers or {})
+        if body:
+            headers.setdefault('Content-Type', 'application/json')
+        response = client.open(path, method=method, data=body or None, headers=headers, buffered=not first_chunk)
+        try:
+            if first_chunk:
+                next(iter(response.response), None)
+                return response.status_code, b''
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+class LiveTransport:
+    """Sends requests to a running agent over pooled keep-alive connections"""
+
+    mode = 'url'
+
+    def __init__(self, base_url):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, body='', headers=None, first_chunk=False):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        headers = dict(headers or {})
+        if body:
+            headers.setdefault('Content-Type', 'application/json')
+        response = session.request(method, self.base_url + path, data=body.encode('utf-8') if body else None,
+                                   headers=headers, stream=first_chunk, timeout=30)
+        try:
+            if first_chunk:
+                next(response.iter_content(1024), None)
+                return response.status_code, b''
+            return response.status_code, response.content
+        finally:
+            response.close()
+
+class FramedTransport:
+    """Multiplexes every thread's requests over one persistent framed-transport connection
+
+    The connection is authenticated once, so requests carry no signature.
+    """
+
+    mode = 'framed'
+    connection_auth = True
+
+    def __init__(self, client):
+        self.client = client.connect()
+
+    def request(self, method, path, body='', headers=None, first_chunk=False):
+        headers = dict(headers or {})
+        if body:
+            headers.setdefault('Content-Type', 'application/json')
+        if first_chunk:
+            status, chunks = self.client.stream(method, path, headers=headers, data=body)
+            next(chunks, None)
+            chunks.close()
+            return status, b''
+        result = self.client.request(method, path, headers=headers, data=body)
+        return result['status'], result['data']
+
+class Bench:
+    """Shared state for scenarios: transport, signer and scratch config files"""
+
+    def __init__(self, transport, signer, workdir):
+        self.transport = transport
+        self.signer = signer
+        self.workdir = workdir
+        self.agent = None
+        self.config_hashes = {}
+
+    def fetch(self, method, path, payload=None, signed=True, first_chunk=False):
+        """Send one request and return (status, body)"""
+        body = json.dumps(payload) if payload is not None else ''
+        signed = signed and not getattr(self.transport, 'connection_auth', False)
+        headers = self.signer.headers(method, path, body) if signed else {}
+        return self.transport.request(method, path, body, headers, first_chunk)
+
+    def call(self, method, path, payload=None, signed=True, first_chunk=False):
+        return self.fetch(method, path, payload, signed, first_chunk)[0]
+
+    def open_session(self):
+        """RSA handshake for an HMAC session key; later requests are signed with it"""
+        status, body = self.fetch('POST', '/api/auth/session')
+        if status != 200:
+            return False
+        session = json.loads(body)['data']
+        self.signer.session = (session['session_id'], self.signer.auth.open_session(session['encrypted_key']))
+        return True
+
+    def config_path(self, worker):
+        return os.path.join(self.workdir, 'etc', 'apache2', 'sites-available', f'bench-{worker}.conf')
+
+# Scenarios: fn(bench, worker) -> True on success
+
+def scenario_health(bench, worker):
+    return bench.call('GET', '/health', signed=False) == 200
+
+def scenario_auth(bench, worker):
+    # Cheapest signed route: cost is dominated by signature verification
+    return bench.call('GET', '/api/jobs') == 200
+
+def scenario_services_status(bench, worker):
+    return bench.call('GET', '/api/services/status') == 200
+
+def scenario_system_info(bench, worker):
+    return bench.call('GET', '/api/system/info') == 200
+
+def scenario_terminal_execute(bench, worker):
+    return bench.call('POST', '/api/terminal/execute', {'command': 'df -h'}) == 200
+
+def scenario_config_read(bench, worker):
+    return bench.call('GET', '/api/config/file?path=' + bench.config_path(worker)) == 200
+
+def scenario_config_write(bench, worker):
+    path = bench.config_path(worker)
+    content = f'# bench {worker} {time.perf_counter()}\n'
+    body = content
+    headers = bench.signer.headers('PUT', '/api/config/file', body)
+    headers['If-Match'] = bench.config_hashes[path]
+    headers['Content-Type'] = 'text/plain'
+    status = bench.transport.request('PUT', '/api/config/file?path=' + path, body, headers)[0]
+    if status == 200:
+        from managed_config import content_hash
+        bench.config_hashes[path] = content_hash(content.encode('utf-8'))
+    return status == 200
+
+def direct_auth_verify(bench, worker):
+    from auth import RSAAuth
+
+    # Always RSA, even with --session-keys: this scenario times the RSA check itself
+    timestamp = str(int(time.time()))
+    nonce = secrets.token_urlsafe(16)
+    signature = bench.signer.auth.sign_data(RSAAuth.build_message('', timestamp, nonce))
+    return bench.agent.auth.verify_request('', signature, timestamp, nonce)
+
+def direct_whitelist_match(bench, worker):
+    for command in WHITELIST_SAMPLE:
+        bench.agent.command_executor.is_command_allowed(command)
+    return True
+
+def direct_status_collection(bench, worker):
+    return bool(bench.agent.command_executor.service_monitor.probe())
+
+def direct_config_read(bench, worker):
+    return bool(bench.agent.config_store.read(bench.config_path(worker))[1])
+
+HTTP_SCENARIOS = {
+    'http_health': scenario_health,
+    'http_auth': scenario_auth,
+    'http_services_status': scenario_services_status,
+    'http_system_info': scenario_system_info,
+    'http_terminal_execute': scenario_terminal_execute,
+    'http_config_read': scenario_config_read,
+    'http_config_write': scenario_config_write,
+}
+
+# Only meaningful in-process, where the agent's objects are reachable
+DIRECT_SCENARIOS = {
+    'auth_verify_rsa': direct_auth_verify,
+    'whitelist_match': direct_whitelist_match,
+    'status_collection': direct_status_collection,
+    'config_read': direct_config_read,
+}
+
+def route_checks(bench):
+    """One request per route; keys/generate rotates the key so it runs last"""
+    config_path = bench.config_path(0)
+    return [
+        ('GET', '/health', None, False),
+        ('GET', '/metrics', None, False),
+        ('GET', '/api/services/status', None, False),
+        ('GET', '/api/services/watch', None, False),
+        ('GET', '/api/telemetry/stream', None, True),
+        ('POST', '/api/services/apache2/reload', None, False),
+        ('GET', '/api/apache2/sites', None, False),
+        ('POST', '/api/apache2/sites/bench.example/enable', None, False),
+        ('GET', '/api/apache2/modules', None, False),
+        ('POST', '/api/apache2/modules/rewrite/enable', None, False),
+        ('POST', '/api/batch', {'operations': [{'type': 'module', 'name': 'rewrite', 'action': 'enable'}]}, False),
+        ('GET', '/api/php/versions', None, False),
+        ('GET', '/api/php/8.4/info', None, False),
+        ('GET', '/api/system/info', None, False),
+        ('GET', '/api/system/processes?sort=rss&limit=5', None, False),
+        ('POST', '/api/terminal/execute', {'command': 'uptime'}, False),
+        ('POST', '/api/terminal/stream', {'command': 'uptime'}, True),
+        ('POST', '/api/jobs', {'command': 'uptime'}, False),
+        ('GET', '/api/jobs', None, False),
+        ('GET', '/api/jobs/unknown', None, False),
+        ('DELETE', '/api/jobs/unknown', None, False),
+        ('POST', '/api/auth/session', None, False),
+        ('GET', '/api/config/apache2', None, False),
+        ('GET', '/api/config/files', None, False),
+        ('GET', '/api/config/file?path=' + config_path, None, False),
+        ('GET', '/api/config/backups', None, False),
+        ('POST', '/api/config/backups/restore', {'path': config_path, 'sha256': '0' * 64}, False),
+        ('POST', '/api/keys/generate', None, False),
+    ]
+
+def check_routes(bench, app=None):
+    """Hit every route once with a signed request and report status codes"""
+    statuses = {}
+    hit = set()
+    adapter = app.url_map.bind('localhost') if app is not None else None
+    for method, path, payload, stream in route_checks(bench):
+        status = bench.call(method, path, payload, first_chunk=stream)
+        statuses[f'{method} {path}'] = status
+        if adapter is not None:
+            hit.add(adapter.match(urlsplit(path).path, method=method)[0])
+
+    report = {'statuses': statuses}
+    if app is not None:
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+        report['uncovered'] = sorted(endpoints - hit)
+    return report
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def run_scenario(bench, func, concurrency, total, warmup):
+    """Run total calls split over concurrency threads; return throughput and latency stats"""
+    for _ in range(warmup):
+        func(bench, 0)
+
+    per_worker = max(total // concurrency, 1)
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        samples = latencies[index]
+        barrier.wait()
+        for _ in range(per_worker):
+            bench.signer.take_signing_time()
+            started = time.perf_counter()
+            try:
+                ok = func(bench, index)
+            except Exception:
+                ok = False
+            samples.append(time.perf_counter() - started - bench.signer.take_signing_time())
+            if not ok:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = sorted(sample for samples in latencies for sample in samples)
+    return {
+        'requests': len(values),
+        'errors': sum(errors),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(values) / elapsed, 1),
+        'mean_ms': round(sum(values) / len(values) * 1000, 4),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 4),
+    }
+
+def compare(results, baseline):
+    """Percent change of each metric against a previous run (positive p99 = slower)"""
+    changes = {}
+    for name, levels in results.items():
+        for level, stats in levels.items():
+            old = baseline.get('results', {}).get(name, {}).get(level)
+            if not old:
+                continue
+            changes.setdefault(name, {})[level] = {
+                key: round((stats[key] - old[key]) / old[key] * 100, 1)
+                for key in ('throughput_rps', 'p50_ms', 'p99_ms') if old.get(key)
+            }
+    return changes
+
+def prepare_environment(workdir):
+    """Point the agent at scratch keys, logs, backups and config files before it is imported"""
+    keys = os.path.join(workdir, 'keys')
+    os.environ.update({
+        'RSA_PRIVATE_KEY_PATH': os.path.join(keys, 'private_key.pem'),
+        'RSA_PUBLIC_KEY_PATH': os.path.join(keys, 'public_key.pem'),
+        'LOG_FILE': os.path.join(workdir, 'logs', 'server-agent.log'),
+        # The log pipeline also writes to stdout, which would drown the report
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+        'BACKUP_DIR': os.path.join(workdir, 'backups'),
+        'SESSION_AUTH_ENABLED': 'true',
+        'SERVICE_STATUS_TTL': os.environ.get('SERVICE_STATUS_TTL', '2'),
+    })
+
+    from auth import RSAAuth
+    RSAAuth(os.environ['RSA_PRIVATE_KEY_PATH'], os.environ['RSA_PUBLIC_KEY_PATH']).generate_key_pair()
+    os.makedirs(os.path.join(workdir, 'etc', 'apache2', 'sites-available'), exist_ok=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the agent API')
+    parser.add_argument('--url', help='Benchmark a running agent instead of the in-process app')
+    parser.add_argument('--key', default='keys/private_key.pem', help='Private key for --url mode')
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated thread counts')
+    parser.add_argument('--requests', type=int, default=2000, help='Calls per scenario and concurrency level')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--scenarios', help='Comma-separated subset of scenario names')
+    parser.add_argument('--session-keys', action='store_true', help='Sign with an HMAC session key instead of RSA')
+    parser.add_argument('--framed', action='store_true', help='Send requests over the persistent framed transport')
+    parser.add_argument('--framed-port', type=int, default=6970, help='Framed transport port of the --url agent')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    workdir = tempfile.mkdtemp(prefix='agent-bench-')
+    stub = SubprocessStub()
+    app = None
+
+    if args.url:
+        transport = LiveTransport(args.url)
+        signer = Signer(args.key)
+        if args.framed:
+            from framed_transport import FramedClient
+            transport = FramedTransport(FramedClient(urlsplit(args.url).hostname, args.framed_port, signer.auth))
+        scenarios = dict(HTTP_SCENARIOS)
+        for name in ('http_config_read', 'http_config_write'):
+            # Scratch config files only exist for the in-process agent
+            scenarios.pop(name)
+    else:
+        prepare_environment(workdir)
+        stub.install()
+        import server_agent
+        from managed_config import ManagedConfigStore
+        app = server_agent.app
+        server_agent.config_store = ManagedConfigStore(
+            [os.path.join(workdir, 'etc', 'apache2', 'sites-available', '*.conf')],
+            backup_store=server_agent.backup_store
+        )
+        transport = InProcessTransport(app)
+        signer = Signer(os.environ['RSA_PRIVATE_KEY_PATH'])
+        if args.framed:
+            from framed_transport import FramedClient, FramedServer
+            framed_server = FramedServer(app, server_agent.auth, host='127.0.0.1', port=0).start()
+            transport = FramedTransport(FramedClient('127.0.0.1', framed_server.port, signer.auth))
+        scenarios = dict(HTTP_SCENARIOS, **DIRECT_SCENARIOS)
+
+    bench = Bench(transport, signer, workdir)
+    if app is not None:
+        bench.agent = server_agent
+        from managed_config import content_hash
+        for worker in range(max(levels)):
+            path = bench.config_path(worker)
+            with open(path, 'w') as f:
+                f.write(f'# bench {worker}\n')
+            bench.config_hashes[path] = content_hash(f'# bench {worker}\n'.encode('utf-8'))
+
+    report = {
+        'benchmark': 'api',
+        'mode': transport.mode,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'concurrency': levels,
+        'requests_per_level': args.requests,
+        'signing': 'connection' if args.framed else 'session' if args.session_keys else 'rsa',
+    }
+
+    try:
+        if app is not None:
+            report['routes'] = check_routes(bench, app)
+            # keys/generate rotated the agent's key pair
+            bench.signer = Signer(os.environ['RSA_PRIVATE_KEY_PATH'])
+
+        if args.session_keys and not bench.open_session():
+            sys.exit('Session handshake failed; is SESSION_AUTH_ENABLED set on the agent?')
+
+        selected = args.scenarios.split(',') if args.scenarios else list(scenarios)
+        results = {}
+        for name in selected:
+            results[name] = {}
+            for level in levels:
+                results[name][str(level)] = run_scenario(bench, scenarios[name], level, args.requests, args.warmup)
+                print(f"{name} x{level}: {results[name][str(level)]['throughput_rps']} rps, "
+                      f"p50 {results[name][str(level)]['p50_ms']} ms, p99 {results[name][str(level)]['p99_ms']} ms",
+                      file=sys.stderr)
+        report['results'] = results
+        report['subprocess_stub_calls'] = stub.calls
+
+        if args.compare:
+            with open(args.compare) as f:
+                report['comparison'] = compare(results, json.load(f))
+    finally:
+        stub.uninstall()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main()
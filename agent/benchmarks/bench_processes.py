@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the process explorer
+Times a full /proc scan, a filtered top-N query and a query served from a
+shared scan, against forking `ps aux` once, and prints the results as JSON
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from process_explorer import ProcessExplorer
+
+def time_calls(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p99_ms': round(samples[int(len(samples) * 0.99)] * 1000, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the process explorer')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    # interval=0 rescans /proc on every query
+    scanning = ProcessExplorer(interval=0, baseline_delay=0)
+    shared = ProcessExplorer(interval=3600, baseline_delay=0)
+    total = scanning.query()['total']
+    shared.query()
+
+    results = {
+        'benchmark': 'processes',
+        'processes': total,
+        'scan_and_top20_by_cpu': time_calls(lambda: scanning.query(), args.iterations),
+        'scan_and_filter_by_name': time_calls(lambda: scanning.query(sort='rss', name='python'), args.iterations),
+        'shared_scan_top20': time_calls(lambda: shared.query(), args.iterations),
+        'ps_aux_fork': time_calls(lambda: subprocess.run(['ps', 'aux'], capture_output=True), args.iterations)
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the replay guard
+Fills a ReplayGuard to steady state for a given request rate and window,
+then measures the cost of checking new signatures and how much it adds
+to a full RSA request verification
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from auth import RSAAuth, ReplayGuard
+
+def fake_signatures(count):
+    """Base64 strings shaped like RSA-2048 signatures"""
+    return [base64.b64encode(os.urandom(256)).decode('ascii') for _ in range(count)]
+
+def latency_stats(samples):
+    samples = sorted(samples)
+    return {
+        'mean_us': round(sum(samples) / len(samples) * 1e6, 3),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 3),
+        'p99_us': round(samples[int(len(samples) * 0.99)] * 1e6, 3),
+    }
+
+def bench_guard(rate, window, bucket_seconds, checks):
+    """Steady state: window seconds of traffic at rate req/s already recorded"""
+    guard = ReplayGuard(window=window, bucket_seconds=bucket_seconds, max_entries=rate * window * 3)
+    now = int(time.time())
+
+    fill = rate * window
+    signatures = fake_signatures(fill)
+    started = time.perf_counter()
+    for i, signature in enumerate(signatures):
+        guard.check(signature, now - window + i // rate, True)
+    fill_rate = fill / (time.perf_counter() - started)
+    del signatures
+
+    timings = {}
+    for mode, signed in (('signed_timestamp', True), ('legacy', False)):
+        fresh = fake_signatures(checks)
+        samples = []
+        for signature in fresh:
+            started = time.perf_counter()
+            guard.check(signature, now, signed)
+            samples.append(time.perf_counter() - started)
+        timings[mode] = latency_stats(samples)
+
+        replays = []
+        for signature in fresh[:1000]:
+            started = time.perf_counter()
+            accepted = guard.check(signature, now, signed)
+            replays.append(time.perf_counter() - started)
+            assert not accepted
+        timings[mode + '_replay'] = latency_stats(replays)
+
+    return dict(
+        timings,
+        rate=rate,
+        entries=guard.entries,
+        buckets=len(guard._buckets),
+        approx_memory_mb=round((sum(sys.getsizeof(b) for b in guard._buckets.values()) + guard.entries * 32) / 2**20, 1),
+        fill_checks_per_second=round(fill_rate),
+    )
+
+def bench_verify(iterations, window, bucket_seconds):
+    """Full RSA verify_request with and without the guard"""
+    workdir = tempfile.mkdtemp(prefix='replay-bench-')
+    signer = RSAAuth(os.path.join(workdir, 'private.pem'), os.path.join(workdir, 'public.pem'))
+    signer.generate_key_pair()
+
+    requests = []
+    for i in range(iterations):
+        timestamp, nonce = str(int(time.time())), f'nonce-{i}'
+        requests.append(('', signer.sign_data(RSAAuth.build_message('', timestamp, nonce)), timestamp, nonce))
+
+    results = {}
+    for name, guard in (('without_guard', None), ('with_guard', ReplayGuard(window, bucket_seconds))):
+        verifier = RSAAuth(public_key_path=os.path.join(workdir, 'public.pem'), replay_guard=guard)
+        samples = []
+        for request in requests:
+            started = time.perf_counter()
+            assert verifier.verify_request(*request)
+            samples.append(time.perf_counter() - started)
+        results[name] = latency_stats(samples)
+
+    results['overhead_us'] = round(results['with_guard']['mean_us'] - results['without_guard']['mean_us'], 3)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the replay guard')
+    parser.add_argument('--rates', default='1000,5000', help='Comma-separated request rates (req/s) to simulate')
+    parser.add_argument('--window', type=int, default=300, help='Accepted timestamp skew in seconds')
+    parser.add_argument('--bucket-seconds', type=int, default=30)
+    parser.add_argument('--checks', type=int, default=100000, help='Timed checks per rate')
+    parser.add_argument('--verify-iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'replay_guard',
+        'window': args.window,
+        'bucket_seconds': args.bucket_seconds,
+        'steady_state': [
+            bench_guard(int(rate), args.window, args.bucket_seconds, args.checks)
+            for rate in args.rates.split(',')
+        ],
+        'verify_request': bench_verify(args.verify_iterations, args.window, args.bucket_seconds),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
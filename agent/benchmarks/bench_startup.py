@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the agent
+Imports server_agent in fresh interpreters and starts the agent as a
+process until /health answers, with and without an existing key pair,
+then prints median timings and the slowest modules as JSON. With
+--budget-ms it exits non-zero when the median import takes longer.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, AGENT_DIR)
+
+from bench_api import prepare_environment
+from start_agent import import_report
+
+IMPORT_SNIPPET = (
+    'import time; started = time.perf_counter(); import server_agent; '
+    'print(time.perf_counter() - started)'
+)
+
+def time_import():
+    """Seconds spent importing server_agent in a new interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET],
+        cwd=AGENT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def time_first_health(wait_for=None, timeout=30):
+    """Seconds from spawning the agent until /health returns 200
+
+    With wait_for, the agent keeps running until that file exists, and the
+    seconds until then are returned as well.
+    """
+    port = free_port()
+    env = dict(os.environ, AGENT_PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'server_agent.py'],
+        cwd=AGENT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        healthy = None
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'agent exited with {process.returncode}')
+            if healthy is None:
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                        if response.status == 200:
+                            healthy = time.perf_counter() - started
+                except OSError:
+                    pass
+            if healthy is not None:
+                if wait_for is None:
+                    return healthy
+                if os.path.exists(wait_for):
+                    return healthy, time.perf_counter() - started
+            time.sleep(0.005)
+        raise RuntimeError('agent did not start in time')
+    finally:
+        process.terminate()
+        process.wait()
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'median_ms': round(statistics.median(samples) * 1000, 1),
+        'min_ms': round(samples[0] * 1000, 1),
+        'max_ms': round(samples[-1] * 1000, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark agent startup')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per measurement')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list')
+    parser.add_argument('--budget-ms', type=float, help='Fail if the median import takes longer')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='agent-bench-')
+    try:
+        prepare_environment(workdir)
+        imports = [time_import() for _ in range(args.runs)]
+        health = [time_first_health() for _ in range(args.runs)]
+
+        # First start on a new host: the key pair is generated in the background
+        first_health, keys_ready = [], []
+        for _ in range(args.runs):
+            os.remove(os.environ['RSA_PRIVATE_KEY_PATH'])
+            os.remove(os.environ['RSA_PUBLIC_KEY_PATH'])
+            healthy, ready = time_first_health(wait_for=os.environ['RSA_PUBLIC_KEY_PATH'])
+            first_health.append(healthy)
+            keys_ready.append(ready)
+
+        total_us, modules = import_report(top=args.top)
+        report = {
+            'benchmark': 'startup',
+            'runs': args.runs,
+            'import_server_agent': summarize(imports),
+            'spawn_to_first_health': summarize(health),
+            'spawn_to_first_health_without_keys': summarize(first_health),
+            'spawn_to_generated_keys': summarize(keys_ready),
+            'import_report_ms': round(total_us / 1000, 1),
+            'slowest_modules': [
+                {'module': name, 'cumulative_ms': round(cumulative_us / 1000, 1), 'self_ms': round(self_us / 1000, 1)}
+                for cumulative_us, self_us, name in modules
+            ]
+        }
+        if args.budget_ms is not None:
+            report['budget_ms'] = args.budget_ms
+            report['within_budget'] = report['import_server_agent']['median_ms'] <= args.budget_ms
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.budget_ms is not None and not report['within_budget']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
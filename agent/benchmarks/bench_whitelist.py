@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark for command whitelist matching
+Compares the compiled token prefix tree against the old linear startswith scan
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from command_executor import CommandExecutor
+
+COMMANDS = [
+    'systemctl restart apache2',
+    'a2ensite example.com',
+    'apt install -y php8.4-curl',
+    'df -h',
+    'whoami',
+    'rm -rf /tmp/x',
+]
+
+def legacy_is_allowed(command):
+    """Pre-compilation behaviour: flatten the whitelist and scan it on every call"""
+    for allowed in Config.get_allowed_commands():
+        if command.startswith(allowed.removesuffix(' *')):
+            return True
+    return False
+
+def bench(func, number):
+    """Return the mean cost of one call in microseconds"""
+    timer = timeit.Timer(lambda: [func(command) for command in COMMANDS])
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / (number * len(COMMANDS)) * 1e6
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    executor = CommandExecutor()
+    
+    results = {
+        'benchmark': 'whitelist',
+        'iterations': number,
+        'legacy_startswith_us': round(bench(legacy_is_allowed, number), 3),
+        'prefix_tree_us': round(bench(executor.is_command_allowed, number), 3),
+        'compile_us': round(timeit.timeit(
+            lambda: executor.reload_whitelist(), number=1000) / 1000 * 1e6, 3),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -2,30 +2,59 @@ import subprocess
 import logging
 import os
 import json
+import queue
+import signal
+import threading
+import time
 from pathlib import Path
 from config import Config
+from command_whitelist import CommandWhitelist
+from service_monitor import ServiceMonitor
+from system_metrics import SystemMetrics
+from process_explorer import ProcessExplorer
+from reload_scheduler import ReloadScheduler
+from apache_inventory import ApacheInventory
+from php_inventory import PhpInventory
+import metrics
 
 logger = logging.getLogger(__name__)
 
 class CommandExecutor:
     def __init__(self):
         self.config = Config()
+        self.whitelist = CommandWhitelist(self.config.ALLOWED_COMMANDS)
+        self.service_monitor = ServiceMonitor()
+        self.system_metrics = SystemMetrics()
+        self.process_explorer = ProcessExplorer()
+        self.reload_scheduler = ReloadScheduler(self)
+        self.apache_inventory = ApacheInventory(self.config)
+        self.php_inventory = PhpInventory()
+    
+    def reload_whitelist(self):
+        """Recompile the command whitelist after ALLOWED_COMMANDS changed"""
+        self.whitelist.compile(self.config.ALLOWED_COMMANDS)
+    
+    def parse_command(self, command):
+        """Split a command into argv if it is whitelisted, otherwise return None"""
+        argv = CommandWhitelist.split(command)
+        if argv is None or self.whitelist.match(argv) is None:
+            return None
+        return argv
+    
+    def get_command_category(self, command):
+        """Get the ALLOWED_COMMANDS category a command belongs to"""
+        argv = CommandWhitelist.split(command)
+        return self.whitelist.match(argv) if argv else None
     
     def is_command_allowed(self, command):
         """Check if command is in whitelist"""
-        allowed_commands = self.config.get_allowed_commands()
-        
-        # Check if command starts with any allowed command
-        for allowed in allowed_commands:
-            if command.startswith(allowed):
-                return True
-        
-        return False
+        return self.parse_command(command) is not None
     
     def execute_command(self, command, timeout=30):
         """Execute a command safely with timeout"""
         try:
-            if not self.is_command_allowed(command):
+            argv = self.parse_command(command)
+            if argv is None:
                 return {
                     'success': False,
                     'error': f'Command not allowed: {command}',
@@ -34,16 +63,30 @@ class CommandExecutor:
                 }
             
             logger.info(f"Executing command: {command}")
+            category = self.whitelist.match(argv)
+            metrics.SUBPROCESS_SPAWNS.inc(category)
+            started = time.monotonic()
             
-            # Execute command with timeout
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd='/'
-            )
+            # Execute argv directly (no shell) with timeout
+            try:
+                result = subprocess.run(
+                    argv,
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    cwd='/'
+                )
+            except subprocess.TimeoutExpired:
+                metrics.SUBPROCESS_TIMEOUTS.inc(category)
+                raise
+            finally:
+                metrics.SUBPROCESS_DURATION.observe(time.monotonic() - started, category)
+            
+            logger.info(f"Command finished: {argv[0]}", extra={
+                'command': command,
+                'exit_code': result.returncode,
+                'duration_ms': round((time.monotonic() - started) * 1000, 2)
+            })
             
             return {
                 'success': result.returncode == 0,
@@ -69,44 +112,132 @@ class CommandExecutor:
                 'exit_code': -1
             }
     
-    def get_service_status(self, service_name):
-        """Get status of a system service"""
+    def stream_command(self, command, timeout=30, buffer_lines=None, heartbeat=None):
+        """Execute a command and yield output events as lines arrive
+        
+        Output is read by one thread per pipe into a bounded queue. When the
+        consumer falls behind the readers block, the pipes fill up and the
+        command itself is paused, so memory stays bounded by buffer_lines.
+        Yields dicts of type 'output', 'heartbeat' and finally 'exit'.
+        """
+        argv = self.parse_command(command)
+        if argv is None:
+            yield {
+                'type': 'exit',
+                'success': False,
+                'error': f'Command not allowed: {command}',
+                'exit_code': -1
+            }
+            return
+        
+        buffer_lines = buffer_lines or self.config.STREAM_BUFFER_LINES
+        heartbeat = heartbeat or self.config.STREAM_HEARTBEAT_INTERVAL
+        max_line = self.config.STREAM_MAX_LINE_BYTES
+        
+        logger.info(f"Streaming command: {command}")
+        category = self.whitelist.match(argv)
+        metrics.SUBPROCESS_SPAWNS.inc(category)
+        started = time.monotonic()
+        
         try:
-            result = subprocess.run(
-                ['systemctl', 'is-active', service_name],
-                capture_output=True,
-                text=True,
-                timeout=10
+            process = subprocess.Popen(
+                argv,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd='/',
+                start_new_session=True
             )
-            
-            status = result.stdout.strip()
-            return {
-                'service': service_name,
-                'status': status,
-                'running': status == 'active'
-            }
         except Exception as e:
-            logger.error(f"Failed to get service status for {service_name}: {e}")
-            return {
-                'service': service_name,
-                'status': 'unknown',
-                'running': False,
-                'error': str(e)
+            logger.error(f"Command execution failed: {e}")
+            yield {'type': 'exit', 'success': False, 'error': str(e), 'exit_code': -1}
+            return
+        
+        events = queue.Queue(maxsize=buffer_lines)
+        
+        def pump(pipe, stream):
+            try:
+                for line in iter(lambda: pipe.readline(max_line), b''):
+                    events.put((stream, line.decode('utf-8', errors='replace')))
+            finally:
+                pipe.close()
+                events.put((stream, None))
+        
+        readers = [
+            threading.Thread(target=pump, args=(process.stdout, 'stdout'), daemon=True),
+            threading.Thread(target=pump, args=(process.stderr, 'stderr'), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+        
+        deadline = time.monotonic() + timeout
+        open_streams = len(readers)
+        timed_out = False
+        try:
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                try:
+                    stream, data = events.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    yield {'type': 'heartbeat'}
+                    continue
+                
+                if data is None:
+                    open_streams -= 1
+                else:
+                    yield {'type': 'output', 'stream': stream, 'data': data}
+            
+            if not timed_out:
+                try:
+                    exit_code = process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+                    logger.info(f"Command finished: {argv[0]}", extra={
+                        'command': command,
+                        'exit_code': exit_code,
+                        'duration_ms': round((time.monotonic() - started) * 1000, 2)
+                    })
+                    yield {'type': 'exit', 'success': exit_code == 0, 'exit_code': exit_code}
+                    return
+                except subprocess.TimeoutExpired:
+                    pass
+            
+            logger.error(f"Command timeout: {command}")
+            metrics.SUBPROCESS_TIMEOUTS.inc(category)
+            self._kill_process_group(process)
+            yield {
+                'type': 'exit',
+                'success': False,
+                'error': 'Command execution timeout',
+                'exit_code': -1
             }
+        finally:
+            metrics.SUBPROCESS_DURATION.observe(time.monotonic() - started, category)
+            # Client went away or we timed out: don't leave the command running
+            self._kill_process_group(process)
+            # Unblock readers stuck on a full queue
+            while any(reader.is_alive() for reader in readers):
+                try:
+                    events.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+    
+    @staticmethod
+    def _kill_process_group(process):
+        """Kill a command started in its own session, including any children"""
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
     
     def get_all_services_status(self):
         """Get status of all relevant services"""
-        services = [
-            'apache2', 'mysql', 'php7.4-fpm', 'php8.4-fpm'
-        ]
-        
-        statuses = {}
-        for service in services:
-            statuses[service] = self.get_service_status(service)
-        
-        return statuses
+        return self.service_monitor.get_statuses()
     
-    def manage_apache2_site(self, action, site_name):
+    def manage_apache2_site(self, action, site_name, reload=True):
         """Enable/disable Apache2 site"""
         if action not in ['enable', 'disable']:
             return {
@@ -121,15 +252,15 @@ class CommandExecutor:
         
         result = self.execute_command(command)
         
-        if result['success']:
+        if result['success'] and reload:
             # Reload Apache2 after site change
-            reload_result = self.execute_command('systemctl reload apache2')
+            reload_result = self.reload_scheduler.request_reload('apache2')
             if not reload_result['success']:
                 result['warning'] = 'Site changed but Apache2 reload failed'
         
         return result
     
-    def manage_apache2_module(self, action, module_name):
+    def manage_apache2_module(self, action, module_name, reload=True):
         """Enable/disable Apache2 module"""
         if action not in ['enable', 'disable']:
             return {
@@ -144,36 +275,104 @@ class CommandExecutor:
         
         result = self.execute_command(command)
         
-        if result['success']:
+        if result['success'] and reload:
             # Reload Apache2 after module change
-            reload_result = self.execute_command('systemctl reload apache2')
+            reload_result = self.reload_scheduler.request_reload('apache2')
             if not reload_result['success']:
                 result['warning'] = 'Module changed but Apache2 reload failed'
         
         return result
     
-    def get_apache2_sites(self):
-        """Get list of available and enabled Apache2 sites"""
-        try:
-            sites_available = []
-            sites_enabled = []
+    BATCH_ACTIONS = {
+        'site': ['enable', 'disable'],
+        'module': ['enable', 'disable'],
+        'service': ['start', 'stop', 'restart']
+    }
+    
+    def validate_batch(self, operations):
+        """Return an error message for the first malformed operation, or None if all are valid"""
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                return f'Operation {index} must be an object'
+            
+            op_type = operation.get('type')
+            name = operation.get('name')
+            action = operation.get('action')
+            if op_type not in self.BATCH_ACTIONS:
+                return f'Operation {index}: unknown type {op_type!r}. Use {", ".join(self.BATCH_ACTIONS)}'
+            if action not in self.BATCH_ACTIONS[op_type]:
+                return f'Operation {index}: invalid {op_type} action {action!r}. Use {", ".join(self.BATCH_ACTIONS[op_type])}'
+            # The name becomes a single argv token
+            if not isinstance(name, str) or not name or name.startswith('-') or len(name.split()) != 1:
+                return f'Operation {index}: invalid name {name!r}'
+        return None
+    
+    def apply_batch(self, operations):
+        """Apply site, module and service operations in order with a single Apache2 reload
+        
+        Each operation is a dict with 'type' ('site', 'module' or 'service'),
+        'name' and 'action'. Apache2 changes are config-tested once and
+        reloaded once after the last operation instead of after each one.
+        The whole list is validated first; nothing runs if any operation is
+        malformed.
+        """
+        error = self.validate_batch(operations)
+        if error:
+            return {'success': False, 'error': error, 'results': [], 'configtest': None, 'reloaded': False}
+        
+        results = []
+        apache2_changed = False
+        
+        for index, operation in enumerate(operations):
+            op_type = operation.get('type')
+            name = operation.get('name')
+            action = operation.get('action')
             
-            # Get available sites
-            if os.path.exists(self.config.APACHE2_SITES_AVAILABLE):
-                for site_file in os.listdir(self.config.APACHE2_SITES_AVAILABLE):
-                    if site_file.endswith('.conf'):
-                        sites_available.append(site_file[:-5])  # Remove .conf extension
+            if op_type == 'site':
+                result = self.manage_apache2_site(action, name, reload=False)
+                apache2_changed = apache2_changed or result['success']
+            elif op_type == 'module':
+                result = self.manage_apache2_module(action, name, reload=False)
+                apache2_changed = apache2_changed or result['success']
+            else:
+                result = self.execute_command(f'systemctl {action} {name}')
+                if result['success'] and name == 'apache2' and action in ['start', 'restart']:
+                    # A full restart already picked up earlier changes
+                    apache2_changed = False
             
-            # Get enabled sites
-            if os.path.exists(self.config.APACHE2_SITES_ENABLED):
-                for site_file in os.listdir(self.config.APACHE2_SITES_ENABLED):
-                    if site_file.endswith('.conf'):
-                        sites_enabled.append(site_file[:-5])  # Remove .conf extension
+            results.append(dict(result, index=index, type=op_type, name=name, action=action))
+        
+        summary = {
+            'success': all(result['success'] for result in results),
+            'results': results,
+            'configtest': None,
+            'reloaded': False
+        }
+        
+        if operations:
+            self.service_monitor.invalidate()
+        
+        if apache2_changed:
+            test_result = self.execute_command('apache2ctl configtest')
+            summary['configtest'] = test_result
+            if not test_result['success']:
+                summary['success'] = False
+                summary['error'] = 'Apache2 configuration test failed, reload skipped'
+                return summary
             
-            return {
-                'available': sites_available,
-                'enabled': sites_enabled
-            }
+            reload_result = self.reload_scheduler.request_reload('apache2')
+            summary['reloaded'] = reload_result['success']
+            if not reload_result['success']:
+                summary['success'] = False
+                summary['error'] = 'Apache2 reload failed'
+        
+        return summary
+    
+    def get_apache2_sites(self):
+        """Get list of available and enabled Apache2 sites"""
+        try:
+            sites, _ = self.apache_inventory.snapshot('sites')
+            return sites
         except Exception as e:
             logger.error(f"Failed to get Apache2 sites: {e}")
             return {
@@ -185,25 +384,8 @@ class CommandExecutor:
     def get_apache2_modules(self):
         """Get list of available and enabled Apache2 modules"""
         try:
-            modules_available = []
-            modules_enabled = []
-            
-            # Get available modules
-            if os.path.exists(self.config.APACHE2_MODS_AVAILABLE):
-                for mod_file in os.listdir(self.config.APACHE2_MODS_AVAILABLE):
-                    if mod_file.endswith('.load'):
-                        modules_available.append(mod_file[:-5])  # Remove .load extension
-            
-            # Get enabled modules
-            if os.path.exists(self.config.APACHE2_MODS_ENABLED):
-                for mod_file in os.listdir(self.config.APACHE2_MODS_ENABLED):
-                    if mod_file.endswith('.load'):
-                        modules_enabled.append(mod_file[:-5])  # Remove .load extension
-            
-            return {
-                'available': modules_available,
-                'enabled': modules_enabled
-            }
+            modules, _ = self.apache_inventory.snapshot('modules')
+            return modules
         except Exception as e:
             logger.error(f"Failed to get Apache2 modules: {e}")
             return {
@@ -215,47 +397,31 @@ class CommandExecutor:
     def get_php_info(self, version):
         """Get PHP information for specific version"""
         try:
-            if version not in self.config.PHP_FPM_CONFIGS:
+            info = self.php_inventory.get_info(version)
+            if info is None:
                 return {
                     'success': False,
                     'error': f'PHP version {version} not supported'
                 }
             
-            # Get PHP version info
-            result = subprocess.run(
-                [f'php{version}', '-v'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode != 0:
-                return {
-                    'success': False,
-                    'error': f'PHP {version} not installed or not accessible'
-                }
-            
-            # Get loaded modules
-            modules_result = subprocess.run(
-                [f'php{version}', '-m'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            modules = []
-            if modules_result.returncode == 0:
-                modules = [line.strip() for line in modules_result.stdout.split('\n') if line.strip()]
+            return dict(info, version=version)
             
+        except Exception as e:
+            logger.error(f"Failed to get PHP info for version {version}: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def get_all_php_info(self):
+        """Get PHP information for every installed version"""
+        try:
             return {
                 'success': True,
-                'version': version,
-                'version_info': result.stdout.strip(),
-                'modules': modules
+                'versions': self.php_inventory.get_all()
             }
-            
         except Exception as e:
-            logger.error(f"Failed to get PHP info for version {version}: {e}")
+            logger.error(f"Failed to get PHP versions: {e}")
             return {
                 'success': False,
                 'error': str(e)
@@ -264,33 +430,9 @@ class CommandExecutor:
     def get_system_info(self):
         """Get basic system information"""
         try:
-            info = {}
-            
-            # Disk usage
-            disk_result = subprocess.run(['df', '-h'], capture_output=True, text=True, timeout=10)
-            if disk_result.returncode == 0:
-                info['disk'] = disk_result.stdout.strip()
-            
-            # Memory usage
-            memory_result = subprocess.run(['free', '-h'], capture_output=True, text=True, timeout=10)
-            if memory_result.returncode == 0:
-                info['memory'] = memory_result.stdout.strip()
-            
-            # Load average
-            uptime_result = subprocess.run(['uptime'], capture_output=True, text=True, timeout=10)
-            if uptime_result.returncode == 0:
-                info['uptime'] = uptime_result.stdout.strip()
-            
-            # Running processes
-            ps_result = subprocess.run(['ps', 'aux'], capture_output=True, text=True, timeout=10)
-            if ps_result.returncode == 0:
-                # Limit output to first 20 lines
-                lines = ps_result.stdout.strip().split('\n')[:21]
-                info['processes'] = '\n'.join(lines)
-            
             return {
                 'success': True,
-                'info': info
+                'info': self.system_metrics.collect()
             }
             
         except Exception as e:
@@ -298,4 +440,4 @@ class CommandExecutor:
             return {
                 'success': False,
                 'error': str(e)
-            } 
\ No newline at end of file
+            }
@@ -0,0 +1,64 @@
+import shlex
+
+_QUOTING = frozenset('\'"\\')
+
+class CommandWhitelist:
+    """Token-level tree compiled from Config.ALLOWED_COMMANDS
+
+    Each whitelist entry is split into argv tokens and inserted into the
+    tree. A command must match an entry exactly, token for token, so
+    'systemctl stop apache2' admits neither 'systemctl stop apache2 ssh'
+    nor 'systemctl stop apache2 --all'. An entry ending in '*' takes
+    arguments: 'a2ensite *' admits 'a2ensite example.com'. Matching costs
+    O(number of tokens) regardless of the whitelist size.
+    """
+
+    _CATEGORY = object()
+    _ARGUMENTS = object()
+
+    def __init__(self, allowed_commands):
+        self._root = {}
+        self.compile(allowed_commands)
+
+    def compile(self, allowed_commands):
+        """(Re)build the tree from a {category: [command, ...]} mapping"""
+        root = {}
+        for category, commands in allowed_commands.items():
+            for command in commands:
+                tokens = shlex.split(command)
+                takes_arguments = tokens[-1] == '*'
+                if takes_arguments:
+                    tokens.pop()
+                node = root
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(self._ARGUMENTS if takes_arguments else self._CATEGORY, category)
+        # Swap in one assignment so concurrent matches see either tree, never a partial one
+        self._root = root
+
+    @staticmethod
+    def split(command):
+        """Split a command line into argv, or None if it cannot be parsed"""
+        if not _QUOTING.intersection(command):
+            # Without quotes or escapes shlex splitting is plain whitespace splitting
+            return command.split() or None
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            return None
+        return argv or None
+
+    def match(self, argv):
+        """Return the category of the entry matching argv, or None
+
+        An exact entry wins; otherwise the longest '*' entry that argv extends.
+        """
+        node = self._root
+        fallback = None
+        for token in argv:
+            # Tokens past an argument-taking entry are its arguments
+            fallback = node.get(self._ARGUMENTS, fallback)
+            node = node.get(token)
+            if node is None:
+                return fallback
+        return node.get(self._CATEGORY, node.get(self._ARGUMENTS, fallback))
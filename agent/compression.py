@@ -0,0 +1,171 @@
+import gzip
+import io
+import json
+import logging
+from config import Config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _zstd_decompress(data, max_size):
+    with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+        return _read_limited(reader, max_size)
+
+def _gzip_decompress(data, max_size):
+    with gzip.GzipFile(fileobj=io.BytesIO(data)) as reader:
+        return _read_limited(reader, max_size)
+
+def _brotli_decompress(data, max_size):
+    decompressor = brotli.Decompressor()
+    # Each call stops once it has produced about the limit, so a bomb never expands in full
+    output = decompressor.process(data, output_buffer_limit=max_size + 1)
+    while len(output) <= max_size and not decompressor.can_accept_more_data():
+        output += decompressor.process(b'', output_buffer_limit=max_size + 1 - len(output))
+    if len(output) > max_size:
+        raise ValueError('Decompressed body too large')
+    if not decompressor.is_finished():
+        raise ValueError('Truncated brotli stream')
+    return output
+
+def _brotli_limits_output():
+    """Whether this brotli build can cap the output of one call (brotli >= 1.1)"""
+    try:
+        brotli.Decompressor().process(b'', output_buffer_limit=1)
+        return True
+    except TypeError:
+        return False
+
+def _read_limited(reader, max_size):
+    """Read a decompressing stream, refusing to expand past max_size"""
+    output = reader.read(max_size + 1)
+    if len(output) > max_size:
+        raise ValueError('Decompressed body too large')
+    return output
+
+# Preference order when the client accepts several encodings equally
+ENCODERS = {}
+DECODERS = {'gzip': _gzip_decompress, 'x-gzip': _gzip_decompress}
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd_compress
+    DECODERS['zstd'] = _zstd_decompress
+if brotli is not None:
+    ENCODERS['br'] = lambda data: brotli.compress(data, quality=5)
+    # Older bindings decode a whole body at once, with no way to stop at MAX_DECOMPRESSED_BODY
+    if _brotli_limits_output():
+        DECODERS['br'] = _brotli_decompress
+ENCODERS['gzip'] = lambda data: gzip.compress(data, compresslevel=6)
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding from a werkzeug Accept-Encoding header, or None"""
+    best, best_quality = None, 0
+    for encoding in ENCODERS:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress_response(response, accept_encodings, min_size=None):
+    """Compress a Flask response in place if the client accepts it and it is big enough"""
+    min_size = Config.COMPRESSION_MIN_SIZE if min_size is None else min_size
+
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(ENCODERS[encoding](data))
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed bytes differ from the identity representation
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+class RequestDecompressor:
+    """WSGI middleware that decodes compressed request bodies before the app sees them
+
+    Signatures are computed over the decompressed body, so verify_request
+    works unchanged for compressed uploads.
+    """
+
+    def __init__(self, app, max_size=None):
+        self.app = app
+        self.max_size = max_size or Config.MAX_DECOMPRESSED_BODY
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.app(environ, start_response)
+
+        decoder = DECODERS.get(encoding)
+        if decoder is None:
+            return self._error(start_response, '415 Unsupported Media Type',
+                               f'Unsupported Content-Encoding: {encoding}')
+
+        length = environ.get('CONTENT_LENGTH')
+        # Without a length only a body the server terminates (chunked upload) can be read safely
+        if not length and not environ.get('wsgi.input_terminated'):
+            return self._error(start_response, '411 Length Required',
+                               'Compressed request bodies need a Content-Length')
+
+        try:
+            if length:
+                data = environ['wsgi.input'].read(int(length))
+            else:
+                data = environ['wsgi.input'].read(self.max_size + 1)
+                if len(data) > self.max_size:
+                    raise ValueError('Compressed body too large')
+            body = decoder(data, self.max_size)
+        except Exception as e:
+            logger.warning(f"Failed to decode {encoding} request body: {e}")
+            return self._error(start_response, '400 Bad Request', f'Invalid {encoding} request body')
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.app(environ, start_response)
+
+    @staticmethod
+    def _error(start_response, status, message):
+        body = json.dumps({'success': False, 'error': message}).encode('utf-8')
+        start_response(status, [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body)))
+        ])
+        return [body]
+
+def init_app(app):
+    """Enable request decompression and negotiated response compression on a Flask app"""
+    from flask import request
+
+    app.wsgi_app = RequestDecompressor(app.wsgi_app)
+
+    @app.after_request
+    def negotiate_compression(response):
+        if not Config.COMPRESSION_ENABLED:
+            return response
+        return compress_response(response, request.accept_encodings)
+
+    return app
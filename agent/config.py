@@ -4,38 +4,81 @@ from pathlib import Path
 class Config:
     # Server Configuration
     HOST = '0.0.0.0'
-    PORT = 6969
+    PORT = int(os.getenv('AGENT_PORT', '6969'))
     DEBUG = False
     
+    # Serving mode: 'development' (Flask built-in server) or 'production' (waitress)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'development')
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', '8'))
+    SERVER_CONNECTION_LIMIT = int(os.getenv('SERVER_CONNECTION_LIMIT', '100'))
+    SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', '64'))
+    SERVER_KEEPALIVE_TIMEOUT = int(os.getenv('SERVER_KEEPALIVE_TIMEOUT', '120'))
+    SHUTDOWN_GRACE_PERIOD = int(os.getenv('SHUTDOWN_GRACE_PERIOD', '60'))
+    
     # RSA Authentication
     RSA_PRIVATE_KEY_PATH = os.getenv('RSA_PRIVATE_KEY_PATH', 'keys/private_key.pem')
     RSA_PUBLIC_KEY_PATH = os.getenv('RSA_PUBLIC_KEY_PATH', 'keys/public_key.pem')
     
+    # Signed requests are accepted within +/- AUTH_MAX_AGE seconds, and only once
+    AUTH_MAX_AGE = int(os.getenv('AUTH_MAX_AGE', '300'))
+    REPLAY_PROTECTION_ENABLED = os.getenv('REPLAY_PROTECTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    REPLAY_BUCKET_SECONDS = int(os.getenv('REPLAY_BUCKET_SECONDS', '30'))
+    REPLAY_MAX_ENTRIES = int(os.getenv('REPLAY_MAX_ENTRIES', '1000000'))
+    # Refuse RSA requests without X-Nonce (legacy body-only signatures)
+    REQUIRE_NONCE = os.getenv('REQUIRE_NONCE', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Response compression (gzip always, zstd/brotli when their packages are installed)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    MAX_DECOMPRESSED_BODY = int(os.getenv('MAX_DECOMPRESSED_BODY', str(16 * 1024 * 1024)))
+    
+    # Session keys (HMAC-SHA256 after a single RSA handshake)
+    SESSION_AUTH_ENABLED = os.getenv('SESSION_AUTH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    SESSION_KEY_TTL = int(os.getenv('SESSION_KEY_TTL', '900'))
+    
+    # Persistent framed transport: length-prefixed msgpack (or JSON) frames on its own port
+    FRAMED_ENABLED = os.getenv('FRAMED_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    FRAMED_PORT = int(os.getenv('FRAMED_PORT', '6970'))
+    FRAMED_WORKERS = int(os.getenv('FRAMED_WORKERS', '16'))
+    FRAMED_MAX_IN_FLIGHT = int(os.getenv('FRAMED_MAX_IN_FLIGHT', '64'))
+    FRAMED_MAX_CONNECTIONS = int(os.getenv('FRAMED_MAX_CONNECTIONS', '32'))
+    FRAMED_MAX_HANDSHAKES = int(os.getenv('FRAMED_MAX_HANDSHAKES', '8'))
+    FRAMED_MAX_FRAME = int(os.getenv('FRAMED_MAX_FRAME', str(16 * 1024 * 1024)))
+    
     # Allowed Commands (whitelist for security)
+    # Entries match exactly; a trailing '*' lets an entry take further arguments
     ALLOWED_COMMANDS = {
         'apache2': [
-            'a2ensite', 'a2dissite', 'a2enmod', 'a2dismod',
+            'a2ensite *', 'a2dissite *', 'a2enmod *', 'a2dismod *',
             'systemctl start apache2', 'systemctl stop apache2', 'systemctl restart apache2',
-            'systemctl status apache2'
+            'systemctl status apache2', 'systemctl reload apache2', 'apache2ctl configtest'
         ],
         'php_fpm': [
             'systemctl start php7.4-fpm', 'systemctl stop php7.4-fpm', 'systemctl restart php7.4-fpm',
             'systemctl start php8.4-fpm', 'systemctl stop php8.4-fpm', 'systemctl restart php8.4-fpm',
-            'systemctl status php7.4-fpm', 'systemctl status php8.4-fpm'
+            'systemctl status php7.4-fpm', 'systemctl status php8.4-fpm',
+            'systemctl reload php7.4-fpm', 'systemctl reload php8.4-fpm'
         ],
         'mysql': [
             'systemctl start mysql', 'systemctl stop mysql', 'systemctl restart mysql',
             'systemctl status mysql'
         ],
         'package_management': [
-            'apt install', 'apt update', 'apt upgrade', 'apt remove', 'apt autoremove',
-            'add-apt-repository'
+            'apt install *', 'apt update', 'apt upgrade', 'apt upgrade -y', 'apt remove *',
+            'apt autoremove', 'apt autoremove -y', 'add-apt-repository *'
         ],
         'system_info': [
             'ps aux', 'df -h', 'free -h', 'uptime', 'who'
         ]
     }
     
+    # Reloads requested within this many seconds are merged into one
+    RELOAD_DEBOUNCE_WINDOW = float(os.getenv('RELOAD_DEBOUNCE_WINDOW', '1.0'))
+    RELOAD_COALESCED_SERVICES = ['apache2', 'php*-fpm']
+    
+    # Maximum operations accepted by /api/batch
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', '500'))
+    
     # File paths for configuration
     APACHE2_CONF = '/etc/apache2/apache2.conf'
     APACHE2_SITES_AVAILABLE = '/etc/apache2/sites-available'
@@ -49,8 +92,119 @@ class Config:
         '8.4': '/etc/php/8.4/fpm/php.ini'
     }
     
+    # Files reachable through /api/config/file ('*' does not cross directories)
+    MANAGED_CONFIG_PATTERNS = [
+        '/etc/apache2/apache2.conf',
+        '/etc/apache2/ports.conf',
+        '/etc/apache2/envvars',
+        '/etc/apache2/sites-available/*.conf',
+        '/etc/apache2/conf-available/*.conf',
+        '/etc/apache2/mods-available/*.conf',
+        '/etc/php/*/fpm/php.ini',
+        '/etc/php/*/cli/php.ini',
+        '/etc/php/*/fpm/php-fpm.conf',
+        '/etc/php/*/fpm/pool.d/*.conf',
+        '/etc/php/*/mods-available/*.ini'
+    ]
+    
+    # Content-addressed config backups
+    BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+    BACKUP_KEEP_VERSIONS = int(os.getenv('BACKUP_KEEP_VERSIONS', '20'))
+    BACKUP_MAX_AGE_DAYS = int(os.getenv('BACKUP_MAX_AGE_DAYS', '90'))
+    
+    # PHP builds are discovered from phpX.Y binaries and /etc/php/X.Y directories
+    PHP_BIN_DIR = '/usr/bin'
+    PHP_CONF_DIR = '/etc/php'
+    PHP_INI_KEYS = [
+        'memory_limit', 'max_execution_time', 'upload_max_filesize', 'post_max_size',
+        'display_errors', 'error_reporting', 'date.timezone', 'opcache.enable'
+    ]
+    
+    # Longest timeout a command request may ask for, in seconds
+    COMMAND_MAX_TIMEOUT = float(os.getenv('COMMAND_MAX_TIMEOUT', '3600'))
+    
+    # Streaming command output
+    STREAM_BUFFER_LINES = int(os.getenv('STREAM_BUFFER_LINES', '256'))
+    STREAM_MAX_LINE_BYTES = int(os.getenv('STREAM_MAX_LINE_BYTES', '8192'))
+    STREAM_HEARTBEAT_INTERVAL = float(os.getenv('STREAM_HEARTBEAT_INTERVAL', '15'))
+    
+    # Pushed telemetry (seconds between samples; subscribers may ask for slower)
+    TELEMETRY_INTERVAL = float(os.getenv('TELEMETRY_INTERVAL', '5'))
+    TELEMETRY_MAX_INTERVAL = float(os.getenv('TELEMETRY_MAX_INTERVAL', '300'))
+    # Open streams each hold a server thread; past this many, new subscribers get 429
+    TELEMETRY_MAX_SUBSCRIBERS = int(os.getenv('TELEMETRY_MAX_SUBSCRIBERS', '2'))
+    
+    # Background jobs
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_RETENTION = int(os.getenv('JOB_RETENTION', '3600'))
+    # Finished jobs kept (each with up to JOB_MAX_OUTPUT_BYTES of output); the oldest go first
+    JOB_MAX_RETAINED = int(os.getenv('JOB_MAX_RETAINED', '200'))
+    JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', '60'))
+    # Queued (not yet running) jobs before POST /api/jobs answers 429
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', '100'))
+    JOB_MAX_OUTPUT_BYTES = int(os.getenv('JOB_MAX_OUTPUT_BYTES', str(1024 * 1024)))
+    # Concurrent jobs per ALLOWED_COMMANDS category (unlisted categories may use every worker)
+    JOB_CATEGORY_LIMITS = {
+        'package_management': 1,
+        'apache2': 1,
+        'php_fpm': 1,
+        'mysql': 1
+    }
+    
+    # Service status monitoring
+    MONITORED_SERVICES = [
+        s.strip() for s in os.getenv(
+            'MONITORED_SERVICES', 'apache2,mysql,php7.4-fpm,php8.4-fpm'
+        ).split(',') if s.strip()
+    ]
+    SERVICE_STATUS_TTL = float(os.getenv('SERVICE_STATUS_TTL', '2'))
+    SERVICE_PROBE_TIMEOUT = float(os.getenv('SERVICE_PROBE_TIMEOUT', '5'))
+    
+    # Long-poll service watch: systemd D-Bus signals (needs jeepney) or one shared poller
+    SERVICE_WATCH_SOURCE = os.getenv('SERVICE_WATCH_SOURCE', 'auto')
+    SERVICE_WATCH_INTERVAL = float(os.getenv('SERVICE_WATCH_INTERVAL', '2'))
+    SERVICE_WATCH_RESYNC = float(os.getenv('SERVICE_WATCH_RESYNC', '60'))
+    SERVICE_WATCH_LINGER = float(os.getenv('SERVICE_WATCH_LINGER', '120'))
+    SERVICE_WATCH_MAX_TIMEOUT = float(os.getenv('SERVICE_WATCH_MAX_TIMEOUT', '55'))
+    SERVICE_WATCH_MAX_WAITERS = int(os.getenv('SERVICE_WATCH_MAX_WAITERS', '4'))
+    
+    # Process explorer (/proc scanner): scans within SAMPLE_INTERVAL are shared, CPU% and
+    # I/O rates cover at least BASELINE_DELAY and at most MAX_WINDOW seconds
+    PROCESS_SAMPLE_INTERVAL = float(os.getenv('PROCESS_SAMPLE_INTERVAL', '1'))
+    PROCESS_MAX_WINDOW = float(os.getenv('PROCESS_MAX_WINDOW', '30'))
+    PROCESS_BASELINE_DELAY = float(os.getenv('PROCESS_BASELINE_DELAY', '0.5'))
+    PROCESS_MAX_LIMIT = int(os.getenv('PROCESS_MAX_LIMIT', '200'))
+    
+    # On-demand request profiling (statistical stack sampling)
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+    PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+    PROFILE_MAX_ACTIVE = int(os.getenv('PROFILE_MAX_ACTIVE', '8'))
+    PROFILE_MAX_STACKS = int(os.getenv('PROFILE_MAX_STACKS', '2000'))
+    
     # Log files - using local directory instead of system log
-    LOG_FILE = 'logs/server-agent.log'
+    LOG_FILE = os.getenv('LOG_FILE', 'logs/server-agent.log')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    
+    # Rotation: by time if LOG_ROTATE_WHEN is set (e.g. 'midnight'), otherwise by size
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
+    LOG_COMPRESS = os.getenv('LOG_COMPRESS', 'true').lower() == 'true'
+    
+    # Access log sampling for high-volume read endpoints
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+    LOG_SAMPLED_ROUTES = [
+        s.strip() for s in os.getenv(
+            'LOG_SAMPLED_ROUTES',
+            '/health,/api/services/status,/api/system/info,/api/apache2/sites,'
+            '/api/apache2/modules,/api/php/versions,/api/jobs/<job_id>'
+        ).split(',') if s.strip()
+    ]
+    LOG_SLOW_REQUEST = float(os.getenv('LOG_SLOW_REQUEST', '1.0'))
     
     @classmethod
     def get_allowed_commands(cls):
@@ -58,4 +212,4 @@ class Config:
         all_commands = []
         for category in cls.ALLOWED_COMMANDS.values():
             all_commands.extend(category)
-        return all_commands 
\ No newline at end of file
+        return all_commands
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Python client for Server Agents
+Signs requests the way RSAAuth.verify_request expects, keeps pooled
+keep-alive connections per agent and fans operations out across a fleet
+"""
+
+import gzip
+import json
+import secrets
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from auth import RSAAuth, SessionKeyStore
+
+logger = logging.getLogger(__name__)
+
+class AgentClient:
+    """Signed, pooled HTTP client for a single agent"""
+
+    RETRY_STATUSES = {502, 503, 504}
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+    def __init__(self, base_url, auth, timeout=10, retries=2, backoff=0.2,
+                 pool_size=4, use_session_keys=False, compress_min_size=None,
+                 retry_non_idempotent=False):
+        self.base_url = base_url.rstrip('/')
+        self.auth = auth
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # POST/PATCH may already have run on the agent when a response is lost or a
+        # gateway answers 5xx; retrying would run the command or batch again
+        self.retry_non_idempotent = retry_non_idempotent
+        self.use_session_keys = use_session_keys
+        # gzip request bodies at least this large (None disables)
+        self.compress_min_size = compress_min_size
+        self._session_key = None
+        self._session_lock = threading.Lock()
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+
+    def close(self):
+        self.http.close()
+
+    def request(self, method, path, payload=None, params=None, timeout=None):
+        """Send a signed request and return a result dict
+
+        The result always has 'ok', 'status', 'data', 'error' and 'elapsed'
+        so results from many agents can be aggregated uniformly.
+        """
+        body = json.dumps(payload) if payload is not None else ''
+        started = time.monotonic()
+        attempt = 0
+        idempotent = self.retry_non_idempotent or method.upper() in self.IDEMPOTENT_METHODS
+
+        while True:
+            attempt += 1
+            try:
+                response = self._send(method, path, body, params, timeout or self.timeout)
+
+                if response.status_code == 401 and self._session_key is not None:
+                    # Session key expired or was revoked: handshake again once
+                    self._session_key = None
+                    response = self._send(method, path, body, params, timeout or self.timeout)
+
+                if response.status_code in self.RETRY_STATUSES and idempotent and attempt <= self.retries:
+                    time.sleep(self.backoff * attempt)
+                    continue
+
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = None
+
+                error = None
+                if not response.ok:
+                    error = (data or {}).get('error') if isinstance(data, dict) else response.text
+                return {
+                    'ok': response.ok and not (isinstance(data, dict) and data.get('success') is False),
+                    'status': response.status_code,
+                    'data': data,
+                    'error': error,
+                    'attempts': attempt,
+                    'elapsed': time.monotonic() - started
+                }
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if (idempotent or self._not_sent(e)) and attempt <= self.retries:
+                    time.sleep(self.backoff * attempt)
+                    continue
+                return {
+                    'ok': False,
+                    'status': None,
+                    'data': None,
+                    'error': str(e),
+                    'attempts': attempt,
+                    'elapsed': time.monotonic() - started
+                }
+
+    @staticmethod
+    def _not_sent(error):
+        """True if the request never reached the agent (connect timeout or refused connection)"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def _send(self, method, path, body, params, timeout):
+        # Re-sign every attempt so retries carry a fresh timestamp
+        headers = self._sign(method, path, body)
+        data = body.encode('utf-8') if body else None
+        if body:
+            headers['Content-Type'] = 'application/json'
+            # The signature covers the uncompressed body; the agent decodes before verifying
+            if self.compress_min_size is not None and len(data) >= self.compress_min_size:
+                data = gzip.compress(data)
+                headers['Content-Encoding'] = 'gzip'
+        return self.http.request(
+            method,
+            self.base_url + path,
+            data=data,
+            params=params,
+            headers=headers,
+            timeout=timeout
+        )
+
+    def _sign(self, method, path, body):
+        timestamp = str(int(time.time()))
+        # A fresh nonce makes every request unique, so the agent's replay guard
+        # never mistakes two identical requests for a replay
+        nonce = secrets.token_urlsafe(16)
+
+        if self.use_session_keys:
+            session = self._get_session_key()
+            if session:
+                session_id, key = session
+                message = SessionKeyStore.build_message(method, urlsplit(path).path, timestamp, body, nonce)
+                return {
+                    'X-Session-Id': session_id,
+                    'X-Timestamp': timestamp,
+                    'X-Nonce': nonce,
+                    'X-Signature': SessionKeyStore.sign(key, message)
+                }
+
+        return self._rsa_headers(body, timestamp, nonce)
+
+    def _rsa_headers(self, body, timestamp=None, nonce=None):
+        timestamp = timestamp or str(int(time.time()))
+        nonce = nonce or secrets.token_urlsafe(16)
+        signature = self.auth.sign_data(RSAAuth.build_message(body, timestamp, nonce))
+        if signature is None:
+            raise RuntimeError('Failed to sign request (private key not loaded?)')
+        return {
+            'X-Signature': signature,
+            'X-Timestamp': timestamp,
+            'X-Nonce': nonce
+        }
+
+    def _get_session_key(self):
+        """Return (session_id, key), performing the RSA handshake when needed"""
+        with self._session_lock:
+            if self._session_key:
+                session_id, key, expires_at = self._session_key
+                # Rotate a little before the agent expires the key
+                if time.time() < expires_at - 30:
+                    return session_id, key
+
+            response = self.http.post(
+                self.base_url + '/api/auth/session',
+                headers=self._rsa_headers(''),
+                timeout=self.timeout
+            )
+            if response.status_code != 200:
+                logger.warning(f"Session handshake with {self.base_url} failed ({response.status_code}), using RSA signatures")
+                self.use_session_keys = False
+                return None
+
+            session = response.json()['data']
+            key = self.auth.open_session(session['encrypted_key'])
+            if key is None:
+                self.use_session_keys = False
+                return None
+
+            self._session_key = (session['session_id'], key, session['expires_at'])
+            return session['session_id'], key
+
+    # Convenience wrappers for the agent API
+
+    def health(self):
+        return self.request('GET', '/health')
+
+    def get_services_status(self):
+        return self.request('GET', '/api/services/status')
+
+    def manage_service(self, service_name, action):
+        return self.request('POST', f'/api/services/{service_name}/{action}')
+
+    def watch_services(self, since=None, timeout=30):
+        """Long-poll for service state changes after revision since"""
+        params = {'timeout': timeout}
+        if since is not None:
+            params['since'] = since
+        return self.request('GET', '/api/services/watch', params=params, timeout=timeout + self.timeout)
+
+    def get_system_info(self):
+        return self.request('GET', '/api/system/info')
+
+    def get_processes(self, sort='cpu', limit=20, **filters):
+        """Top processes; filters are user, name, service or cgroup"""
+        return self.request('GET', '/api/system/processes', params=dict(filters, sort=sort, limit=limit))
+
+    def execute(self, command, timeout=30):
+        return self.request('POST', '/api/terminal/execute',
+                            {'command': command, 'timeout': timeout}, timeout=timeout + self.timeout)
+
+    def apply_batch(self, operations):
+        return self.request('POST', '/api/batch', {'operations': operations})
+
+class FleetClient:
+    """Fan one operation out to many agents concurrently"""
+
+    def __init__(self, agents, auth=None, private_key_path=None, max_workers=64, **client_options):
+        """agents is a list of base URLs or a {name: base_url} mapping"""
+        if auth is None:
+            auth = RSAAuth(private_key_path=private_key_path)
+        if not isinstance(agents, dict):
+            agents = {url: url for url in agents}
+
+        self.clients = {
+            name: AgentClient(url, auth, **client_options)
+            for name, url in agents.items()
+        }
+        self.pool = ThreadPoolExecutor(max_workers=min(max_workers, max(len(self.clients), 1)))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for client in self.clients.values():
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def map(self, operation, agents=None):
+        """Run operation(client) on every agent and aggregate the results
+
+        Returns {'results': {name: result}, 'succeeded': [...], 'failed': [...],
+        'elapsed': seconds}. Total time is close to the slowest single agent.
+        """
+        names = list(agents) if agents is not None else list(self.clients)
+        started = time.monotonic()
+
+        futures = {name: self.pool.submit(operation, self.clients[name]) for name in names}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = {'ok': False, 'status': None, 'data': None, 'error': str(e)}
+
+        return {
+            'results': results,
+            'succeeded': [name for name, result in results.items() if result.get('ok')],
+            'failed': [name for name, result in results.items() if not result.get('ok')],
+            'elapsed': time.monotonic() - started
+        }
+
+    def request(self, method, path, payload=None, params=None, agents=None):
+        """Send the same signed request to every agent"""
+        return self.map(lambda client: client.request(method, path, payload, params), agents)
+
+def main():
+    """Send one request to a list of agents and print the aggregated results"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Fan a signed request out to many Server Agents')
+    parser.add_argument('method', help='HTTP method, e.g. GET')
+    parser.add_argument('path', help='API path, e.g. /api/services/status')
+    parser.add_argument('--agents', required=True, help='Comma-separated agent base URLs')
+    parser.add_argument('--key', default='keys/private_key.pem', help='RSA private key used for signing')
+    parser.add_argument('--data', help='JSON request body')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--session-keys', action='store_true', help='Use HMAC session keys after one RSA handshake')
+    args = parser.parse_args()
+    
+    agents = [url.strip() for url in args.agents.split(',') if url.strip()]
+    payload = json.loads(args.data) if args.data else None
+    
+    with FleetClient(agents, private_key_path=args.key, timeout=args.timeout,
+                     use_session_keys=args.session_keys) as fleet:
+        summary = fleet.request(args.method.upper(), args.path, payload)
+    
+    print(json.dumps(summary, indent=2, default=str))
+
+if __name__ == '__main__':
+    main()
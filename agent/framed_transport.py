@@ -0,0 +1,792 @@
+import base64
+import hashlib
+import hmac
+import json
+import queue
+import secrets
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+from config import Config
+from auth import RSAAuth
+import metrics
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Client preamble: magic, protocol version, codec marker
+MAGIC = b'SAGENT'
+VERSION = b'1'
+HANDSHAKE_TIMEOUT = 10
+HEADER = struct.Struct('>I')
+SEQUENCE = struct.Struct('>Q')
+TAG_SIZE = 32
+CLIENT = b'C'
+SERVER = b'S'
+
+class FrameError(Exception):
+    """Malformed, oversized or forged frame; the connection is closed"""
+
+class JsonCodec:
+    marker = b'J'
+    binary = False
+
+    @staticmethod
+    def encode(message):
+        return json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def decode(payload):
+        return json.loads(payload)
+
+class MsgpackCodec:
+    marker = b'M'
+    binary = True
+
+    @staticmethod
+    def encode(message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    @staticmethod
+    def decode(payload):
+        return msgpack.unpackb(payload, raw=False)
+
+def available_codecs():
+    codecs = {JsonCodec.marker: JsonCodec}
+    if msgpack is not None:
+        codecs[MsgpackCodec.marker] = MsgpackCodec
+    return codecs
+
+def auth_message(challenge):
+    """Data the client signs to authenticate a connection (never a valid HTTP body)"""
+    return f"server-agent framed auth\n{challenge}"
+
+def pack_body(codec, data):
+    """Body bytes as a frame field: raw with msgpack, text (or base64) with JSON"""
+    if codec.binary:
+        return data, None
+    try:
+        return data.decode('utf-8'), None
+    except UnicodeDecodeError:
+        return base64.b64encode(data).decode('ascii'), 'base64'
+
+def unpack_body(value, encoding=None):
+    if value is None:
+        return b''
+    if encoding == 'base64':
+        return base64.b64decode(value)
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return bytes(value)
+
+class FrameChannel:
+    """Length-prefixed frames over a socket
+
+    Every frame is a 4-byte big-endian length followed by the encoded
+    message. Once a key is set, each frame also carries an HMAC-SHA256 tag
+    over direction, sequence number and payload, so frames cannot be forged,
+    replayed, reordered or reflected back on the same connection.
+    """
+
+    def __init__(self, sock, outgoing, max_frame=None, codec=None):
+        self.sock = sock
+        self.outgoing = outgoing
+        self.incoming = SERVER if outgoing == CLIENT else CLIENT
+        self.max_frame = max_frame or Config.FRAMED_MAX_FRAME
+        self.codec = codec
+        self.key = None
+        self._send_seq = 0
+        self._recv_seq = 0
+        self._send_lock = threading.Lock()
+        self._reader = sock.makefile('rb')
+
+    def read_exact(self, size):
+        """Read size bytes; None on a clean EOF before the first byte"""
+        data = self._reader.read(size)
+        if not data:
+            return None
+        if len(data) < size:
+            raise FrameError('Connection closed mid-frame')
+        return data
+
+    def send(self, message):
+        payload = self.codec.encode(message)
+        with self._send_lock:
+            if self.key is not None:
+                payload = self._tag(self.outgoing, self._send_seq, payload) + payload
+                self._send_seq += 1
+            self.sock.sendall(HEADER.pack(len(payload)) + payload)
+
+    def recv(self):
+        """Next message, or None when the peer closed the connection"""
+        header = self.read_exact(HEADER.size)
+        if header is None:
+            return None
+        (length,) = HEADER.unpack(header)
+        if length > self.max_frame:
+            raise FrameError(f'Frame of {length} bytes exceeds the {self.max_frame} byte limit')
+        payload = self.read_exact(length) if length else b''
+        if payload is None:
+            raise FrameError('Connection closed mid-frame')
+
+        if self.key is not None:
+            tag, payload = payload[:TAG_SIZE], payload[TAG_SIZE:]
+            if not hmac.compare_digest(tag, self._tag(self.incoming, self._recv_seq, payload)):
+                raise FrameError('Frame authentication failed')
+            self._recv_seq += 1
+        return self.codec.decode(payload)
+
+    def _tag(self, direction, sequence, payload):
+        mac = hmac.new(self.key, direction + SEQUENCE.pack(sequence), hashlib.sha256)
+        mac.update(payload)
+        return mac.digest()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class FramedConnection:
+    """One authenticated client connection; requests run concurrently on the server's workers"""
+
+    def __init__(self, server, sock, address):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.channel = FrameChannel(sock, SERVER, server.max_frame)
+        self.active = {}
+        self.slots = threading.BoundedSemaphore(server.max_in_flight)
+        self.closed = False
+
+    def run(self):
+        try:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.sock.settimeout(HANDSHAKE_TIMEOUT)
+            if not self._handshake():
+                return
+            self.sock.settimeout(None)
+
+            while not self.closed:
+                message = self.channel.recv()
+                if message is None:
+                    break
+                self._dispatch(message)
+        except (OSError, FrameError, ValueError) as e:
+            if not self.closed:
+                logger.warning(f"Framed connection from {self.address[0]} closed: {e}")
+        finally:
+            self.closed = True
+            # Streams notice on their next chunk and close their response
+            for cancelled in list(self.active.values()):
+                cancelled.set()
+
+    def _handshake(self):
+        preamble = self.channel.read_exact(len(MAGIC) + 2)
+        if preamble is None or preamble[:len(MAGIC) + 1] != MAGIC + VERSION:
+            logger.warning(f"Framed connection from {self.address[0]} sent an unknown preamble")
+            return False
+
+        codec = available_codecs().get(preamble[-1:])
+        if codec is None:
+            # JSON is always available, so use it to say why
+            self.channel.codec = JsonCodec
+            self.channel.send({'type': 'error', 'error': 'Unsupported codec'})
+            return False
+        self.channel.codec = codec
+
+        challenge = secrets.token_hex(16)
+        self.channel.send({'type': 'hello', 'challenge': challenge})
+        message = self.channel.recv()
+        if not isinstance(message, dict) or message.get('type') != 'auth' or not message.get('nonce'):
+            self.channel.send({'type': 'error', 'error': 'Expected auth frame'})
+            return False
+
+        verified = self.server.auth.verify_request(
+            auth_message(challenge),
+            message.get('signature'),
+            message.get('timestamp'),
+            str(message['nonce'])
+        )
+        if not verified:
+            logger.warning(f"Framed connection from {self.address[0]} failed authentication")
+            self.channel.send({'type': 'error', 'error': 'Authentication failed'})
+            return False
+
+        if not self.server.admit(self):
+            logger.warning(f"Framed connection from {self.address[0]} refused: connection limit reached")
+            self.channel.send({'type': 'error', 'error': 'Connection limit reached'})
+            return False
+
+        # Frames are authenticated from here on with a key only the client can decrypt
+        key = secrets.token_bytes(32)
+        self.channel.send({
+            'type': 'ready',
+            'encrypted_key': self.server.auth.encrypt_key(key),
+            'max_in_flight': self.server.max_in_flight,
+            'max_frame': self.server.max_frame
+        })
+        self.channel.key = key
+        return True
+
+    def _dispatch(self, message):
+        kind = message.get('type') if isinstance(message, dict) else None
+        request_id = message.get('id') if kind else None
+
+        if kind == 'request':
+            if not isinstance(request_id, int) or not isinstance(message.get('path'), str):
+                self._send_error(request_id, 'Request frames need an integer id and a path')
+                return
+            if request_id in self.active:
+                self._send_error(request_id, 'Request id already in flight')
+                return
+            # Blocking here stops reading, which pushes back on the client
+            self.slots.acquire()
+            cancelled = self.active[request_id] = threading.Event()
+            try:
+                self.server.executor.submit(self._handle, message, cancelled)
+            except RuntimeError:
+                # Executor shut down
+                self.active.pop(request_id, None)
+                self.slots.release()
+                self._send_error(request_id, 'Agent is shutting down')
+        elif kind == 'cancel':
+            cancelled = self.active.get(request_id)
+            if cancelled is not None:
+                cancelled.set()
+        elif kind == 'ping':
+            self._send({'type': 'pong', 'id': request_id})
+        else:
+            self._send_error(request_id, f'Unknown frame type: {kind}')
+
+    def _handle(self, message, cancelled):
+        request_id = message['id']
+        app_iter = None
+        try:
+            response = []
+
+            def start_response(status, headers, exc_info=None):
+                response[:] = [int(status.split(' ', 1)[0]), headers]
+                return self._no_write
+
+            app_iter = self.server.app(self._environ(message), start_response)
+            chunks = iter(app_iter)
+            first = next(chunks, b'')
+            status, headers = response
+            header_map = {name: value for name, value in headers}
+            content_length = header_map.pop('Content-Length', None)
+
+            frame = {
+                'type': 'response',
+                'id': request_id,
+                'status': status,
+                'headers': header_map
+            }
+            if content_length is not None:
+                body, encoding = pack_body(self.channel.codec, first + b''.join(chunks))
+                frame['body'] = body
+                if encoding:
+                    frame['encoding'] = encoding
+                self._send(frame)
+                return
+
+            # No length: a streamed response (SSE, command output), relayed chunk by chunk
+            frame['stream'] = True
+            self._send(frame)
+            if first:
+                self._send_chunk(request_id, first)
+            for chunk in chunks:
+                if cancelled.is_set() or self.closed:
+                    return
+                if chunk:
+                    self._send_chunk(request_id, chunk)
+            self._send({'type': 'end', 'id': request_id})
+
+        except OSError:
+            self.closed = True
+        except Exception as e:
+            logger.error(f"Framed request {request_id} failed: {e}")
+            self._send_error(request_id, 'Internal server error')
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            self.active.pop(request_id, None)
+            self.slots.release()
+
+    def _environ(self, message):
+        path, _, query = message['path'].partition('?')
+        params = message.get('params')
+        if params:
+            query = '&'.join(filter(None, [query, urlencode(params, doseq=True)]))
+
+        headers = {str(name).lower(): str(value) for name, value in (message.get('headers') or {}).items()}
+        if message.get('json') is not None:
+            body = json.dumps(message['json']).encode('utf-8')
+            headers.setdefault('content-type', 'application/json')
+        else:
+            body = unpack_body(message.get('data'), message.get('encoding'))
+
+        host, port = self.server.host, str(self.server.port)
+        environ = {
+            'REQUEST_METHOD': str(message.get('method') or 'GET').upper(),
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': host,
+            'SERVER_PORT': port,
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': self.address[0],
+            'HTTP_HOST': f'{host}:{port}',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': _BodyReader(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            # Only this transport can set non-HTTP_ keys: routes skip per-request signatures
+            'agent.framed_peer': self.address[0]
+        }
+        for name, value in headers.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'content-length':
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+        return environ
+
+    def _send(self, frame):
+        if self.closed:
+            raise OSError('Connection closed')
+        self.channel.send(frame)
+
+    def _send_chunk(self, request_id, chunk):
+        body, encoding = pack_body(self.channel.codec, chunk)
+        frame = {'type': 'chunk', 'id': request_id, 'body': body}
+        if encoding:
+            frame['encoding'] = encoding
+        self._send(frame)
+
+    def _send_error(self, request_id, error):
+        try:
+            self._send({'type': 'error', 'id': request_id, 'error': error})
+        except OSError:
+            self.closed = True
+
+    @staticmethod
+    def _no_write(data):
+        raise RuntimeError('write() is not supported; return an iterable')
+
+class _BodyReader:
+    """Minimal wsgi.input over an in-memory body"""
+
+    def __init__(self, body):
+        self._body = memoryview(body)
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._body) if size is None or size < 0 else min(self._pos + size, len(self._body))
+        data = self._body[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+    def readline(self, size=-1):
+        end = len(self._body) if size is None or size < 0 else min(self._pos + size, len(self._body))
+        newline = bytes(self._body[self._pos:end]).find(b'\n')
+        return self.read(end - self._pos if newline < 0 else newline + 1)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, framed, address):
+        self.framed = framed
+        self.request_queue_size = Config.SERVER_BACKLOG
+        super().__init__(address, _ConnectionHandler)
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.framed.serve_connection(self.request, self.client_address)
+
+class FramedServer:
+    """Persistent, multiplexed transport for the agent API on its own port
+
+    A client authenticates once per connection with an RSA signature over a
+    server challenge, then sends many requests over the same socket without
+    waiting for earlier replies. Each request is dispatched through the same
+    WSGI app (routes, metrics, logging) as HTTP, on a shared worker pool, and
+    answered with a frame tagged with its request id.
+    """
+
+    def __init__(self, app, auth, host=None, port=None, workers=None, max_in_flight=None,
+                 max_frame=None, max_connections=None, max_handshakes=None, grace_period=None):
+        from production_server import InFlightTracker
+
+        self.app = InFlightTracker(app)
+        self.auth = auth
+        self.host = host or Config.HOST
+        self.port = Config.FRAMED_PORT if port is None else port
+        self.workers = workers or Config.FRAMED_WORKERS
+        self.max_in_flight = max_in_flight or Config.FRAMED_MAX_IN_FLIGHT
+        self.max_frame = max_frame or Config.FRAMED_MAX_FRAME
+        self.max_connections = max_connections or Config.FRAMED_MAX_CONNECTIONS
+        self.max_handshakes = max_handshakes or Config.FRAMED_MAX_HANDSHAKES
+        self.grace_period = Config.SHUTDOWN_GRACE_PERIOD if grace_period is None else grace_period
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='framed')
+        self.server = None
+        self._connections = set()
+        self._handshaking = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Listen and serve connections on a background thread"""
+        self.server = _TCPServer(self, (self.host, self.port))
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='framed-accept', daemon=True).start()
+        logger.info(
+            f"Framed transport listening on {self.host}:{self.port} "
+            f"(codecs: {', '.join(codec.__name__ for codec in available_codecs().values())})"
+        )
+        return self
+
+    def serve_connection(self, sock, address):
+        connection = FramedConnection(self, sock, address)
+        with self._lock:
+            # Until they authenticate, connections only count against the smaller handshake limit
+            if len(self._handshaking) >= self.max_handshakes:
+                logger.warning(f"Framed connection from {address[0]} refused: too many pending handshakes")
+                return
+            self._handshaking.add(connection)
+        try:
+            connection.run()
+        finally:
+            with self._lock:
+                self._handshaking.discard(connection)
+                admitted = connection in self._connections
+                self._connections.discard(connection)
+            if admitted:
+                metrics.FRAMED_CONNECTIONS.dec()
+
+    def admit(self, connection):
+        """Count an authenticated connection against max_connections; False when full"""
+        with self._lock:
+            self._handshaking.discard(connection)
+            if len(self._connections) >= self.max_connections:
+                return False
+            self._connections.add(connection)
+        metrics.FRAMED_CONNECTIONS.inc()
+        return True
+
+    def shutdown(self):
+        """Stop accepting, let in-flight requests finish, then close every connection"""
+        if self.server is None:
+            return
+        self.app.draining = True
+        server, self.server = self.server, None
+        threading.Thread(target=self._drain, args=(server,), name='framed-drain', daemon=True).start()
+
+    def _drain(self, server):
+        server.shutdown()
+        server.server_close()
+        if not self.app.wait_idle(self.grace_period):
+            logger.warning(f"Framed transport closing with {self.app.active} request(s) still running")
+        with self._lock:
+            connections = list(self._connections | self._handshaking)
+        for connection in connections:
+            connection.closed = True
+            connection.channel.close()
+        self.executor.shutdown(wait=False)
+        logger.info("Framed transport stopped")
+
+class _Call:
+    __slots__ = ('future', 'stream', 'chunks', 'buffer', 'started')
+
+    def __init__(self, stream):
+        self.future = Future()
+        self.stream = stream
+        self.chunks = None
+        self.buffer = None
+        self.started = time.monotonic()
+
+class FramedClient:
+    """Client for FramedServer: one authenticated connection shared by many concurrent requests
+
+    submit() returns a Future so a single thread can keep many requests in
+    flight; request() waits for one. Results have the same shape as
+    AgentClient.request. The connection is (re)opened on demand.
+    """
+
+    def __init__(self, host, port, auth, codec=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.auth = auth
+        self.timeout = timeout
+        if codec is None:
+            codec = MsgpackCodec if msgpack is not None else JsonCodec
+        self.codec = codec
+        self.channel = None
+        self._calls = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        with self._lock:
+            if self.channel is None:
+                self.channel = self._open()
+        return self
+
+    def close(self):
+        with self._lock:
+            channel, self.channel = self.channel, None
+        if channel is not None:
+            channel.close()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall(MAGIC + VERSION + self.codec.marker)
+            channel = FrameChannel(sock, CLIENT, codec=self.codec)
+
+            hello = channel.recv()
+            if not hello or hello.get('type') != 'hello':
+                raise ConnectionError((hello or {}).get('error') or 'Handshake failed')
+
+            timestamp = str(int(time.time()))
+            nonce = secrets.token_urlsafe(16)
+            channel.send({
+                'type': 'auth',
+                'timestamp': timestamp,
+                'nonce': nonce,
+                'signature': self.auth.sign_data(RSAAuth.build_message(auth_message(hello['challenge']), timestamp, nonce))
+            })
+
+            ready = channel.recv()
+            if not ready or ready.get('type') != 'ready':
+                raise ConnectionError((ready or {}).get('error') or 'Handshake failed')
+            key = self.auth.open_session(ready['encrypted_key'])
+            if key is None:
+                raise ConnectionError('Could not decrypt the connection key')
+            channel.key = key
+            channel.max_frame = ready.get('max_frame') or channel.max_frame
+            sock.settimeout(None)
+        except Exception:
+            sock.close()
+            raise
+
+        threading.Thread(target=self._read_loop, args=(channel,), name='framed-client', daemon=True).start()
+        return channel
+
+    def submit(self, method, path, payload=None, params=None, headers=None, data=None):
+        """Send a request without waiting; the Future resolves to a result dict"""
+        return self._start(method, path, payload, params, headers, data, stream=False).future
+
+    def request(self, method, path, payload=None, params=None, headers=None, data=None, timeout=None):
+        future = self.submit(method, path, payload, params, headers, data)
+        try:
+            return future.result(timeout or self.timeout)
+        except TimeoutError:
+            return self._error_result(time.monotonic(), 'Timed out waiting for the agent')
+
+    def stream(self, method, path, payload=None, params=None, headers=None, data=None, timeout=None):
+        """Start a streamed request; returns (status, iterator over body chunks)
+
+        Closing the iterator early cancels the request on the agent.
+        """
+        call = self._start(method, path, payload, params, headers, data, stream=True)
+        frame = call.future.result(timeout or self.timeout)
+        return frame['status'], self._iter_chunks(frame['id'], call, frame)
+
+    def _iter_chunks(self, request_id, call, frame):
+        finished = not frame.get('stream')
+        try:
+            if finished:
+                yield unpack_body(frame.get('body'), frame.get('encoding'))
+                return
+            while True:
+                chunk = call.chunks.get()
+                if chunk is None:
+                    finished = True
+                    return
+                if isinstance(chunk, Exception):
+                    finished = True
+                    raise chunk
+                yield chunk
+        finally:
+            if not finished:
+                self._calls.pop(request_id, None)
+                try:
+                    self.channel.send({'type': 'cancel', 'id': request_id})
+                except (AttributeError, OSError):
+                    pass
+
+    def _start(self, method, path, payload, params, headers, data, stream):
+        self.connect()
+        call = _Call(stream)
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            channel = self.channel
+        frame = {'type': 'request', 'id': request_id, 'method': method, 'path': path}
+        if params:
+            frame['params'] = params
+        if headers:
+            frame['headers'] = headers
+        if payload is not None:
+            frame['json'] = payload
+        elif data:
+            body, encoding = pack_body(self.codec, data.encode('utf-8') if isinstance(data, str) else data)
+            frame['data'] = body
+            if encoding:
+                frame['encoding'] = encoding
+
+        if channel is None:
+            self._fail(call, ConnectionError(f'Not connected to {self.host}:{self.port}'))
+            return call
+
+        self._calls[request_id] = call
+        try:
+            channel.send(frame)
+        except OSError as e:
+            self._calls.pop(request_id, None)
+            self._drop(channel)
+            self._fail(call, e)
+        return call
+
+    def _read_loop(self, channel):
+        error = None
+        try:
+            while True:
+                frame = channel.recv()
+                if frame is None:
+                    break
+                self._on_frame(frame)
+        except (OSError, FrameError, ValueError) as e:
+            error = e
+        self._drop(channel)
+        error = ConnectionError(f'Connection to {self.host}:{self.port} lost' + (f': {error}' if error else ''))
+        for request_id in list(self._calls):
+            call = self._calls.pop(request_id, None)
+            if call is not None:
+                self._fail(call, error)
+
+    def _on_frame(self, frame):
+        kind = frame.get('type')
+        request_id = frame.get('id')
+        call = self._calls.get(request_id)
+        if call is None:
+            return
+
+        if kind == 'response':
+            if not frame.get('stream'):
+                del self._calls[request_id]
+                call.future.set_result(frame if call.stream else self._result(frame, call))
+            elif call.stream:
+                call.chunks = queue.Queue()
+                call.future.set_result(frame)
+            else:
+                call.buffer = (frame, [])
+        elif kind == 'chunk':
+            chunk = unpack_body(frame.get('body'), frame.get('encoding'))
+            if call.stream:
+                call.chunks.put(chunk)
+            else:
+                call.buffer[1].append(chunk)
+        elif kind == 'end':
+            del self._calls[request_id]
+            if call.stream:
+                call.chunks.put(None)
+            else:
+                head, chunks = call.buffer
+                call.future.set_result(self._result(dict(head, body=b''.join(chunks), encoding=None), call))
+        elif kind in ('error', 'pong'):
+            del self._calls[request_id]
+            if kind == 'pong':
+                call.future.set_result(frame)
+            else:
+                self._fail(call, FrameError(frame.get('error')))
+
+    def ping(self, timeout=None):
+        """Round-trip time of an empty frame, in seconds"""
+        self.connect()
+        call = _Call(stream=True)
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            channel = self.channel
+        self._calls[request_id] = call
+        channel.send({'type': 'ping', 'id': request_id})
+        call.future.result(timeout or self.timeout)
+        return time.monotonic() - call.started
+
+    def _drop(self, channel):
+        with self._lock:
+            if self.channel is channel:
+                self.channel = None
+        channel.close()
+
+    def _fail(self, call, error):
+        if call.stream:
+            if call.chunks is not None:
+                call.chunks.put(error)
+            elif not call.future.done():
+                call.future.set_exception(error)
+        elif not call.future.done():
+            call.future.set_result(self._error_result(call.started, str(error)))
+
+    @staticmethod
+    def _error_result(started, error):
+        return {
+            'ok': False,
+            'status': None,
+            'data': None,
+            'error': error,
+            'headers': {},
+            'elapsed': time.monotonic() - started
+        }
+
+    @staticmethod
+    def _result(frame, call):
+        body = unpack_body(frame.get('body'), frame.get('encoding'))
+        headers = frame.get('headers') or {}
+        data = body.decode('utf-8', 'replace')
+        if headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                data = json.loads(body)
+            except ValueError:
+                pass
+
+        status = frame['status']
+        ok = 200 <= status < 400
+        error = None
+        if not ok:
+            error = data.get('error') if isinstance(data, dict) else data
+        return {
+            'ok': ok and not (isinstance(data, dict) and data.get('success') is False),
+            'status': status,
+            'data': data,
+            'error': error,
+            'headers': headers,
+            'elapsed': time.monotonic() - call.started
+        }
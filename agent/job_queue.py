@@ -0,0 +1,258 @@
+import threading
+import time
+import uuid
+import logging
+from collections import deque
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Raised by submit when the queue is at JOB_MAX_PENDING or shutting down"""
+
+class Job:
+    """A command submitted for background execution"""
+
+    def __init__(self, command, timeout, category):
+        self.id = uuid.uuid4().hex
+        self.command = command
+        self.timeout = timeout
+        self.category = category
+        self.state = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.exit_code = None
+        self.success = None
+        self.error = None
+        self.output = deque()
+        self.output_bytes = 0
+        self.truncated = False
+        self.cancel_requested = False
+        self.done = threading.Event()
+
+    def append_output(self, stream, data, limit):
+        """Keep the tail of the output within limit bytes"""
+        self.output.append((stream, data))
+        self.output_bytes += len(data)
+        while self.output_bytes > limit and len(self.output) > 1:
+            _, dropped = self.output.popleft()
+            self.output_bytes -= len(dropped)
+            self.truncated = True
+
+    def to_dict(self, include_output=True):
+        job = {
+            'id': self.id,
+            'command': self.command,
+            'category': self.category,
+            'state': self.state,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'success': self.success,
+            'exit_code': self.exit_code,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested
+        }
+        if include_output:
+            job['output'] = ''.join(data for stream, data in list(self.output) if stream == 'stdout')
+            job['stderr'] = ''.join(data for stream, data in list(self.output) if stream == 'stderr')
+            job['truncated'] = self.truncated
+        return job
+
+class JobQueue:
+    """Bounded worker pool running whitelisted commands with per-category concurrency limits"""
+
+    FINISHED_STATES = ('finished', 'cancelled')
+
+    def __init__(self, executor, workers=None, category_limits=None, retention=None, max_pending=None,
+                 max_retained=None):
+        self.executor = executor
+        self.workers = workers or Config.JOB_WORKERS
+        self.category_limits = category_limits or Config.JOB_CATEGORY_LIMITS
+        self.retention = Config.JOB_RETENTION if retention is None else retention
+        self.max_pending = Config.JOB_MAX_PENDING if max_pending is None else max_pending
+        self.max_retained = Config.JOB_MAX_RETAINED if max_retained is None else max_retained
+        self.max_output = Config.JOB_MAX_OUTPUT_BYTES
+        self._deadline = None
+        self._jobs = {}
+        self._pending = deque()
+        self._running = {}
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._cond:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, command, timeout=30):
+        """Queue a command and return its job, or None if the command is not allowed
+
+        Raises QueueFull when max_pending jobs are already waiting or the
+        queue is shutting down.
+        """
+        if not self.executor.is_command_allowed(command):
+            return None
+
+        self.start()
+        job = Job(command, timeout, self.executor.get_command_category(command))
+        with self._cond:
+            if self.closed:
+                raise QueueFull('Agent is shutting down')
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f'Job queue is full ({self.max_pending} jobs waiting)')
+            self._purge_expired()
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._cond.notify_all()
+
+        logger.info(f"Queued job {job.id} ({job.category}): {command}")
+        return job
+
+    def get(self, job_id, wait=0):
+        """Return a job, optionally waiting up to `wait` seconds for it to finish"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job and wait > 0:
+            job.done.wait(wait)
+        return job
+
+    def list(self):
+        with self._cond:
+            self._purge_expired()
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or kill a running one"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.state in self.FINISHED_STATES:
+                return job
+
+            job.cancel_requested = True
+            if job.state == 'queued':
+                self._pending.remove(job)
+                self._finish(job, 'cancelled', error='Cancelled before start')
+        return job
+
+    @property
+    def closed(self):
+        return self._deadline is not None
+
+    def close(self, grace=None):
+        """Stop taking jobs and cancel queued ones; running jobs get `grace` seconds from now
+
+        Returns immediately, so it is safe to call from a signal handler.
+        Later calls keep the first deadline.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            grace = Config.SHUTDOWN_GRACE_PERIOD if grace is None else grace
+            self._deadline = time.monotonic() + grace
+            for job in self._pending:
+                job.cancel_requested = True
+                self._finish(job, 'cancelled', error='Agent shutting down')
+            self._pending.clear()
+
+    def shutdown(self, grace=None):
+        """Close the queue, wait for running jobs until the deadline and kill the rest"""
+        self.close(grace)
+        with self._cond:
+            running = [job for job in self._jobs.values() if job.state == 'running']
+        if not running:
+            return
+
+        logger.info(f"Waiting for {len(running)} running job(s) to finish")
+        for job in running:
+            job.done.wait(max(self._deadline - time.monotonic(), 0))
+        for job in running:
+            if not job.done.is_set():
+                logger.warning(f"Killing job {job.id} after the shutdown grace period")
+                job.cancel_requested = True
+        for job in running:
+            # Workers notice within one heartbeat and kill the process group
+            job.done.wait(5)
+
+    def _next_job(self):
+        """Pick the oldest queued job whose category has a free slot (caller holds the lock)"""
+        for job in self._pending:
+            limit = self.category_limits.get(job.category, self.workers)
+            if self._running.get(job.category, 0) < limit:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.category] = self._running.get(job.category, 0) + 1
+                job.state = 'running'
+                job.started_at = time.time()
+
+            try:
+                self._run(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                with self._cond:
+                    self._finish(job, 'finished', success=False, exit_code=-1, error=str(e))
+            finally:
+                with self._cond:
+                    self._running[job.category] -= 1
+                    self._cond.notify_all()
+
+    def _run(self, job):
+        # A short heartbeat lets cancellation take effect even while the command is silent
+        events = self.executor.stream_command(job.command, job.timeout, heartbeat=0.5)
+        try:
+            for event in events:
+                if job.cancel_requested:
+                    break
+                if event['type'] == 'output':
+                    job.append_output(event['stream'], event['data'], self.max_output)
+                elif event['type'] == 'exit':
+                    with self._cond:
+                        self._finish(job, 'finished', success=event['success'],
+                                     exit_code=event['exit_code'], error=event.get('error'))
+                    return
+        finally:
+            # Closing the generator kills the command if it is still running
+            events.close()
+
+        with self._cond:
+            self._finish(job, 'cancelled', exit_code=-1, error='Cancelled while running')
+
+    def _finish(self, job, state, success=False, exit_code=None, error=None):
+        """Record a job's outcome and wake any long-pollers (caller holds the lock)"""
+        job.state = state
+        job.success = success
+        job.exit_code = exit_code
+        job.error = error
+        job.finished_at = time.time()
+        job.done.set()
+        self._purge_expired()
+
+    def _purge_expired(self):
+        """Drop finished jobs older than the retention window, then the oldest past max_retained
+
+        Caller holds the lock.
+        """
+        cutoff = time.time() - self.retention
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        excess = len(finished) - self.max_retained
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at < cutoff:
+                del self._jobs[job.id]
@@ -0,0 +1,209 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from config import Config
+
+access_logger = logging.getLogger('server_agent.access')
+
+# Attributes every LogRecord has; anything else was passed via extra=
+RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller
+
+    Records are flattened on the calling thread (message interpolated,
+    traceback rendered to text) and dropped, with a count, if the queue is
+    full rather than waiting for the writer to catch up.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID and route to records logged while handling a request"""
+
+    def filter(self, record):
+        from flask import g, has_request_context, request
+
+        if has_request_context() and not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id')
+            record.route = request.url_rule.rule if request.url_rule else request.path
+        return True
+
+def gzip_namer(name):
+    return name + '.gz'
+
+def gzip_rotator(source, dest):
+    """Compress a rotated log file (runs on the writer thread)"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def create_file_handler(path=None):
+    """Rotating file handler: by time if LOG_ROTATE_WHEN is set, otherwise by size"""
+    path = path or Config.LOG_FILE
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if Config.LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=Config.LOG_ROTATE_WHEN, backupCount=Config.LOG_BACKUP_COUNT, utc=True
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT
+        )
+
+    if Config.LOG_COMPRESS:
+        handler.namer = gzip_namer
+        handler.rotator = gzip_rotator
+    return handler
+
+class LogPipeline:
+    """Root logger -> bounded queue -> background listener -> file and stdout"""
+
+    def __init__(self, level=None, log_format=None, queue_size=None):
+        self.level = level or Config.LOG_LEVEL
+        self.log_format = log_format or Config.LOG_FORMAT
+        self.queue = queue.Queue(maxsize=queue_size or Config.LOG_QUEUE_SIZE)
+        self.queue_handler = NonBlockingQueueHandler(self.queue)
+        self.queue_handler.addFilter(RequestContextFilter())
+        self.listener = None
+
+    def start(self):
+        if self.log_format == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+        handlers = [create_file_handler(), logging.StreamHandler(sys.stdout)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(self.level)
+
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Flush everything still queued and close the files"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+        if self.queue_handler.dropped:
+            sys.stderr.write(f"Dropped {self.queue_handler.dropped} log records (queue full)\n")
+
+_pipeline = None
+
+def setup_logging(**options):
+    """Route all logging through one background writer (idempotent)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(**options).start()
+    return _pipeline
+
+def access_sample_rate(route, method, status, duration):
+    """Fraction of requests like this one to log
+
+    Successful, fast reads of high-volume routes are sampled at
+    LOG_SAMPLE_RATE; errors, slow requests and writes are always logged.
+    """
+    if (method == 'GET' and route in Config.LOG_SAMPLED_ROUTES and status < 400
+            and duration < Config.LOG_SLOW_REQUEST):
+        return Config.LOG_SAMPLE_RATE
+    return 1.0
+
+def init_app(app):
+    """Assign request IDs and write one structured access record per request"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-Id', '')[:128] or uuid.uuid4().hex
+        g.request_started = time.monotonic()
+
+    @app.after_request
+    def write_access_log(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+
+        # Streamed responses are logged when their headers go out
+        duration = time.monotonic() - started
+        route = request.url_rule.rule if request.url_rule else None
+        response.headers['X-Request-Id'] = g.request_id
+
+        sample_rate = access_sample_rate(route, request.method, response.status_code, duration)
+        if sample_rate >= 1.0 or random.random() < sample_rate:
+            access_logger.info(
+                f"{request.method} {request.path} {response.status_code}",
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 2),
+                    'remote_addr': request.remote_addr,
+                    'sample_rate': sample_rate
+                }
+            )
+        return response
+
+    return app
@@ -0,0 +1,246 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import logging
+from pathlib import PurePosixPath
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+def content_hash(data):
+    """SHA-256 hex digest used as the version of a managed file"""
+    return hashlib.sha256(data).hexdigest()
+
+def atomic_write(path, data, mode=0o644):
+    """Replace path with data via temp file + fsync + rename, keeping mode and owner
+
+    mode only applies when path does not exist yet.
+    """
+    directory = os.path.dirname(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        stat = None
+
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if stat is not None:
+            os.chmod(temp_path, stat.st_mode & 0o7777)
+            try:
+                os.chown(temp_path, stat.st_uid, stat.st_gid)
+            except PermissionError:
+                pass
+        else:
+            os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def apply_unified_diff(original, diff):
+    """Apply a unified diff to original text, requiring every context line to match exactly"""
+    source = original.splitlines(keepends=True)
+    output = []
+    position = 0
+    lines = diff.splitlines(keepends=True)
+    index = 0
+    hunks = 0
+
+    while index < len(lines):
+        match = HUNK_HEADER.match(lines[index])
+        index += 1
+        if not match:
+            # File headers (---/+++/diff) and anything between hunks
+            continue
+
+        hunks += 1
+        old_start = int(match.group(1))
+        old_length = int(match.group(2)) if match.group(2) is not None else 1
+        start = old_start - 1 if old_length > 0 else old_start
+        if start < position or start > len(source):
+            raise ValueError(f'Hunk {hunks} does not apply at line {old_start}')
+        output.extend(source[position:start])
+        position = start
+
+        last_tag = None
+        while index < len(lines) and not lines[index].startswith('@@'):
+            line = lines[index]
+            tag, text = line[:1], line[1:]
+            if tag == '\\':
+                # "\ No newline at end of file" refers to the previous line
+                if last_tag == '+' and output:
+                    output[-1] = output[-1].rstrip('\n')
+            elif tag in (' ', '-', '\n', '\r'):
+                if tag in ('\n', '\r'):
+                    # Blank context line whose leading space was stripped
+                    tag, text = ' ', line
+                expected = text.rstrip('\n')
+                if position >= len(source) or source[position].rstrip('\n') != expected:
+                    raise ValueError(f'Hunk {hunks} context mismatch at line {position + 1}')
+                if tag == ' ':
+                    output.append(source[position])
+                position += 1
+            elif tag == '+':
+                output.append(text if text.endswith('\n') else text + '\n')
+            else:
+                raise ValueError(f'Malformed line in hunk {hunks}: {line.rstrip()}')
+            last_tag = tag
+            index += 1
+
+    if not hunks:
+        raise ValueError('Patch contains no hunks')
+
+    output.extend(source[position:])
+    return ''.join(output)
+
+class ManagedConfigStore:
+    """Read and write allow-listed config files with content-hash versioning
+
+    Writes are compare-and-swap on the SHA-256 of the current content, so a
+    client editing from a stale copy gets a conflict instead of silently
+    overwriting someone else's change.
+    """
+
+    def __init__(self, patterns=None, backup_store=None):
+        self.patterns = patterns or Config.MANAGED_CONFIG_PATTERNS
+        self.backup_store = backup_store
+        self._lock = threading.Lock()
+
+    def resolve(self, path):
+        """Return the real path if it is managed, otherwise None"""
+        if not path or '\0' in path:
+            return None
+        path = os.path.normpath(path)
+        real_path = os.path.realpath(path)
+        # Both the requested path and its symlink target must be allow-listed
+        if self._matches(path) and self._matches(real_path):
+            return real_path
+        return None
+
+    def _matches(self, path):
+        pure = PurePosixPath(path)
+        return pure.is_absolute() and any(pure.match(pattern) for pattern in self.patterns)
+
+    def list_files(self):
+        """Metadata for every existing managed file"""
+        files = []
+        for pattern in self.patterns:
+            for path in sorted(glob.glob(pattern)):
+                if not os.path.isfile(path) or not self.resolve(path):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                files.append({
+                    'path': path,
+                    'size': len(data),
+                    'sha256': content_hash(data),
+                    'mtime': os.path.getmtime(path)
+                })
+        return files
+
+    def read(self, path):
+        """Return (data, sha256) for a managed file"""
+        real_path = self.resolve(path)
+        if not real_path:
+            raise PermissionError(f'Path is not a managed config file: {path}')
+        with open(real_path, 'rb') as f:
+            data = f.read()
+        return data, content_hash(data)
+
+    def write(self, path, data, base_hash=None, validate=None):
+        """Replace a managed file if its current hash equals base_hash
+
+        base_hash may be None only when creating a new file. validate, if
+        given, is called after the write and must return (ok, error); a
+        failed validation restores the previous content.
+        """
+        real_path = self.resolve(path)
+        if not real_path:
+            return {'success': False, 'code': 'not_allowed', 'error': f'Path is not a managed config file: {path}'}
+
+        with self._lock:
+            try:
+                with open(real_path, 'rb') as f:
+                    current = f.read()
+            except FileNotFoundError:
+                current = None
+
+            current_hash = content_hash(current) if current is not None else None
+            if current is not None and base_hash is None:
+                return {'success': False, 'code': 'precondition_required',
+                        'error': 'If-Match with the current content hash is required', 'sha256': current_hash}
+            if base_hash is not None and base_hash != current_hash:
+                return {'success': False, 'code': 'conflict',
+                        'error': 'File changed since base version', 'sha256': current_hash}
+
+            if not os.path.isdir(os.path.dirname(real_path)):
+                return {'success': False, 'code': 'not_found', 'error': f'Directory does not exist for {path}'}
+
+            backup = None
+            if current is not None and self.backup_store is not None:
+                backup = self.backup_store.snapshot(real_path, current, reason='before managed update')
+
+            atomic_write(real_path, data)
+
+            if validate:
+                ok, error = validate(real_path)
+                if not ok:
+                    if current is not None:
+                        atomic_write(real_path, current)
+                    else:
+                        os.unlink(real_path)
+                    return {'success': False, 'code': 'invalid', 'error': error,
+                            'restored': True, 'sha256': current_hash}
+
+            logger.info(f"Updated managed config {real_path}")
+            return {
+                'success': True,
+                'path': real_path,
+                'previous_sha256': current_hash,
+                'backup': backup,
+                'sha256': content_hash(data),
+                'size': len(data)
+            }
+
+    def patch(self, path, diff, base_hash, validate=None):
+        """Apply a unified diff to a managed file, compare-and-swap on base_hash"""
+        if base_hash is None:
+            return {'success': False, 'code': 'precondition_required',
+                    'error': 'If-Match with the base content hash is required'}
+        try:
+            data, current_hash = self.read(path)
+        except PermissionError as e:
+            return {'success': False, 'code': 'not_allowed', 'error': str(e)}
+        except FileNotFoundError:
+            return {'success': False, 'code': 'not_found', 'error': f'File not found: {path}'}
+
+        if current_hash != base_hash:
+            return {'success': False, 'code': 'conflict',
+                    'error': 'File changed since base version', 'sha256': current_hash}
+
+        try:
+            patched = apply_unified_diff(data.decode('utf-8'), diff).encode('utf-8')
+        except (ValueError, UnicodeDecodeError) as e:
+            return {'success': False, 'code': 'invalid_patch', 'error': str(e), 'sha256': current_hash}
+
+        # write() re-checks the hash under the lock, so a concurrent edit still conflicts
+        return self.write(path, patched, base_hash, validate)
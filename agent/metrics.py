@@ -0,0 +1,253 @@
+import bisect
+import threading
+import time
+import weakref
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class _ShardOwner:
+    """Weak-referenceable marker kept in a thread's local storage next to its shard"""
+
+class _Metric:
+    """Base for lock-light metrics
+
+    Every thread records into its own shard, so the hot path is a dict
+    lookup and an in-place add with no lock and no contention. A lock is
+    only taken the first time a thread records, when a scrape sums the
+    shards, and when a thread exits: its thread-local storage is freed,
+    which folds its shard into the retired totals so short-lived request
+    threads don't pile up shards.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard).atexit = False
+            with self._lock:
+                self._shards[id(shard)] = shard
+            return shard
+
+    def _retire(self, shard):
+        """Fold the shard of a thread that exited into the retired totals"""
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            for labels, value in list(shard.items()):
+                previous = self._retired.get(labels)
+                # Replaced, never updated in place, so snapshots can read them unlocked
+                self._retired[labels] = value if previous is None else self._merge(previous, value)
+
+    def _snapshot(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            retired = list(self._retired.items())
+        # dict.items() is copied atomically under the GIL
+        return [retired] + [list(shard.items()) for shard in shards]
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    @staticmethod
+    def _merge(total, value):
+        return total + value
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self):
+        totals = {}
+        for items in self._snapshot():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def _samples(self):
+        return [f'{self.name}{self._labels(labels)} {_format(value)}'
+                for labels, value in sorted(self.values().items())]
+
+class Gauge(Counter):
+    """Up/down gauge; inc and dec may happen on different threads"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    @staticmethod
+    def _merge(total, state):
+        return [a + b for a, b in zip(total, state)]
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts (last slot is +Inf), then sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def values(self):
+        totals = {}
+        for items in self._snapshot():
+            for labels, state in items:
+                total = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        return totals
+
+    def _samples(self):
+        lines = []
+        for labels, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format(bound)
+                lines.append(f'{self.name}_bucket{self._labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labels)} {_format(state[-1])}')
+            lines.append(f'{self.name}_count{self._labels(labels)} {cumulative}')
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'agent_http_requests_total', 'HTTP requests handled, by route, method and status',
+    ('route', 'method', 'status')))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    'agent_http_request_duration_seconds', 'HTTP request latency, by route',
+    ('route', 'method')))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'agent_http_requests_in_flight', 'HTTP requests currently being handled, by route',
+    ('route',)))
+AUTH_DURATION = REGISTRY.register(Histogram(
+    'agent_auth_verify_duration_seconds', 'Time spent verifying request signatures',
+    ('scheme', 'result'),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)))
+SUBPROCESS_SPAWNS = REGISTRY.register(Counter(
+    'agent_subprocess_spawns_total', 'Whitelisted commands started, by ALLOWED_COMMANDS category',
+    ('category',)))
+SUBPROCESS_DURATION = REGISTRY.register(Histogram(
+    'agent_subprocess_duration_seconds', 'Whitelisted command run time, by category',
+    ('category',)))
+SUBPROCESS_TIMEOUTS = REGISTRY.register(Counter(
+    'agent_subprocess_timeouts_total', 'Whitelisted commands killed for exceeding their timeout',
+    ('category',)))
+FRAMED_CONNECTIONS = REGISTRY.register(Gauge(
+    'agent_framed_connections', 'Open connections on the framed transport'))
+
+class RequestMetricsMiddleware:
+    """WSGI middleware that finishes request metrics when the response is closed
+
+    Closing happens after the last byte of a streamed response, so SSE and
+    other streams count as in flight, and are timed, until they end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        status = []
+
+        def capture_status(code, headers, exc_info=None):
+            status[:] = [code.split(' ', 1)[0]]
+            return start_response(code, headers, exc_info)
+
+        def finish():
+            # Set by the before_request hook once Flask has matched a route
+            state = environ.get('agent.metrics')
+            if state is None:
+                return
+            route, method, started = state
+            HTTP_IN_FLIGHT.dec(route)
+            HTTP_REQUESTS.inc(route, method, status[0] if status else '500')
+            HTTP_DURATION.observe(time.perf_counter() - started, route, method)
+
+        try:
+            app_iter = self.app(environ, capture_status)
+        except Exception:
+            finish()
+            raise
+        return ClosingIterator(app_iter, finish)
+
+def init_app(app):
+    """Record per-route request counts, latency and in-flight gauges on a Flask app"""
+    from flask import request
+
+    app.wsgi_app = RequestMetricsMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def start_request_metrics():
+        # Unmatched paths share one label so scanners can't blow up cardinality
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request.environ['agent.metrics'] = (route, request.method, time.perf_counter())
+        HTTP_IN_FLIGHT.inc(route)
+
+    return app
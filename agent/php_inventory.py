@@ -0,0 +1,181 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+VERSION_PATTERN = re.compile(r'^(?:php)?(\d+\.\d+)$')
+
+# Runs inside each PHP build: one fork returns everything `php -v` and `php -m` used to.
+# The CLI SAPI forces some settings (max_execution_time=0, ...), so when probing another
+# SAPI's ini files the values come from the files themselves where they set them.
+PROBE_SCRIPT = """
+$ini = [];
+foreach (json_decode('%(ini_keys)s') as $key) {
+    $value = %(from_files)s ? get_cfg_var($key) : false;
+    $ini[$key] = $value !== false ? $value : ini_get($key);
+}
+echo json_encode([
+    'release' => PHP_VERSION,
+    'version_info' => 'PHP ' . PHP_VERSION . ' (' . PHP_SAPI . ') Zend Engine v' . zend_version(),
+    'modules' => get_loaded_extensions(),
+    'zend_modules' => get_loaded_extensions(true),
+    'ini' => $ini,
+    'ini_file' => php_ini_loaded_file(),
+    'ini_scanned_files' => php_ini_scanned_files(),
+]);
+"""
+
+class PhpInventory:
+    """Auto-discovered PHP builds with cached introspection
+
+    Versions are discovered from /usr/bin/phpX.Y binaries and /etc/php/X.Y
+    directories. Probe results are cached per version and keyed on the
+    binary's inode/mtime plus the mtimes of its ini files and conf.d
+    directories, so they are only refreshed when packages or ini files change.
+    """
+
+    def __init__(self, bin_dir=None, conf_dir=None, timeout=10):
+        self.bin_dir = bin_dir or Config.PHP_BIN_DIR
+        self.conf_dir = conf_dir or Config.PHP_CONF_DIR
+        self.timeout = timeout
+        self._versions = None
+        self._versions_key = None
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+
+    def discover(self):
+        """Sorted list of installed PHP versions"""
+        key = (self._mtime(self.bin_dir), self._mtime(self.conf_dir))
+        with self._lock:
+            if self._versions is not None and key == self._versions_key:
+                return self._versions
+
+        versions = set(Config.PHP_FPM_CONFIGS) if Config.PHP_FPM_CONFIGS else set()
+        for directory in (self.bin_dir, self.conf_dir):
+            try:
+                entries = os.listdir(directory)
+            except OSError:
+                continue
+            for entry in entries:
+                match = VERSION_PATTERN.match(entry)
+                if match:
+                    versions.add(match.group(1))
+
+        versions = sorted(v for v in versions if os.path.exists(self.binary(v)))
+        with self._lock:
+            self._versions = versions
+            self._versions_key = key
+        return versions
+
+    def binary(self, version):
+        return os.path.join(self.bin_dir, f'php{version}')
+
+    def get_info(self, version):
+        """Cached introspection for one version, or None if it is not installed"""
+        if version not in self.discover():
+            return None
+        return self.get_all().get(version)
+
+    def get_all(self):
+        """Cached introspection for every installed version
+
+        On any cache miss all stale versions are probed concurrently, so a
+        dashboard listing several versions pays for one PHP startup, not N.
+        """
+        versions = self.discover()
+        fingerprints = {version: self._fingerprint(version) for version in versions}
+
+        with self._probe_lock:
+            stale = [
+                version for version in versions
+                if self._cache.get(version, (None,))[0] != fingerprints[version]
+            ]
+            if stale:
+                with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                    for version, info in zip(stale, pool.map(self._probe, stale)):
+                        # Failed probes are kept for this response only and retried next time
+                        fingerprint = fingerprints[version] if info['success'] else None
+                        self._cache[version] = (fingerprint, info)
+
+            return {version: self._cache[version][1] for version in versions}
+
+    def _fingerprint(self, version):
+        """Identity of the binary and every ini input that affects the probe"""
+        try:
+            binary = os.stat(self.binary(version))
+            parts = [binary.st_ino, binary.st_mtime_ns]
+        except OSError:
+            parts = [None, None]
+
+        base = os.path.join(self.conf_dir, version)
+        for sapi in ('cli', 'fpm'):
+            parts.append(self._mtime(os.path.join(base, sapi, 'php.ini')))
+            parts.append(self._mtime(os.path.join(base, sapi, 'conf.d')))
+        parts.append(self._mtime(os.path.join(base, 'mods-available')))
+        return tuple(parts)
+
+    def _probe(self, version):
+        """CLI introspection, plus the same for FPM's php.ini and conf.d when FPM is installed"""
+        info = self._run_probe(version, 'cli')
+        fpm_dir = os.path.join(self.conf_dir, version, 'fpm')
+        if info['success'] and os.path.exists(os.path.join(fpm_dir, 'php.ini')):
+            fpm = self._run_probe(version, 'fpm', fpm_dir)
+            if not fpm['success']:
+                return fpm
+            info['fpm'] = {
+                key: fpm[key]
+                for key in ('sapi', 'modules', 'zend_modules', 'ini', 'ini_file', 'ini_scanned_files')
+            }
+        return info
+
+    def _run_probe(self, version, sapi, ini_dir=None):
+        """Run the probe script with the CLI binary, reading ini_dir's php.ini and conf.d if given"""
+        script = PROBE_SCRIPT % {
+            'ini_keys': json.dumps(Config.PHP_INI_KEYS),
+            'from_files': 'true' if ini_dir else 'false'
+        }
+        command = [self.binary(version), '-r', script]
+        env = None
+        if ini_dir:
+            command[1:1] = ['-c', os.path.join(ini_dir, 'php.ini')]
+            env = dict(os.environ, PHP_INI_SCAN_DIR=os.path.join(ini_dir, 'conf.d'))
+        try:
+            result = subprocess.run(
+                command,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+                env=env
+            )
+            if result.returncode != 0:
+                return {
+                    'success': False,
+                    'error': f'PHP {version} not installed or not accessible'
+                }
+
+            # Startup warnings (e.g. a missing extension) may be printed before the JSON line
+            info = json.loads(result.stdout.strip().splitlines()[-1])
+            info['sapi'] = sapi
+            scanned = info.pop('ini_scanned_files') or ''
+            info['ini_scanned_files'] = [path.strip().rstrip(',') for path in scanned.split('\n') if path.strip()]
+            info['modules'] = sorted(info['modules'], key=str.lower)
+            return dict(info, success=True)
+        except subprocess.TimeoutExpired:
+            return {'success': False, 'error': f'PHP {version} {sapi} probe timeout'}
+        except Exception as e:
+            logger.error(f"Failed to probe PHP {version}: {e}")
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,224 @@
+import os
+import pwd
+import threading
+import time
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+SORT_FIELDS = {
+    'cpu': 'cpu_percent',
+    'rss': 'rss',
+    'io': 'io_bytes_per_sec'
+}
+
+class ProcessExplorer:
+    """Top-N process listing read straight from /proc
+
+    Each scan reads /proc/<pid>/stat and /proc/<pid>/io for every process
+    and keeps the CPU ticks and I/O byte counters it saw, keyed by pid and
+    start time, so CPU% and I/O rates are deltas since the previous scan
+    rather than lifetime averages. Scans are shared: requests within
+    PROCESS_SAMPLE_INTERVAL of the last one reuse it. When there is no
+    recent baseline (first request, or the last scan is older than
+    PROCESS_MAX_WINDOW) two scans PROCESS_BASELINE_DELAY apart are taken.
+    Command lines and cgroups are only read for processes that need them
+    and are cached for as long as the process lives.
+    """
+
+    CMDLINE_LIMIT = 1024
+
+    def __init__(self, proc='/proc', interval=None, max_window=None, baseline_delay=None):
+        self.proc = proc
+        self.interval = Config.PROCESS_SAMPLE_INTERVAL if interval is None else interval
+        self.max_window = max_window or Config.PROCESS_MAX_WINDOW
+        self.baseline_delay = Config.PROCESS_BASELINE_DELAY if baseline_delay is None else baseline_delay
+        self.scans = 0
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._window = 0.0
+        self._last_scan = 0.0
+        self._counters = {}
+        self._details = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def query(self, sort='cpu', limit=20, user=None, name=None, service=None, cgroup=None):
+        """The top `limit` processes by sort (cpu, rss or io) among those matching every filter
+
+        user is a user name or uid, name a substring of the process name or
+        command line, service a systemd unit whose cgroup the process is in,
+        cgroup a substring of the cgroup path.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Invalid sort '{sort}'. Use {', '.join(SORT_FIELDS)}")
+        if service and '.' not in service:
+            service += '.service'
+
+        processes, window = self.sample()
+        matched = [
+            process for process in processes
+            if (user is None or user in (process['user'], str(process['uid'])))
+            and (name is None or self._matches_name(process, name))
+            and (service is None or f'/{service}' in self._cgroup(process))
+            and (cgroup is None or cgroup in self._cgroup(process))
+        ]
+
+        field = SORT_FIELDS[sort]
+        matched.sort(key=lambda process: process[field] or 0, reverse=True)
+        return {
+            'sort': sort,
+            'window': round(window, 3),
+            'total': len(processes),
+            'matched': len(matched),
+            'cpu_count': os.cpu_count(),
+            'processes': [self._describe(process) for process in matched[:max(limit, 0)]]
+        }
+
+    def sample(self):
+        """Current process list and the seconds its rates cover, scanning /proc when due"""
+        with self._lock:
+            age = time.monotonic() - self._snapshot_time
+            if self._snapshot is None or age >= self.interval:
+                if self._snapshot is None or age >= self.max_window:
+                    # Rates need a recent baseline; an old one would average over minutes
+                    self._scan()
+                    time.sleep(self.baseline_delay)
+                self._snapshot, self._window = self._scan()
+                self._snapshot_time = time.monotonic()
+            return self._snapshot, self._window
+
+    def _scan(self):
+        """Read every process and compute its rates against the previous scan"""
+        now = time.monotonic()
+        window = now - self._last_scan if self._counters else 0.0
+        previous = self._counters
+        counters = {}
+        processes = []
+
+        for entry in os.scandir(self.proc):
+            if not entry.name.isdigit():
+                continue
+            process = self._read_process(entry)
+            if process is None:
+                continue
+
+            key = (process['pid'], process['start'])
+            counters[key] = (process['ticks'], process['read_bytes'], process['write_bytes'])
+            # A process that started since the last scan did all its work inside the window
+            ticks, read_bytes, write_bytes = previous.get(key, (0, 0, 0))
+            if window > 0:
+                process['cpu_percent'] = round((process['ticks'] - ticks) / CLOCK_TICKS / window * 100, 1)
+                if process['read_bytes'] is not None:
+                    read_rate = (process['read_bytes'] - (read_bytes or 0)) / window
+                    write_rate = (process['write_bytes'] - (write_bytes or 0)) / window
+                    process['read_bytes_per_sec'] = int(read_rate)
+                    process['write_bytes_per_sec'] = int(write_rate)
+                    process['io_bytes_per_sec'] = int(read_rate + write_rate)
+            processes.append(process)
+
+        self._counters = counters
+        self._last_scan = now
+        # Drop cached command lines and cgroups of processes that exited
+        # (list() copies the items atomically while queries may be adding to the cache)
+        self._details = {key: value for key, value in list(self._details.items()) if key in counters}
+        self.scans += 1
+        return processes, window
+
+    def _read_process(self, entry):
+        """Parse /proc/<pid>/stat (and io when readable); None if the process is gone"""
+        try:
+            with open(f'{entry.path}/stat', 'rb') as f:
+                stat = f.read()
+            uid = entry.stat().st_uid
+        except OSError:
+            return None
+
+        # The name is in parentheses and may itself contain spaces or ')'
+        close = stat.rindex(b')')
+        fields = stat[close + 2:].split()
+        process = {
+            'pid': int(entry.name),
+            'ppid': int(fields[1]),
+            'name': stat[stat.index(b'(') + 1:close].decode('utf-8', 'replace'),
+            'state': fields[0].decode('ascii'),
+            'uid': uid,
+            'user': self._user(uid),
+            'threads': int(fields[17]),
+            'start': int(fields[19]),
+            'ticks': int(fields[11]) + int(fields[12]),
+            'rss': int(fields[21]) * PAGE_SIZE,
+            'read_bytes': None,
+            'write_bytes': None,
+            'cpu_percent': 0.0,
+            'read_bytes_per_sec': None,
+            'write_bytes_per_sec': None,
+            'io_bytes_per_sec': None
+        }
+
+        try:
+            with open(f'{entry.path}/io', 'rb') as f:
+                io = f.read().split(b'\n')
+            # rchar, wchar, syscr, syscw, read_bytes, write_bytes, cancelled_write_bytes
+            process['read_bytes'] = int(io[4].split()[1])
+            process['write_bytes'] = int(io[5].split()[1])
+        except (OSError, IndexError, ValueError):
+            # Other users' processes when not running as root
+            pass
+        return process
+
+    def _user(self, uid):
+        user = self._users.get(uid)
+        if user is None:
+            try:
+                user = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                user = str(uid)
+            self._users[uid] = user
+        return user
+
+    def _detail(self, process, name):
+        """Read /proc/<pid>/<name> once per process lifetime"""
+        details = self._details.setdefault((process['pid'], process['start']), {})
+        if name not in details:
+            try:
+                with open(f"{self.proc}/{process['pid']}/{name}", 'rb') as f:
+                    details[name] = f.read()
+            except OSError:
+                details[name] = b''
+        return details[name]
+
+    def _cmdline(self, process):
+        return self._detail(process, 'cmdline').replace(b'\0', b' ').strip().decode('utf-8', 'replace')
+
+    def _cgroup(self, process):
+        """The process's cgroup v2 path (or the systemd hierarchy on v1)"""
+        paths = {}
+        for line in self._detail(process, 'cgroup').decode('utf-8', 'replace').splitlines():
+            hierarchy, _, rest = line.partition(':')
+            controllers, _, path = rest.partition(':')
+            paths[controllers] = path
+        return paths.get('', paths.get('name=systemd', ''))
+
+    def _matches_name(self, process, name):
+        return name in process['name'] or name in self._cmdline(process)
+
+    def _describe(self, process):
+        return {
+            'pid': process['pid'],
+            'ppid': process['ppid'],
+            'user': process['user'],
+            'name': process['name'],
+            'state': process['state'],
+            'threads': process['threads'],
+            'cpu_percent': process['cpu_percent'],
+            'rss': process['rss'],
+            'read_bytes_per_sec': process['read_bytes_per_sec'],
+            'write_bytes_per_sec': process['write_bytes_per_sec'],
+            'cgroup': self._cgroup(process),
+            'cmdline': self._cmdline(process)[:self.CMDLINE_LIMIT]
+        }
@@ -0,0 +1,126 @@
+import _thread
+import threading
+import time
+import logging
+import json
+from werkzeug.wsgi import ClosingIterator
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class InFlightTracker:
+    """WSGI middleware that counts running requests and rejects new ones while draining"""
+
+    def __init__(self, app):
+        self.app = app
+        self.draining = False
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def active(self):
+        with self._cond:
+            return self._active
+
+    def __call__(self, environ, start_response):
+        if self.draining:
+            body = json.dumps({
+                'success': False,
+                'error': 'Agent is shutting down'
+            }).encode('utf-8')
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body))),
+                ('Connection', 'close')
+            ])
+            return [body]
+
+        with self._cond:
+            self._active += 1
+        try:
+            app_iter = self.app(environ, start_response)
+        except Exception:
+            self._finish()
+            raise
+        # Streaming responses count as in flight until the server closes the iterator
+        return ClosingIterator(app_iter, self._finish)
+
+    def _finish(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """Block until no requests are running or the timeout passes"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+class ProductionServer:
+    """Multi-threaded waitress server with keep-alive, a connection limit and graceful drain"""
+
+    def __init__(self, app, host=None, port=None, threads=None, connection_limit=None,
+                 backlog=None, keepalive_timeout=None, grace_period=None):
+        self.app = InFlightTracker(app)
+        self.host = host or Config.HOST
+        self.port = port or Config.PORT
+        self.threads = threads or Config.SERVER_THREADS
+        self.connection_limit = connection_limit or Config.SERVER_CONNECTION_LIMIT
+        self.backlog = backlog or Config.SERVER_BACKLOG
+        self.keepalive_timeout = keepalive_timeout or Config.SERVER_KEEPALIVE_TIMEOUT
+        self.grace_period = Config.SHUTDOWN_GRACE_PERIOD if grace_period is None else grace_period
+        self.server = None
+        self._shutdown_started = False
+
+    def serve(self):
+        """Serve until shutdown() has drained in-flight requests"""
+        from waitress import create_server
+
+        self.server = create_server(
+            self.app,
+            host=self.host,
+            port=self.port,
+            threads=self.threads,
+            connection_limit=self.connection_limit,
+            backlog=self.backlog,
+            channel_timeout=self.keepalive_timeout,
+            ident='server-agent'
+        )
+        logger.info(
+            f"Production server listening on {self.host}:{self.port} "
+            f"({self.threads} threads, {self.connection_limit} connections, backlog {self.backlog})"
+        )
+        self.server.run()
+        logger.info("Production server stopped")
+
+    def shutdown(self):
+        """Stop accepting connections and drain in-flight requests in the background
+
+        Safe to call from a signal handler: the serving loop keeps running so
+        finished responses are still flushed, and is interrupted once idle.
+        """
+        if self._shutdown_started:
+            return
+        self._shutdown_started = True
+
+        self.app.draining = True
+        if self.server is not None:
+            self.server.accepting = False
+
+        threading.Thread(target=self._drain, name='agent-drain', daemon=True).start()
+
+    def _drain(self):
+        active = self.app.active
+        logger.info(f"Draining {active} in-flight request(s) (grace period {self.grace_period}s)")
+
+        if not self.app.wait_idle(self.grace_period):
+            logger.warning(f"Grace period expired with {self.app.active} request(s) still running")
+
+        # Give the I/O loop a moment to flush the last responses
+        time.sleep(0.5)
+        _thread.interrupt_main()
@@ -0,0 +1,195 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from werkzeug.wsgi import ClosingIterator
+from config import Config
+
+class ProfileSession:
+    """Stack samples collected for one profiled request"""
+
+    def __init__(self):
+        self.route = 'unmatched'
+        self.started = time.perf_counter()
+        self.samples = Counter()
+
+class RequestProfiler:
+    """Statistical profiler for a sampled subset of requests
+
+    While at least one profiled request is running, a background thread
+    reads the stacks of the threads handling them every `interval` seconds
+    (sys._current_frames), so unprofiled requests pay nothing and profiled
+    ones only pay for the sampler thread. Samples are folded into
+    per-route stack counts; samples taken inside the subprocess module count
+    as subprocess wait time.
+    """
+
+    def __init__(self, sample_rate=None, interval=None, max_active=None, max_stacks=None):
+        self.sample_rate = Config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.interval = interval or Config.PROFILE_INTERVAL
+        self.max_active = max_active or Config.PROFILE_MAX_ACTIVE
+        self.max_stacks = max_stacks or Config.PROFILE_MAX_STACKS
+        self.header_key = 'HTTP_' + Config.PROFILE_HEADER.upper().replace('-', '_')
+        self.routes = {}
+        self.started = time.time()
+        self._active = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def should_profile(self, environ, verify):
+        """Sampled requests, and flagged ones whose sender passes verify()"""
+        if environ.get(self.header_key, '').lower() in ('1', 'true', 'yes') and verify():
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self):
+        """Start sampling the calling thread; returns None when too many requests are profiled"""
+        session = ProfileSession()
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                return None
+            self._active[threading.get_ident()] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        return session
+
+    def end(self, session):
+        duration = time.perf_counter() - session.started
+        with self._lock:
+            for ident, active in list(self._active.items()):
+                if active is session:
+                    del self._active[ident]
+
+            route = self.routes.setdefault(session.route, {
+                'requests': 0,
+                'duration': 0.0,
+                'samples': 0,
+                'subprocess_samples': 0,
+                'stacks': Counter()
+            })
+            route['requests'] += 1
+            route['duration'] += duration
+            stacks = route['stacks']
+            for stack, count in session.samples.items():
+                route['samples'] += count
+                if 'subprocess.py:' in stack:
+                    route['subprocess_samples'] += count
+                if stack not in stacks and len(stacks) >= self.max_stacks:
+                    stack = '[truncated]'
+                stacks[stack] += count
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.started = time.time()
+
+    def _run(self):
+        while True:
+            # Sleep first so samples aren't biased towards the start of a request
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+
+            frames = sys._current_frames()
+            for ident, session in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    session.samples[self._fold(frame)] += 1
+            del frames
+
+    @staticmethod
+    def _fold(frame, limit=64):
+        """Render a stack root-first as 'file.py:function;...'"""
+        names = []
+        while frame is not None and len(names) < limit:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def summary(self, top=10):
+        """Per-route totals with the hottest stacks and leaf functions"""
+        with self._lock:
+            routes = {name: dict(data, stacks=Counter(data['stacks'])) for name, data in self.routes.items()}
+
+        result = {}
+        for name, data in routes.items():
+            leaves = Counter()
+            for stack, count in data['stacks'].items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            result[name] = {
+                'requests': data['requests'],
+                'mean_duration_ms': round(data['duration'] / data['requests'] * 1000, 3),
+                'samples': data['samples'],
+                'sampled_seconds': round(data['samples'] * self.interval, 4),
+                'subprocess_wait_seconds': round(data['subprocess_samples'] * self.interval, 4),
+                'top_functions': [{'function': leaf, 'samples': count} for leaf, count in leaves.most_common(top)],
+                'top_stacks': [{'stack': stack, 'samples': count} for stack, count in data['stacks'].most_common(top)]
+            }
+        return {
+            'since': self.started,
+            'interval': self.interval,
+            'sample_rate': self.sample_rate,
+            'routes': result
+        }
+
+    def folded(self):
+        """All samples in folded-stack format (one 'route;frames count' per line) for flamegraph tools"""
+        with self._lock:
+            lines = [
+                f'{route};{stack} {count}'
+                for route, data in self.routes.items()
+                for stack, count in data['stacks'].items()
+            ]
+        return '\n'.join(sorted(lines)) + '\n'
+
+class ProfilingMiddleware:
+    """WSGI middleware that ends a request's profile once its response is closed
+
+    The profile itself is started by the before_request hook in init_app,
+    after routing, so the X-Profile header can be checked against the
+    request's signature.
+    """
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        try:
+            app_iter = self.app(environ, start_response)
+        except Exception:
+            session = environ.get('agent.profile')
+            if session is not None:
+                self.profiler.end(session)
+            raise
+
+        session = environ.get('agent.profile')
+        if session is None:
+            return app_iter
+        return ClosingIterator(app_iter, lambda: self.profiler.end(session))
+
+def init_app(app, profiler, verify):
+    """Profile sampled requests, and X-Profile flagged ones that pass verify(), labelled by route"""
+    from flask import request
+
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, profiler)
+
+    @app.before_request
+    def start_profile():
+        if not profiler.should_profile(request.environ, verify):
+            return
+        session = profiler.begin()
+        if session is None:
+            return
+        if request.url_rule is not None:
+            session.route = request.url_rule.rule
+        request.environ['agent.profile'] = session
+
+    return app
@@ -0,0 +1,72 @@
+import fnmatch
+import threading
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class _PendingReload:
+    """Reload shared by every caller that arrived within one debounce window"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.waiters = 0
+
+class ReloadScheduler:
+    """Coalesce bursts of `systemctl reload` requests into one reload per service"""
+
+    def __init__(self, executor, window=None, patterns=None, timeout=30):
+        self.executor = executor
+        self.window = Config.RELOAD_DEBOUNCE_WINDOW if window is None else window
+        self.patterns = patterns or Config.RELOAD_COALESCED_SERVICES
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def handles(self, service):
+        """Whether reloads of this service are coalesced"""
+        return any(fnmatch.fnmatch(service, pattern) for pattern in self.patterns)
+
+    def request_reload(self, service):
+        """Schedule a reload and block until the shared reload has run"""
+        if self.window <= 0 or not self.handles(service):
+            return self._reload(service)
+
+        with self._lock:
+            pending = self._pending.get(service)
+            if pending is None:
+                pending = _PendingReload()
+                self._pending[service] = pending
+                timer = threading.Timer(self.window, self._fire, args=(service, pending))
+                timer.daemon = True
+                timer.start()
+            pending.waiters += 1
+
+        if not pending.done.wait(self.window + self.timeout + 5):
+            return {
+                'success': False,
+                'error': f'Timed out waiting for {service} reload',
+                'output': '',
+                'exit_code': -1
+            }
+
+        return dict(pending.result, coalesced=pending.waiters)
+
+    def _fire(self, service, pending):
+        # Callers arriving from now on start a new window
+        with self._lock:
+            if self._pending.get(service) is pending:
+                del self._pending[service]
+
+        logger.info(f"Reloading {service} for {pending.waiters} coalesced request(s)")
+        try:
+            pending.result = self._reload(service)
+        except Exception as e:
+            logger.error(f"Coalesced reload of {service} failed: {e}")
+            pending.result = {'success': False, 'error': str(e), 'output': '', 'exit_code': -1}
+        finally:
+            pending.done.set()
+
+    def _reload(self, service):
+        return self.executor.execute_command(f'systemctl reload {service}', self.timeout)
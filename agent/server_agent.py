@@ -8,57 +8,130 @@ import os
 import sys
 import json
 import logging
+import math
+import signal
+import threading
 import time
+
+# Startup is reported from here; Flask's import dominates what follows
+IMPORT_STARTED = time.perf_counter()
+
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from werkzeug.exceptions import BadRequest
 
 from config import Config
-from auth import RSAAuth
+from auth import RSAAuth, ReplayGuard
 from command_executor import CommandExecutor
+from job_queue import JobQueue, QueueFull
+from telemetry import TelemetryHub
+from service_watch import ServiceWatcher
+import compression
+import log_pipeline
+import metrics
+import profiling
+from managed_config import ManagedConfigStore, atomic_write
+from backup_store import BackupStore
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configure logging: records are queued and written by a background thread
+log_pipeline.setup_logging()
 
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
+compression.init_app(app)
+log_pipeline.init_app(app)
+metrics.init_app(app)
+profiler = profiling.RequestProfiler()
+if Config.PROFILING_ENABLED:
+    # X-Profile is only honoured on signed requests
+    profiling.init_app(app, profiler, lambda: verify_request()[0])
 
 # Initialize components
 auth = RSAAuth(
     private_key_path=Config.RSA_PRIVATE_KEY_PATH,
-    public_key_path=Config.RSA_PUBLIC_KEY_PATH
+    public_key_path=Config.RSA_PUBLIC_KEY_PATH,
+    session_ttl=Config.SESSION_KEY_TTL,
+    max_age=Config.AUTH_MAX_AGE,
+    require_nonce=Config.REQUIRE_NONCE,
+    replay_guard=ReplayGuard(
+        window=Config.AUTH_MAX_AGE,
+        bucket_seconds=Config.REPLAY_BUCKET_SECONDS,
+        max_entries=Config.REPLAY_MAX_ENTRIES
+    ) if Config.REPLAY_PROTECTION_ENABLED else None
 )
 command_executor = CommandExecutor()
+job_queue = JobQueue(command_executor)
+telemetry_hub = TelemetryHub(command_executor)
+service_watcher = ServiceWatcher(command_executor.service_monitor)
+backup_store = BackupStore()
+config_store = ManagedConfigStore(backup_store=backup_store)
+production_server = None
+framed_server = None
 
-def verify_request():
-    """Verify RSA signature and timestamp for incoming requests"""
+def verify_request(allow_session=True):
+    """Verify RSA signature (or session HMAC) and timestamp for incoming requests
+
+    The outcome is kept for the rest of the request, so checking twice (the
+    profiler, then the route) doesn't trip replay protection.
+    """
+    if 'auth_result' not in g:
+        g.auth_result = check_signature()
+    verified, error, via_session = g.auth_result
+    if via_session and not allow_session:
+        return False, "Session authentication not allowed"
+    return verified, error
+
+def check_signature():
+    """Verify the request's signature once; returns (verified, error, via_session)"""
     try:
+        # Framed-transport connections are RSA-authenticated once, at the handshake
+        if request.environ.get('agent.framed_peer') is not None:
+            return True, None, False
+        
         # Get request data
         data = request.get_data(as_text=True)
         signature = request.headers.get('X-Signature')
         timestamp = request.headers.get('X-Timestamp')
+        session_id = request.headers.get('X-Session-Id')
+        nonce = request.headers.get('X-Nonce')
         
         if not signature or not timestamp:
-            return False, "Missing signature or timestamp"
+            return False, "Missing signature or timestamp", False
+        
+        if nonce is not None and not 0 < len(nonce) <= 128:
+            return False, "Invalid nonce", False
+        
+        if session_id:
+            if not Config.SESSION_AUTH_ENABLED:
+                return False, "Session authentication not allowed", True
+            
+            # Without a nonce two identical requests in one second would share a signature
+            if not nonce:
+                return False, "Session-signed requests need an X-Nonce header", True
+            
+            started = time.perf_counter()
+            verified = auth.verify_session_request(session_id, request.method, request.path,
+                                                   data, signature, timestamp, nonce)
+            metrics.AUTH_DURATION.observe(time.perf_counter() - started, 'session', 'ok' if verified else 'failed')
+            if not verified:
+                return False, "Invalid session signature or timestamp", True
+            
+            return True, None, True
         
         # Verify request
-        if not auth.verify_request(data, signature, timestamp):
-            return False, "Invalid signature or timestamp"
+        started = time.perf_counter()
+        verified = auth.verify_request(data, signature, timestamp, nonce)
+        metrics.AUTH_DURATION.observe(time.perf_counter() - started, 'rsa', 'ok' if verified else 'failed')
+        if not verified:
+            return False, "Invalid signature or timestamp", False
         
-        return True, None
+        return True, None, False
         
     except Exception as e:
         logger.error(f"Request verification failed: {e}")
-        return False, str(e)
+        return False, str(e), False
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -69,6 +142,55 @@ def health_check():
         'agent_version': '1.0.0'
     })
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics (unauthenticated, like /health)"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/auth/session', methods=['POST', 'DELETE'])
+def manage_session():
+    """Open a session key with an RSA-signed handshake, or revoke one"""
+    try:
+        if not Config.SESSION_AUTH_ENABLED:
+            return jsonify({
+                'success': False,
+                'error': 'Session authentication is disabled'
+            }), 404
+        
+        if request.method == 'DELETE':
+            if not verify_request()[0]:
+                return jsonify({'error': 'Authentication failed'}), 401
+            
+            revoked = auth.sessions.revoke(request.headers.get('X-Session-Id', ''))
+            return jsonify({
+                'success': revoked,
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        # New sessions always require a full RSA signature
+        if not verify_request(allow_session=False)[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        session = auth.create_session()
+        if not session:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to create session key'
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'data': session,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to manage session: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/services/status', methods=['GET'])
 def get_services_status():
     """Get status of all services"""
@@ -90,21 +212,107 @@ def get_services_status():
             'error': str(e)
         }), 500
 
+@app.route('/api/services/watch', methods=['GET'])
+def watch_services():
+    """Long-poll: wait until a monitored unit changes state after revision `since`"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        since = request.args.get('since', type=int)
+        timeout = request.args.get('timeout', 30.0, type=float)
+        if not math.isfinite(timeout):
+            return jsonify({
+                'success': False,
+                'error': 'timeout must be a finite number of seconds'
+            }), 400
+        timeout = min(max(timeout, 0.0), Config.SERVICE_WATCH_MAX_TIMEOUT)
+        # Every waiter holds a server thread; past the limit, ask the client to come back later
+        if since is not None and timeout > 0 and service_watcher.waiters >= Config.SERVICE_WATCH_MAX_WAITERS:
+            return jsonify({
+                'success': False,
+                'error': f'Too many watch requests waiting (limit {Config.SERVICE_WATCH_MAX_WAITERS})'
+            }), 429, {'Retry-After': '5'}
+        
+        return jsonify({
+            'success': True,
+            'data': service_watcher.wait(since, timeout),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to watch services: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/telemetry/stream', methods=['GET'])
+def stream_telemetry():
+    """Push metric and service-state deltas as server-sent events"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        interval = request.args.get('interval', type=float)
+        if interval is not None and not (math.isfinite(interval) and 0 < interval <= Config.TELEMETRY_MAX_INTERVAL):
+            return jsonify({
+                'success': False,
+                'error': f'interval must be between 0 and {Config.TELEMETRY_MAX_INTERVAL:g} seconds'
+            }), 400
+        
+        subscription = telemetry_hub.subscribe(interval)
+        if subscription is None:
+            return jsonify({
+                'success': False,
+                'error': f'Too many telemetry subscribers (limit {telemetry_hub.max_subscribers})'
+            }), 429, {'Retry-After': '5'}
+        
+        def frames():
+            for event, payload in subscription:
+                if event == 'heartbeat':
+                    yield ': keepalive\n\n'
+                else:
+                    yield f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+        
+        response = Response(
+            stream_with_context(frames()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        # Frees the slot even if the client leaves before the first frame
+        response.call_on_close(subscription.close)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Failed to stream telemetry: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/services/<service_name>/<action>', methods=['POST'])
 def manage_service(service_name, action):
-    """Start/stop/restart a service"""
+    """Start/stop/restart/reload a service"""
     try:
         if not verify_request()[0]:
             return jsonify({'error': 'Authentication failed'}), 401
         
-        if action not in ['start', 'stop', 'restart']:
+        if action not in ['start', 'stop', 'restart', 'reload']:
             return jsonify({
                 'success': False,
-                'error': 'Invalid action. Use start, stop, or restart'
+                'error': 'Invalid action. Use start, stop, restart, or reload'
             }), 400
         
-        command = f'systemctl {action} {service_name}'
-        result = command_executor.execute_command(command)
+        if action == 'reload':
+            result = command_executor.reload_scheduler.request_reload(service_name)
+        else:
+            command = f'systemctl {action} {service_name}'
+            result = command_executor.execute_command(command)
+        command_executor.service_monitor.invalidate()
         
         return jsonify({
             'success': result['success'],
@@ -119,6 +327,19 @@ def manage_service(service_name, action):
             'error': str(e)
         }), 500
 
+def inventory_response(data, etag):
+    """JSON response with an ETag, or 304 when the client already has this version"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({
+            'success': True,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        })
+    response.set_etag(etag)
+    return response
+
 @app.route('/api/apache2/sites', methods=['GET'])
 def get_apache2_sites():
     """Get list of Apache2 sites"""
@@ -126,12 +347,8 @@ def get_apache2_sites():
         if not verify_request()[0]:
             return jsonify({'error': 'Authentication failed'}), 401
         
-        sites = command_executor.get_apache2_sites()
-        return jsonify({
-            'success': True,
-            'data': sites,
-            'timestamp': datetime.now().isoformat()
-        })
+        sites, etag = command_executor.apache_inventory.snapshot('sites')
+        return inventory_response(sites, etag)
         
     except Exception as e:
         logger.error(f"Failed to get Apache2 sites: {e}")
@@ -169,12 +386,8 @@ def get_apache2_modules():
         if not verify_request()[0]:
             return jsonify({'error': 'Authentication failed'}), 401
         
-        modules = command_executor.get_apache2_modules()
-        return jsonify({
-            'success': True,
-            'data': modules,
-            'timestamp': datetime.now().isoformat()
-        })
+        modules, etag = command_executor.apache_inventory.snapshot('modules')
+        return inventory_response(modules, etag)
         
     except Exception as e:
         logger.error(f"Failed to get Apache2 modules: {e}")
@@ -205,6 +418,70 @@ def manage_apache2_module(module_name, action):
             'error': str(e)
         }), 500
 
+@app.route('/api/batch', methods=['POST'])
+def apply_batch():
+    """Apply several site/module/service operations with one Apache2 reload"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        data = request.get_json()
+        if not data or not isinstance(data.get('operations'), list):
+            return jsonify({
+                'success': False,
+                'error': 'Operations list is required'
+            }), 400
+        
+        if len(data['operations']) > Config.BATCH_MAX_OPERATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {Config.BATCH_MAX_OPERATIONS} operations per batch'
+            }), 400
+        
+        error = command_executor.validate_batch(data['operations'])
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        
+        result = command_executor.apply_batch(data['operations'])
+        
+        return jsonify({
+            'success': result['success'],
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to apply batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/php/versions', methods=['GET'])
+def get_php_versions():
+    """Get PHP information for every installed version"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        result = command_executor.get_all_php_info()
+        
+        return jsonify({
+            'success': result['success'],
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to get PHP versions: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/php/<version>/info', methods=['GET'])
 def get_php_info(version):
     """Get PHP information for specific version"""
@@ -249,6 +526,42 @@ def get_system_info():
             'error': str(e)
         }), 500
 
+@app.route('/api/system/processes', methods=['GET'])
+def get_processes():
+    """Top processes by CPU, memory or I/O, optionally filtered by user, name or service"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        limit = min(request.args.get('limit', 20, type=int), Config.PROCESS_MAX_LIMIT)
+        try:
+            data = command_executor.process_explorer.query(
+                sort=request.args.get('sort', 'cpu'),
+                limit=limit,
+                user=request.args.get('user'),
+                name=request.args.get('name'),
+                service=request.args.get('service'),
+                cgroup=request.args.get('cgroup')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to list processes: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/terminal/execute', methods=['POST'])
 def execute_terminal_command():
     """Execute terminal command"""
@@ -264,7 +577,9 @@ def execute_terminal_command():
             }), 400
         
         command = data['command']
-        timeout = data.get('timeout', 30)
+        timeout = command_timeout(data)
+        if timeout is None:
+            return invalid_timeout()
         
         result = command_executor.execute_command(command, timeout)
         
@@ -281,6 +596,148 @@ def execute_terminal_command():
             'error': str(e)
         }), 500
 
+def command_timeout(data):
+    """The request's command timeout in seconds, or None if it isn't a number in (0, COMMAND_MAX_TIMEOUT]"""
+    timeout = data.get('timeout', 30)
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+        return None
+    if not math.isfinite(timeout) or not 0 < timeout <= Config.COMMAND_MAX_TIMEOUT:
+        return None
+    return timeout
+
+def invalid_timeout():
+    return jsonify({
+        'success': False,
+        'error': f'timeout must be a number of seconds between 0 and {Config.COMMAND_MAX_TIMEOUT:g}'
+    }), 400
+
+def format_sse(event):
+    """Encode a stream_command event as a server-sent event frame"""
+    if event['type'] == 'heartbeat':
+        return ': keepalive\n\n'
+    
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/api/terminal/stream', methods=['POST'])
+def stream_terminal_command():
+    """Execute terminal command, streaming output as server-sent events"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        data = request.get_json()
+        if not data or 'command' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Command is required'
+            }), 400
+        
+        command = data['command']
+        timeout = command_timeout(data)
+        if timeout is None:
+            return invalid_timeout()
+        
+        events = command_executor.stream_command(command, timeout)
+        return Response(
+            stream_with_context(format_sse(event) for event in events),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Failed to stream terminal command: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def manage_jobs():
+    """Submit a background command job, or list known jobs"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        if request.method == 'GET':
+            return jsonify({
+                'success': True,
+                'data': [job.to_dict(include_output=False) for job in job_queue.list()],
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        data = request.get_json()
+        if not data or 'command' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Command is required'
+            }), 400
+        
+        timeout = command_timeout(data)
+        if timeout is None:
+            return invalid_timeout()
+        
+        try:
+            job = job_queue.submit(data['command'], timeout)
+        except QueueFull as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 503 if job_queue.closed else 429, {'Retry-After': '5'}
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': f"Command not allowed: {data['command']}"
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict(include_output=False),
+            'timestamp': datetime.now().isoformat()
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Failed to manage jobs: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def manage_job(job_id):
+    """Poll (optionally long-poll with ?wait=N) or cancel a background job"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        if request.method == 'DELETE':
+            job = job_queue.cancel(job_id)
+        else:
+            wait = min(request.args.get('wait', 0, type=float), Config.JOB_MAX_WAIT)
+            job = job_queue.get(job_id, wait=wait)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': f'Job not found: {job_id}'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to manage job {job_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/keys/generate', methods=['POST'])
 def generate_keys():
     """Generate new RSA key pair"""
@@ -309,6 +766,53 @@ def generate_keys():
             'error': str(e)
         }), 500
 
+@app.route('/api/profile', methods=['GET', 'POST', 'DELETE'])
+def manage_profile():
+    """Download the aggregated request profile, change the sample rate, or reset it"""
+    try:
+        if not Config.PROFILING_ENABLED:
+            return jsonify({
+                'success': False,
+                'error': 'Profiling is disabled'
+            }), 404
+        
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        top = min(max(request.args.get('top', 10, type=int), 1), Config.PROFILE_MAX_STACKS)
+        if request.method == 'DELETE':
+            profiler.reset()
+        elif request.method == 'POST':
+            data = request.get_json() or {}
+            sample_rate = data.get('sample_rate', profiler.sample_rate)
+            if not isinstance(sample_rate, (int, float)) or not 0 <= sample_rate <= 1:
+                return jsonify({
+                    'success': False,
+                    'error': 'sample_rate must be between 0 and 1'
+                }), 400
+            profiler.sample_rate = float(sample_rate)
+            logger.info(f"Profiling sample rate set to {sample_rate}")
+        elif request.args.get('format') == 'folded':
+            # Folded stacks, ready for flamegraph.pl or speedscope
+            return Response(
+                profiler.folded(),
+                mimetype='text/plain',
+                headers={'Content-Disposition': 'attachment; filename=agent-profile.folded'}
+            )
+        
+        return jsonify({
+            'success': True,
+            'data': profiler.summary(top),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to manage profile: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/config/apache2', methods=['GET', 'POST'])
 def manage_apache2_config():
     """Read or write Apache2 configuration"""
@@ -346,29 +850,30 @@ def manage_apache2_config():
                 }), 400
             
             try:
-                # Backup original config
-                backup_path = f"{Config.APACHE2_CONF}.backup.{int(time.time())}"
-                os.system(f'cp {Config.APACHE2_CONF} {backup_path}')
+                # Snapshot the current config into the backup store
+                with open(Config.APACHE2_CONF, 'rb') as f:
+                    previous = f.read()
+                backup = backup_store.snapshot(Config.APACHE2_CONF, previous, reason='before apache2 config update')
                 
                 # Write new config
-                with open(Config.APACHE2_CONF, 'w') as f:
-                    f.write(data['content'])
+                atomic_write(Config.APACHE2_CONF, data['content'].encode('utf-8'))
                 
                 # Test configuration
                 test_result = command_executor.execute_command('apache2ctl configtest')
                 if not test_result['success']:
-                    # Restore backup if config test fails
-                    os.system(f'cp {backup_path} {Config.APACHE2_CONF}')
+                    # Restore previous content if config test fails
+                    atomic_write(Config.APACHE2_CONF, previous)
                     return jsonify({
                         'success': False,
                         'error': f'Configuration test failed: {test_result["error"]}',
-                        'backup_restored': True
+                        'backup_restored': True,
+                        'backup': backup
                     }), 400
                 
                 return jsonify({
                     'success': True,
                     'message': 'Configuration updated successfully',
-                    'backup_file': backup_path,
+                    'backup': backup,
                     'timestamp': datetime.now().isoformat()
                 })
                 
@@ -385,6 +890,159 @@ def manage_apache2_config():
             'error': str(e)
         }), 500
 
+MANAGED_CONFIG_STATUS = {
+    'not_allowed': 403,
+    'not_found': 404,
+    'conflict': 412,
+    'invalid_patch': 422,
+    'precondition_required': 428,
+    'invalid': 400
+}
+
+def validate_managed_config(path):
+    """Run the service's own config check after a managed file was written"""
+    if path.startswith('/etc/apache2/'):
+        result = command_executor.execute_command('apache2ctl configtest')
+        return result['success'], f'Configuration test failed: {result["error"]}'
+    return True, None
+
+@app.route('/api/config/files', methods=['GET'])
+def list_managed_configs():
+    """List managed config files with their content hashes"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        return jsonify({
+            'success': True,
+            'data': config_store.list_files(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to list managed configs: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/config/file', methods=['GET', 'PUT', 'PATCH'])
+def manage_config_file():
+    """Conditional/ranged read, compare-and-swap write, or unified-diff patch of a managed file"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        path = request.args.get('path', '')
+        
+        if request.method == 'GET':
+            try:
+                data, digest = config_store.read(path)
+            except PermissionError as e:
+                return jsonify({'success': False, 'error': str(e)}), 403
+            except FileNotFoundError:
+                return jsonify({'success': False, 'error': f'File not found: {path}'}), 404
+            
+            # Raw content so If-None-Match (304) and Range (206) work natively
+            response = app.response_class(data, mimetype='text/plain')
+            response.set_etag(digest)
+            response.headers['X-Content-SHA256'] = digest
+            return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        
+        # Compressed GETs weaken the ETag (W/"..."); it still names the same content hash
+        tags = request.if_match.as_set(include_weak=True)
+        base_hash = tags.pop() if len(tags) == 1 else None
+        if request.method == 'PUT':
+            result = config_store.write(path, request.get_data(), base_hash, validate_managed_config)
+        else:
+            result = config_store.patch(path, request.get_data(as_text=True), base_hash, validate_managed_config)
+        
+        status = 200 if result['success'] else MANAGED_CONFIG_STATUS.get(result.get('code'), 400)
+        response = jsonify({
+            'success': result['success'],
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        })
+        if result.get('sha256'):
+            response.set_etag(result['sha256'])
+        return response, status
+        
+    except Exception as e:
+        logger.error(f"Failed to manage config file: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/config/backups', methods=['GET'])
+def list_config_backups():
+    """List backup versions of one config file, or of every backed-up file"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        path = request.args.get('path')
+        if path:
+            path = os.path.realpath(path)
+        
+        return jsonify({
+            'success': True,
+            'data': backup_store.list_versions(path),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Failed to list config backups: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/config/backups/restore', methods=['POST'])
+def restore_config_backup():
+    """Restore a backed-up version of a managed config file"""
+    try:
+        if not verify_request()[0]:
+            return jsonify({'error': 'Authentication failed'}), 401
+        
+        data = request.get_json() or {}
+        path = data.get('path')
+        digest = data.get('sha256')
+        if not path or not digest:
+            return jsonify({
+                'success': False,
+                'error': 'path and sha256 are required'
+            }), 400
+        
+        real_path = config_store.resolve(path)
+        if not real_path:
+            return jsonify({'success': False, 'error': f'Path is not a managed config file: {path}'}), 403
+        
+        content = backup_store.get(real_path, digest)
+        if content is None:
+            return jsonify({'success': False, 'error': f'No backup {digest} for {path}'}), 404
+        
+        try:
+            _, current_hash = config_store.read(real_path)
+        except FileNotFoundError:
+            current_hash = None
+        
+        # The current content is snapshotted by write(), so a restore can itself be undone
+        result = config_store.write(real_path, content, current_hash, validate_managed_config)
+        status = 200 if result['success'] else MANAGED_CONFIG_STATUS.get(result.get('code'), 400)
+        return jsonify({
+            'success': result['success'],
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        }), status
+        
+    except Exception as e:
+        logger.error(f"Failed to restore config backup: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.errorhandler(BadRequest)
 def handle_bad_request(e):
     return jsonify({
@@ -407,29 +1065,77 @@ def internal_error(e):
         'error': 'Internal server error'
     }), 500
 
+def shutdown():
+    """Gracefully stop the production server, draining in-flight requests and jobs"""
+    if framed_server is not None:
+        framed_server.shutdown()
+    
+    if production_server is None:
+        # Development mode exits right away: kill running jobs rather than orphan them
+        job_queue.shutdown(grace=0)
+        return False
+    
+    # Jobs drain alongside requests; main() waits for them before exiting
+    job_queue.close()
+    production_server.shutdown()
+    return True
+
+def warm_up():
+    """Do the deferred work (key parsing, psutil import) before the first request needs it"""
+    try:
+        auth.public_key
+        command_executor.system_metrics.prime()
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+
+def generate_missing_keys():
+    """Generate the RSA key pair off the serving path on first start"""
+    logger.info("Generating new RSA key pair...")
+    if not auth.generate_key_pair():
+        # Exit so the service manager sees the failure instead of an agent answering 401 forever
+        logger.error("Failed to generate RSA keys, exiting")
+        os._exit(1)
+    logger.info("RSA keys generated successfully")
+    warm_up()
+
 def main():
     """Main function to start the server agent"""
     try:
         # Create keys directory if it doesn't exist
         os.makedirs(os.path.dirname(Config.RSA_PRIVATE_KEY_PATH), exist_ok=True)
         
-        # Generate keys if they don't exist
+        # Generate keys if they don't exist; /health answers meanwhile and
+        # authenticated requests are refused until the key pair is written
         if not os.path.exists(Config.RSA_PRIVATE_KEY_PATH):
-            logger.info("Generating new RSA key pair...")
-            if auth.generate_key_pair():
-                logger.info("RSA keys generated successfully")
-            else:
-                logger.error("Failed to generate RSA keys")
-                sys.exit(1)
+            threading.Thread(target=generate_missing_keys, name='keygen', daemon=True).start()
+        else:
+            threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
         
         logger.info(f"Starting Server Agent on {Config.HOST}:{Config.PORT}")
         logger.info(f"RSA keys loaded from: {Config.RSA_PRIVATE_KEY_PATH}")
+        logger.info(f"Startup took {(time.perf_counter() - IMPORT_STARTED) * 1000:.0f} ms")
         
-        app.run(
-            host=Config.HOST,
-            port=Config.PORT,
-            debug=Config.DEBUG
-        )
+        if Config.FRAMED_ENABLED:
+            global framed_server
+            from framed_transport import FramedServer
+            framed_server = FramedServer(app, auth).start()
+        
+        if Config.SERVER_MODE == 'production':
+            global production_server
+            from production_server import ProductionServer
+            production_server = ProductionServer(app)
+            signal.signal(signal.SIGTERM, lambda signum, frame: shutdown())
+            try:
+                production_server.serve()
+            finally:
+                # Jobs run in their own sessions and would outlive the agent
+                job_queue.shutdown()
+        else:
+            app.run(
+                host=Config.HOST,
+                port=Config.PORT,
+                debug=Config.DEBUG
+            )
         
     except KeyboardInterrupt:
         logger.info("Server Agent stopped by user")
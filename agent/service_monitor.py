@@ -0,0 +1,139 @@
+import subprocess
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ServiceMonitor:
+    """Batched systemd unit probing with a short-lived status snapshot"""
+
+    PROPERTIES = ['Id', 'LoadState', 'ActiveState', 'SubState']
+
+    def __init__(self, services=None, ttl=None, timeout=None):
+        self.services = list(services or Config.MONITORED_SERVICES)
+        self.ttl = Config.SERVICE_STATUS_TTL if ttl is None else ttl
+        self.timeout = Config.SERVICE_PROBE_TIMEOUT if timeout is None else timeout
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def get_statuses(self, force=False):
+        """Return the cached snapshot, probing again once it is older than the TTL"""
+        with self._lock:
+            age = time.monotonic() - self._snapshot_time
+            if force or self._snapshot is None or age >= self.ttl:
+                self._snapshot = self.probe()
+                self._snapshot_time = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Drop the snapshot so the next read probes systemd again"""
+        with self._lock:
+            self._snapshot = None
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, callback):
+        """Call callback() whenever the snapshot is invalidated (a unit was just acted on)"""
+        self._listeners.append(callback)
+
+    def probe(self):
+        """Probe every monitored unit, batched in a single systemctl call"""
+        if not self.services:
+            return {}
+
+        try:
+            result = subprocess.run(
+                ['systemctl', 'show', '--no-pager',
+                 '--property=' + ','.join(self.PROPERTIES)] + self.services,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+            blocks = self._parse_show_output(result.stdout)
+            if len(blocks) == len(self.services):
+                return {
+                    service: self._build_status(service, props)
+                    for service, props in zip(self.services, blocks)
+                }
+            logger.warning("Batched systemctl show returned an unexpected unit count, probing units individually")
+        except subprocess.TimeoutExpired:
+            logger.warning("Batched systemctl show timed out, probing units individually")
+        except Exception as e:
+            logger.error(f"Batched service probe failed: {e}")
+
+        return self._probe_concurrently()
+
+    def _probe_concurrently(self):
+        """Probe each unit on its own thread so one hung unit cannot stall the rest"""
+        statuses = {}
+        executor = ThreadPoolExecutor(max_workers=len(self.services))
+        try:
+            futures = {executor.submit(self._probe_unit, service): service for service in self.services}
+            done, _ = wait(futures, timeout=self.timeout + 1)
+            for future, service in futures.items():
+                if future in done:
+                    statuses[service] = future.result()
+                else:
+                    statuses[service] = self._error_status(service, 'Probe deadline exceeded')
+        finally:
+            executor.shutdown(wait=False)
+        return statuses
+
+    def _probe_unit(self, service):
+        """Probe a single unit with its own deadline"""
+        try:
+            result = subprocess.run(
+                ['systemctl', 'show', '--no-pager',
+                 '--property=' + ','.join(self.PROPERTIES), service],
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+            blocks = self._parse_show_output(result.stdout)
+            if not blocks:
+                return self._error_status(service, result.stderr.strip() or 'No status returned')
+            return self._build_status(service, blocks[0])
+        except subprocess.TimeoutExpired:
+            return self._error_status(service, 'Status probe timeout')
+        except Exception as e:
+            logger.error(f"Failed to get service status for {service}: {e}")
+            return self._error_status(service, str(e))
+
+    @staticmethod
+    def _parse_show_output(output):
+        """Split `systemctl show` output into one property dict per unit"""
+        blocks = []
+        for chunk in output.strip().split('\n\n'):
+            props = {}
+            for line in chunk.splitlines():
+                key, sep, value = line.partition('=')
+                if sep:
+                    props[key] = value
+            if props:
+                blocks.append(props)
+        return blocks
+
+    @staticmethod
+    def _build_status(service, props):
+        status = props.get('ActiveState', 'unknown')
+        return {
+            'service': service,
+            'status': status,
+            'running': status == 'active',
+            'sub_state': props.get('SubState', ''),
+            'load_state': props.get('LoadState', '')
+        }
+
+    @staticmethod
+    def _error_status(service, error):
+        return {
+            'service': service,
+            'status': 'unknown',
+            'running': False,
+            'error': error
+        }
@@ -0,0 +1,234 @@
+import threading
+import time
+import logging
+from collections import deque
+from config import Config
+
+try:
+    from jeepney import DBusAddress, HeaderFields, MatchRule, new_method_call
+    from jeepney.bus_messages import message_bus
+    from jeepney.io.blocking import open_dbus_connection
+except ImportError:
+    open_dbus_connection = None
+
+logger = logging.getLogger(__name__)
+
+UNIT_SUFFIXES = ('.service', '.socket', '.timer', '.target', '.mount', '.path', '.slice', '.scope')
+
+def unit_object_path(service):
+    """systemd's D-Bus object path for a unit (bytes outside [A-Za-z0-9] become _xx)"""
+    if not service.endswith(UNIT_SUFFIXES):
+        service += '.service'
+    escaped = ''.join(c if c.isascii() and c.isalnum() else f'_{ord(c):02x}' for c in service)
+    return '/org/freedesktop/systemd1/unit/' + escaped
+
+class SystemdSignals:
+    """PropertiesChanged signals for a set of units from the system bus
+
+    systemd only emits unit signals while at least one client has called
+    Manager.Subscribe, so this connection subscribes for as long as it is open.
+    """
+
+    def __init__(self, services):
+        self.paths = {unit_object_path(service) for service in services}
+        self.connection = open_dbus_connection(bus='SYSTEM')
+        try:
+            manager = DBusAddress('/org/freedesktop/systemd1', bus_name='org.freedesktop.systemd1',
+                                  interface='org.freedesktop.systemd1.Manager')
+            self.connection.send_and_get_reply(new_method_call(manager, 'Subscribe'), timeout=5)
+            rule = MatchRule(
+                type='signal',
+                sender='org.freedesktop.systemd1',
+                interface='org.freedesktop.DBus.Properties',
+                member='PropertiesChanged',
+                path_namespace='/org/freedesktop/systemd1/unit'
+            )
+            self.connection.send_and_get_reply(message_bus.AddMatch(rule), timeout=5)
+        except Exception:
+            self.connection.close()
+            raise
+
+    def wait(self, timeout):
+        """True once a monitored unit changed, False if timeout passed first"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                message = self.connection.receive(timeout=remaining)
+            except TimeoutError:
+                return False
+            if message.header.fields.get(HeaderFields.path) in self.paths:
+                return True
+
+    def close(self):
+        self.connection.close()
+
+class ServiceWatcher:
+    """Shared change detection for service state long-polls
+
+    One background thread tracks the monitored units, however many clients
+    are waiting. It re-probes units when systemd signals a property change
+    (SERVICE_WATCH_SOURCE=dbus, needs the jeepney package) or every
+    SERVICE_WATCH_INTERVAL seconds (poll), and bumps a revision number for
+    each batch of changes. Waiters block on a condition until the revision
+    passes the one they last saw. The thread starts with the first waiter
+    and stops after SERVICE_WATCH_LINGER idle seconds.
+    """
+
+    def __init__(self, monitor, source=None, interval=None, resync=None, linger=None, history=256):
+        self.monitor = monitor
+        self.source = source or Config.SERVICE_WATCH_SOURCE
+        self.interval = interval or Config.SERVICE_WATCH_INTERVAL
+        self.resync = resync or Config.SERVICE_WATCH_RESYNC
+        self.linger = Config.SERVICE_WATCH_LINGER if linger is None else linger
+        # Revisions start at the boot time in ms, so they keep increasing across restarts
+        self.revision = int(time.time() * 1000)
+        self.states = None
+        self.ready = False
+        self.active_source = None
+        self._changes = deque(maxlen=history)
+        self._waiters = 0
+        self._last_waiter = time.monotonic()
+        self._thread = None
+        self._wake = threading.Event()
+        self._cond = threading.Condition()
+        monitor.add_listener(self.refresh)
+
+    def refresh(self):
+        """Probe again now (e.g. right after the agent started or stopped a unit)"""
+        self._wake.set()
+
+    def wait(self, since=None, timeout=30):
+        """Block until the revision passes since; returns the changes since then
+
+        Without since, or when since is unknown (too old, or from before a
+        restart), the full state is returned at once.
+        """
+        with self._cond:
+            self._waiters += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='service-watch', daemon=True)
+                self._thread.start()
+            try:
+                self._cond.wait_for(lambda: self.ready, timeout=self.monitor.timeout + 1)
+                if since is not None and self._known(since):
+                    self._cond.wait_for(lambda: self.revision > since, timeout=timeout)
+                return self._result(since)
+            finally:
+                self._waiters -= 1
+                self._last_waiter = time.monotonic()
+
+    @property
+    def waiters(self):
+        with self._cond:
+            return self._waiters
+
+    def _known(self, since):
+        if since == self.revision:
+            return True
+        return bool(self._changes) and self._changes[0][0] - 1 <= since < self.revision
+
+    def _result(self, since):
+        states = self.states or {}
+        if since is None or not self._known(since):
+            return {
+                'revision': self.revision,
+                'full': True,
+                'changed': sorted(states),
+                'services': dict(states),
+                'source': self.active_source
+            }
+
+        changed = sorted({service for revision, service in self._changes if revision > since})
+        return {
+            'revision': self.revision,
+            'full': False,
+            'changed': changed,
+            'services': {service: states[service] for service in changed if service in states},
+            'source': self.active_source
+        }
+
+    def _run(self):
+        signals = self._open_signals()
+        try:
+            self._probe()
+            while True:
+                with self._cond:
+                    if self._waiters == 0 and time.monotonic() - self._last_waiter >= self.linger:
+                        # The next waiter restarts the thread and waits for a fresh probe;
+                        # the old states remain the baseline for detecting changes meanwhile
+                        self._thread = None
+                        self.ready = False
+                        return
+
+                if signals is not None:
+                    try:
+                        changed = self._wait_for_signal(signals)
+                    except Exception as e:
+                        logger.warning(f"systemd signal connection failed, polling instead: {e}")
+                        signals.close()
+                        signals = None
+                        with self._cond:
+                            self.active_source = 'poll'
+                        changed = True
+                    if not changed:
+                        continue
+                else:
+                    self._wake.wait(self.interval)
+
+                self._wake.clear()
+                self._probe()
+        except Exception as e:
+            logger.error(f"Service watch stopped: {e}")
+            with self._cond:
+                self._thread = None
+                self.ready = False
+        finally:
+            if signals is not None:
+                signals.close()
+
+    def _wait_for_signal(self, signals):
+        """Wait for a unit signal, a refresh() or the resync interval; True when a probe is due"""
+        deadline = time.monotonic() + self.resync
+        while time.monotonic() < deadline:
+            if self._wake.is_set():
+                return True
+            if signals.wait(min(1.0, self.resync)):
+                # Let a burst of signals (stop, then start) settle into one probe
+                while signals.wait(0.05):
+                    pass
+                return True
+            if self._waiters == 0 and time.monotonic() - self._last_waiter >= self.linger:
+                return False
+        return True
+
+    def _open_signals(self):
+        source = 'poll'
+        signals = None
+        if self.source in ('auto', 'dbus') and open_dbus_connection is not None:
+            try:
+                signals = SystemdSignals(self.monitor.services)
+                source = 'dbus'
+            except Exception as e:
+                logger.warning(f"systemd signals unavailable, polling every {self.interval}s: {e}")
+        elif self.source == 'dbus':
+            logger.warning(f"jeepney is not installed, polling every {self.interval}s")
+        with self._cond:
+            self.active_source = source
+        return signals
+
+    def _probe(self):
+        statuses = self.monitor.probe()
+        with self._cond:
+            previous = self.states or {}
+            changed = [service for service, status in statuses.items() if previous.get(service) != status]
+            if self.states is not None and changed:
+                self.revision += 1
+                for service in changed:
+                    self._changes.append((self.revision, service))
+                logger.info(f"Service state changed: {', '.join(changed)}")
+            self.states = statuses
+            self.ready = True
+            self._cond.notify_all()
@@ -7,34 +7,102 @@ Can be used to run as a service or manually
 import os
 import sys
 import signal
+import argparse
+import importlib.util
 import subprocess
 from pathlib import Path
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     print(f"\nReceived signal {signum}, shutting down gracefully...")
+    
+    # In production mode let the server drain in-flight requests before exiting
+    server_agent = sys.modules.get('server_agent')
+    if server_agent and server_agent.shutdown():
+        return
+    
     sys.exit(0)
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Start the Server Agent')
+    parser.add_argument('--mode', choices=['development', 'production'],
+                        help='Serving mode (default: SERVER_MODE or development)')
+    parser.add_argument('--threads', type=int,
+                        help='Worker threads in production mode')
+    parser.add_argument('--connection-limit', type=int,
+                        help='Maximum open connections in production mode')
+    parser.add_argument('--import-report', action='store_true',
+                        help='Print how long importing the agent takes, by module, and exit')
+    parser.add_argument('--top', type=int, default=15,
+                        help='Modules listed by --import-report')
+    return parser.parse_args()
+
 def check_dependencies():
-    """Check if required packages are installed"""
+    """Check if required packages are installed (without importing them)"""
     required_packages = [
         'flask', 'cryptography', 'psutil'
     ]
+    optional_packages = {
+        'waitress': 'production mode',
+        'msgpack': 'msgpack framed transport codec',
+        'jeepney': 'systemd signals for service watch',
+        'zstandard': 'zstd response compression',
+        'brotli': 'brotli response compression'
+    }
     
-    missing_packages = []
-    for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
-            missing_packages.append(package)
+    missing_packages = [package for package in required_packages
+                        if importlib.util.find_spec(package) is None]
     
     if missing_packages:
         print(f"Missing required packages: {', '.join(missing_packages)}")
         print("Please install them using: pip install -r requirements.txt")
         return False
     
+    for package, feature in optional_packages.items():
+        if importlib.util.find_spec(package) is None:
+            print(f"Optional package {package} not installed ({feature} unavailable)")
+    
     return True
 
+def import_report(module='server_agent', top=15):
+    """Import a module in a fresh interpreter under -X importtime
+    
+    Returns (total_us, [(cumulative_us, self_us, name), ...]) with the slowest
+    modules first; total_us includes everything the module runs at import.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=Path(__file__).parent.absolute(),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    
+    modules = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative_us = int(cumulative_us)
+        # Leave out interpreter startup (site, encodings) and time only the module itself
+        if name.strip() == module:
+            total = cumulative_us
+        modules.append((cumulative_us, int(self_us), name.strip()))
+    
+    modules.sort(reverse=True)
+    return total, modules[:top]
+
+def print_import_report(top=15):
+    """Print the import-time report for server_agent"""
+    total, modules = import_report(top=top)
+    print(f"Importing server_agent: {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in modules:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
 def check_permissions():
     """Check if running with sufficient permissions"""
     if os.geteuid() != 0:
@@ -45,6 +113,12 @@ def check_permissions():
 
 def main():
     """Main startup function"""
+    args = parse_args()
+    
+    if args.import_report:
+        print_import_report(args.top)
+        return
+    
     # Set up signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
@@ -65,7 +139,16 @@ def main():
     # Start the agent
     try:
         print(f"Working directory: {os.getcwd()}")
-        print("Starting Server Agent on port 6969...")
+        
+        from config import Config
+        if args.mode:
+            Config.SERVER_MODE = args.mode
+        if args.threads:
+            Config.SERVER_THREADS = args.threads
+        if args.connection_limit:
+            Config.SERVER_CONNECTION_LIMIT = args.connection_limit
+        
+        print(f"Starting Server Agent on port {Config.PORT} ({Config.SERVER_MODE} mode)...")
         
         # Import and run the agent
         from server_agent import main as run_agent
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SystemMetrics:
+    """Structured system metrics read through psutil instead of forking df/free/uptime/ps
+
+    CPU utilisation is computed from this instance's own previous
+    cpu_times() sample rather than psutil.cpu_percent(), whose state is
+    shared by every caller in the process, so each consumer should hold its
+    own instance.
+    """
+
+    # Pseudo filesystems that carry no useful capacity information
+    IGNORED_FSTYPES = {
+        'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'pstore',
+        'securityfs', 'debugfs', 'tracefs', 'configfs', 'fusectl', 'mqueue',
+        'hugetlbfs', 'bpf', 'autofs', 'binfmt_misc', 'squashfs', 'overlay', 'nsfs'
+    }
+    # Docker's overlay mounts are noise, except the container's own root filesystem
+    ROOT_FSTYPES = {'overlay'}
+    # Already counted in user and nice on Linux
+    GUEST_FIELDS = ('guest', 'guest_nice')
+
+    def __init__(self, process_limit=20):
+        self.process_limit = process_limit
+        self._cpu_times = None
+        self._lock = threading.Lock()
+
+    def prime(self):
+        """Import psutil and take a CPU baseline so the next sample covers only the time since
+
+        Kept out of __init__: importing psutil adds ~30 ms to agent startup.
+        Without a baseline the first sample averages over the time since boot.
+        """
+        import psutil
+
+        with self._lock:
+            self._cpu_times = psutil.cpu_times(percpu=True)
+
+    def collect(self):
+        """Collect all metrics as plain numbers"""
+        return {
+            'cpu': self.get_cpu(),
+            'memory': self.get_memory(),
+            'disk': self.get_disk(),
+            'load': self.get_load(),
+            'uptime': self.get_uptime(),
+            'processes': self.get_processes()
+        }
+
+    def get_cpu(self):
+        """Overall and per-CPU utilisation since the previous sample"""
+        import psutil
+
+        current = psutil.cpu_times(percpu=True)
+        with self._lock:
+            previous, self._cpu_times = self._cpu_times, current
+
+        per_cpu = []
+        for index, cpu_times in enumerate(current):
+            before = previous[index] if previous and index < len(previous) else None
+            deltas = {
+                field: max(getattr(cpu_times, field) - (getattr(before, field) if before else 0.0), 0.0)
+                for field in cpu_times._fields
+            }
+            total = sum(value for field, value in deltas.items() if field not in self.GUEST_FIELDS)
+
+            def share(value):
+                return round(value / total * 100, 1) if total > 0 else 0.0
+
+            per_cpu.append({
+                'cpu': index,
+                'percent': share(max(total - deltas['idle'] - deltas.get('iowait', 0.0), 0.0)),
+                'user': share(deltas['user']),
+                'system': share(deltas['system']),
+                'idle': share(deltas['idle']),
+                'iowait': share(deltas.get('iowait', 0.0))
+            })
+
+        return {
+            'count': psutil.cpu_count() or len(per_cpu),
+            'percent': round(sum(cpu['percent'] for cpu in per_cpu) / len(per_cpu), 1) if per_cpu else 0.0,
+            'per_cpu': per_cpu
+        }
+
+    def get_memory(self):
+        """Physical memory and swap in bytes"""
+        import psutil
+
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return {
+            'total': memory.total,
+            'available': memory.available,
+            'used': memory.used,
+            'free': memory.free,
+            'buffers': getattr(memory, 'buffers', 0),
+            'cached': getattr(memory, 'cached', 0),
+            'percent': memory.percent,
+            'swap': {
+                'total': swap.total,
+                'used': swap.used,
+                'free': swap.free,
+                'percent': swap.percent
+            }
+        }
+
+    def get_disk(self):
+        """Per-mount usage via statvfs"""
+        import psutil
+
+        mounts = []
+        for partition in psutil.disk_partitions(all=False):
+            if partition.fstype in self.IGNORED_FSTYPES and not (
+                partition.mountpoint == '/' and partition.fstype in self.ROOT_FSTYPES
+            ):
+                continue
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except (PermissionError, OSError) as e:
+                logger.debug(f"Skipping mount {partition.mountpoint}: {e}")
+                continue
+            mounts.append({
+                'device': partition.device,
+                'mountpoint': partition.mountpoint,
+                'fstype': partition.fstype,
+                'total': usage.total,
+                'used': usage.used,
+                'free': usage.free,
+                'percent': usage.percent
+            })
+        return mounts
+
+    def get_load(self):
+        """1, 5 and 15 minute load averages"""
+        load1, load5, load15 = os.getloadavg()
+        return {
+            '1min': load1,
+            '5min': load5,
+            '15min': load15
+        }
+
+    def get_uptime(self):
+        """Seconds since boot"""
+        import psutil
+
+        boot_time = psutil.boot_time()
+        return {
+            'boot_time': boot_time,
+            'seconds': int(time.time() - boot_time)
+        }
+
+    def get_processes(self):
+        """Process counts and the largest processes by resident memory"""
+        import psutil
+
+        processes = []
+        states = {}
+        for proc in psutil.process_iter(['pid', 'name', 'username', 'status', 'memory_info']):
+            info = proc.info
+            states[info['status']] = states.get(info['status'], 0) + 1
+            memory_info = info['memory_info']
+            processes.append({
+                'pid': info['pid'],
+                'name': info['name'],
+                'user': info['username'],
+                'status': info['status'],
+                'rss': memory_info.rss if memory_info else 0
+            })
+
+        processes.sort(key=lambda p: p['rss'], reverse=True)
+        return {
+            'total': len(processes),
+            'states': states,
+            'top': processes[:self.process_limit]
+        }
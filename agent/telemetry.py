@@ -0,0 +1,150 @@
+import threading
+import time
+import logging
+from config import Config
+from system_metrics import SystemMetrics
+
+logger = logging.getLogger(__name__)
+
+def diff(previous, current):
+    """Fields of current that differ from previous; removed keys map to None
+
+    Dicts are compared recursively, everything else (including lists) is
+    compared as a whole value.
+    """
+    changes = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff(old, value)
+            if nested:
+                changes[key] = nested
+        elif key not in previous or old != value:
+            changes[key] = value
+    for key in previous:
+        if key not in current:
+            changes[key] = None
+    return changes
+
+class Subscription:
+    """One subscriber's slot in a TelemetryHub"""
+
+    def __init__(self, hub, interval, heartbeat):
+        self.hub = hub
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            yield from self.hub._frames(self.interval, self.heartbeat)
+        finally:
+            self.close()
+
+    def close(self):
+        """Give the slot back (safe to call more than once, or before iterating)"""
+        with self.hub._cond:
+            if not self.closed:
+                self.closed = True
+                self.hub._subscribers -= 1
+
+class TelemetryHub:
+    """Shared sampler that feeds every telemetry subscriber
+
+    One background thread samples metrics and service states at the
+    configured interval, however many subscribers are connected, and stops
+    when the last subscriber leaves. Each open stream holds a server thread,
+    so at most max_subscribers may be connected at once.
+    """
+
+    def __init__(self, executor, interval=None, max_subscribers=None):
+        self.executor = executor
+        self.interval = interval or Config.TELEMETRY_INTERVAL
+        self.max_subscribers = max_subscribers or Config.TELEMETRY_MAX_SUBSCRIBERS
+        # Own CPU baseline, so /api/system/info calls don't shorten the sampled window
+        self.system_metrics = SystemMetrics()
+        self.sample = None
+        self.seq = 0
+        self._subscribers = 0
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def collect(self):
+        metrics = self.system_metrics.collect()
+        # The top-process list changes on every sample; counts are enough for a live view
+        metrics['processes'] = {
+            key: value for key, value in metrics['processes'].items() if key != 'top'
+        }
+        return {
+            'metrics': metrics,
+            'services': self.executor.service_monitor.get_statuses()
+        }
+
+    def subscribe(self, interval=None, heartbeat=None):
+        """Reserve a subscriber slot, or None when max_subscribers streams are open
+
+        Iterate the returned subscription for ('snapshot'|'delta'|'heartbeat',
+        payload) frames; the slot is held until it is closed.
+        """
+        interval = max(interval or self.interval, self.interval)
+        heartbeat = heartbeat or Config.STREAM_HEARTBEAT_INTERVAL
+
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+                self._thread.start()
+
+        return Subscription(self, interval, heartbeat)
+
+    def _frames(self, interval, heartbeat):
+        last_sent = None
+        last_seq = 0
+        last_frame = time.monotonic()
+        next_due = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.seq > last_seq, timeout=heartbeat)
+                seq, sample = self.seq, self.sample
+
+            now = time.monotonic()
+            fresh = seq > last_seq
+            last_seq = seq
+            # Subscribers asking for a slower interval skip intermediate samples
+            if fresh and sample is not None and now >= next_due:
+                next_due = now + interval - self.interval / 2
+                if last_sent is None:
+                    yield 'snapshot', {'seq': seq, 'data': sample}
+                    last_sent, last_frame = sample, now
+                else:
+                    changes = diff(last_sent, sample)
+                    if changes:
+                        yield 'delta', {'seq': seq, 'changes': changes}
+                        last_sent, last_frame = sample, now
+
+            if now - last_frame >= heartbeat:
+                yield 'heartbeat', None
+                last_frame = now
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            with self._cond:
+                if self._subscribers == 0:
+                    # Don't hand a stale sample to the next subscriber
+                    self._thread = None
+                    self.sample = None
+                    return
+
+            try:
+                sample = self.collect()
+                with self._cond:
+                    self.sample = sample
+                    self.seq += 1
+                    self._cond.notify_all()
+            except Exception as e:
+                logger.error(f"Telemetry sampling failed: {e}")
+
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
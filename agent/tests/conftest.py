@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The agent is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Config is read at import time, so scratch paths must be set before any agent module loads
+WORKDIR = tempfile.mkdtemp(prefix='agent-tests-')
+os.environ.update({
+    'RSA_PRIVATE_KEY_PATH': os.path.join(WORKDIR, 'keys', 'private_key.pem'),
+    'RSA_PUBLIC_KEY_PATH': os.path.join(WORKDIR, 'keys', 'public_key.pem'),
+    'LOG_FILE': os.path.join(WORKDIR, 'logs', 'server-agent.log'),
+    'LOG_LEVEL': 'WARNING',
+    'BACKUP_DIR': os.path.join(WORKDIR, 'backups'),
+})
+
+@pytest.fixture
+def agent(monkeypatch):
+    """The server_agent module with request signing checks bypassed"""
+    import server_agent
+    monkeypatch.setattr(server_agent, 'verify_request', lambda *args, **kwargs: (True, None))
+    return server_agent
@@ -0,0 +1,87 @@
+import os
+import time
+
+from auth import RSAAuth, ReplayGuard
+from conftest import WORKDIR
+
+def make_auth(**options):
+    keys = os.path.join(WORKDIR, 'auth-keys')
+    auth = RSAAuth(os.path.join(keys, 'private_key.pem'), os.path.join(keys, 'public_key.pem'),
+                   replay_guard=ReplayGuard(window=300), **options)
+    if auth.public_key is None:
+        assert auth.generate_key_pair()
+    return auth
+
+def test_nonce_request_is_accepted_once():
+    auth = make_auth()
+    timestamp = str(int(time.time()))
+    signature = auth.sign_data(RSAAuth.build_message('{}', timestamp, 'n1'))
+    assert auth.verify_request('{}', signature, timestamp, 'n1')
+    assert not auth.verify_request('{}', signature, timestamp, 'n1')
+
+def test_require_nonce_rejects_legacy_signatures():
+    timestamp = str(int(time.time()))
+    assert make_auth().verify_request('{}', make_auth().sign_data('{}'), timestamp)
+    auth = make_auth(require_nonce=True)
+    assert not auth.verify_request('{}', auth.sign_data('{}'), timestamp)
+
+def test_verify_request_checks_a_signed_request_once():
+    import server_agent
+
+    if server_agent.auth.public_key is None:
+        assert server_agent.auth.generate_key_pair()
+    timestamp = str(int(time.time()))
+    headers = {
+        'X-Timestamp': timestamp,
+        'X-Nonce': 'once',
+        'X-Signature': server_agent.auth.sign_data(RSAAuth.build_message('', timestamp, 'once'))
+    }
+    # The profiler and the route both verify; the nonce must not count as replayed
+    with server_agent.app.test_request_context('/api/services/status', headers=headers):
+        assert server_agent.verify_request() == (True, None)
+        assert server_agent.verify_request() == (True, None)
+
+def test_missing_key_is_not_cached(tmp_path):
+    waiting = RSAAuth(str(tmp_path / 'private_key.pem'), str(tmp_path / 'public_key.pem'))
+    assert waiting.public_key is None
+
+    # Written by another process (or the keygen thread of another instance) later on
+    assert RSAAuth(str(tmp_path / 'private_key.pem'), str(tmp_path / 'public_key.pem')).generate_key_pair()
+    assert waiting.public_key is not None
+
+def test_failed_key_generation_exits(monkeypatch):
+    import server_agent
+
+    exits = []
+    monkeypatch.setattr(server_agent.auth, 'generate_key_pair', lambda: False)
+    monkeypatch.setattr(server_agent.os, '_exit', exits.append)
+    monkeypatch.setattr(server_agent, 'warm_up', lambda: None)
+
+    server_agent.generate_missing_keys()
+
+    assert exits == [1]
+
+def test_session_requests_need_a_nonce(monkeypatch):
+    import server_agent
+    from auth import SessionKeyStore
+
+    monkeypatch.setattr(server_agent.Config, 'SESSION_AUTH_ENABLED', True)
+    session_id, key, _ = server_agent.auth.sessions.create()
+    timestamp = str(int(time.time()))
+
+    def verify(nonce):
+        headers = {
+            'X-Session-Id': session_id,
+            'X-Timestamp': timestamp,
+            'X-Signature': SessionKeyStore.sign(key, SessionKeyStore.build_message(
+                'GET', '/api/services/status', timestamp, '', nonce or ''))
+        }
+        if nonce:
+            headers['X-Nonce'] = nonce
+        with server_agent.app.test_request_context('/api/services/status', headers=headers):
+            return server_agent.verify_request()
+
+    assert verify(None) == (False, 'Session-signed requests need an X-Nonce header')
+    # Identical polls in the same second differ by nonce, so both are accepted
+    assert verify('poll-1') == (True, None)
+    assert verify('poll-2') == (True, None)
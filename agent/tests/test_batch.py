@@ -0,0 +1,19 @@
+import pytest
+
+@pytest.mark.parametrize('operations', [
+    [{'type': 'site', 'name': 'a', 'action': 'enable'}, 'garbage'],
+    [{'type': 'site', 'name': 'a', 'action': 'enable'}, {'type': 'vhost', 'name': 'b', 'action': 'enable'}],
+    [{'type': 'site', 'name': 'a', 'action': 'enable'}, {'type': 'service', 'name': 'mysql', 'action': 'kill'}],
+    [{'type': 'site', 'name': 'a', 'action': 'enable'}, {'type': 'module', 'name': 'rewrite --force', 'action': 'enable'}],
+    [{'type': 'site', 'name': 'a', 'action': 'enable'}, {'type': 'site', 'action': 'enable'}],
+])
+def test_malformed_batch_is_rejected_before_anything_runs(agent, monkeypatch, operations):
+    executed = []
+    monkeypatch.setattr(agent.command_executor, 'execute_command',
+                        lambda command, timeout=30: executed.append(command) or {'success': True})
+
+    response = agent.app.test_client().post('/api/batch', json={'operations': operations})
+
+    assert response.status_code == 400
+    assert response.json['success'] is False
+    assert executed == []
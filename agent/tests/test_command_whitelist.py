@@ -0,0 +1,32 @@
+from command_whitelist import CommandWhitelist
+from config import Config
+
+def match(command):
+    return CommandWhitelist(Config.ALLOWED_COMMANDS).match(CommandWhitelist.split(command))
+
+def test_exact_entry_matches():
+    assert match('systemctl stop apache2') == 'apache2'
+    assert match('df -h') == 'system_info'
+
+def test_extra_unit_is_rejected():
+    assert match('systemctl stop apache2 ssh') is None
+    assert match('systemctl restart mysql sshd') is None
+
+def test_extra_flag_is_rejected():
+    assert match('systemctl stop apache2 --all') is None
+    assert match('df -h /') is None
+
+def test_partial_entry_is_rejected():
+    assert match('systemctl stop') is None
+    assert match('whoami') is None
+
+def test_argument_entries_take_arguments():
+    assert match('a2ensite example.com') == 'apache2'
+    assert match('apt install -y php8.4-curl') == 'package_management'
+    assert match('apt update -o foo') is None
+
+def test_exact_entry_wins_over_arguments():
+    whitelist = CommandWhitelist({'exact': ['tool run'], 'args': ['tool *']})
+    assert whitelist.match(['tool', 'run']) == 'exact'
+    assert whitelist.match(['tool', 'run', 'x']) == 'args'
+    assert whitelist.match(['tool']) == 'args'
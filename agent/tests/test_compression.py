@@ -0,0 +1,38 @@
+import gzip
+import io
+
+import pytest
+
+from compression import RequestDecompressor
+
+def echo(environ, start_response):
+    start_response('200 OK', [])
+    return [environ['wsgi.input'].read()]
+
+def post(body, encoding, length=True, terminated=False, max_size=1024):
+    environ = {
+        'HTTP_CONTENT_ENCODING': encoding,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': terminated
+    }
+    if length:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    statuses = []
+    result = RequestDecompressor(echo, max_size=max_size)(environ, lambda status, headers: statuses.append(status))
+    return statuses[0], b''.join(result)
+
+def test_brotli_bomb_is_rejected():
+    brotli = pytest.importorskip('brotli')
+    status, _ = post(brotli.compress(b'\0' * (64 * 1024 * 1024)), 'br')
+    assert status == '400 Bad Request'
+
+def test_brotli_body_within_limit_is_decoded():
+    brotli = pytest.importorskip('brotli')
+    assert post(brotli.compress(b'{"a": 1}'), 'br') == ('200 OK', b'{"a": 1}')
+
+def test_chunked_upload_is_read_to_the_end():
+    assert post(gzip.compress(b'hello'), 'gzip', length=False, terminated=True) == ('200 OK', b'hello')
+
+def test_body_without_length_or_terminated_input_needs_a_length():
+    status, _ = post(gzip.compress(b'hello'), 'gzip', length=False)
+    assert status == '411 Length Required'
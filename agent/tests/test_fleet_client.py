@@ -0,0 +1,59 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from auth import RSAAuth
+from conftest import WORKDIR
+from fleet_client import AgentClient
+
+@pytest.fixture(scope='module')
+def auth():
+    keys = os.path.join(WORKDIR, 'client-keys')
+    auth = RSAAuth(os.path.join(keys, 'private_key.pem'), os.path.join(keys, 'public_key.pem'))
+    assert auth.generate_key_pair()
+    return auth
+
+@pytest.fixture
+def silent_agent():
+    """A listener that reads each request and never answers; yields (url, received requests)"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+    received = []
+
+    def serve():
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+            received.append(connection.recv(65536))
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f'http://127.0.0.1:{server.getsockname()[1]}', received
+    server.close()
+
+def test_post_is_not_retried_after_read_timeout(auth, silent_agent):
+    url, received = silent_agent
+    client = AgentClient(url, auth, timeout=0.2, retries=2, backoff=0)
+    result = client.request('POST', '/api/terminal/execute', {'command': 'uptime'})
+    assert result['ok'] is False
+    assert result['attempts'] == 1
+    assert len(received) == 1
+
+def test_get_is_retried_after_read_timeout(auth, silent_agent):
+    url, received = silent_agent
+    client = AgentClient(url, auth, timeout=0.2, retries=2, backoff=0)
+    result = client.request('GET', '/api/services/status')
+    assert result['attempts'] == 3
+    assert len(received) == 3
+
+def test_post_is_retried_when_connection_is_refused(auth):
+    with socket.socket() as unused:
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+    client = AgentClient(f'http://127.0.0.1:{port}', auth, timeout=0.2, retries=2, backoff=0)
+    result = client.request('POST', '/api/terminal/execute', {'command': 'uptime'})
+    assert result['attempts'] == 3
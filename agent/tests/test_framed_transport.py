@@ -0,0 +1,57 @@
+import os
+import socket
+import time
+
+import pytest
+
+from auth import RSAAuth, ReplayGuard
+from conftest import WORKDIR
+from framed_transport import FramedClient, FramedServer
+
+@pytest.fixture
+def auth():
+    keys = os.path.join(WORKDIR, 'framed-keys')
+    auth = RSAAuth(os.path.join(keys, 'private_key.pem'), os.path.join(keys, 'public_key.pem'),
+                   replay_guard=ReplayGuard(window=300))
+    if auth.public_key is None:
+        assert auth.generate_key_pair()
+    return auth
+
+def serve(auth, **limits):
+    app = lambda environ, start_response: []
+    return FramedServer(app, auth, host='127.0.0.1', port=0, **limits).start()
+
+def idle_socket(server):
+    sock = socket.create_connection(('127.0.0.1', server.port))
+    sock.settimeout(2)
+    return sock
+
+def wait_for(condition):
+    deadline = time.monotonic() + 2
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_unauthenticated_sockets_do_not_take_connection_slots(auth):
+    server = serve(auth, max_connections=1, max_handshakes=1)
+    idle = idle_socket(server)
+    wait_for(lambda: server._handshaking)
+
+    # Past the handshake limit the socket is closed at once
+    refused = idle_socket(server)
+    assert refused.recv(1) == b''
+
+    idle.close()
+    wait_for(lambda: not server._handshaking)
+    with FramedClient('127.0.0.1', server.port, auth):
+        assert len(server._connections) == 1
+    refused.close()
+    server.shutdown()
+
+def test_connection_limit_applies_after_authentication(auth):
+    server = serve(auth, max_connections=1, max_handshakes=4)
+    idle = idle_socket(server)
+    with FramedClient('127.0.0.1', server.port, auth):
+        with pytest.raises(ConnectionError, match='Connection limit reached'):
+            FramedClient('127.0.0.1', server.port, auth).connect()
+    idle.close()
+    server.shutdown()
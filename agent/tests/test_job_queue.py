@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue, QueueFull
+
+class FakeExecutor:
+    """Runs 'sleep' until closed, like stream_command killing the process group"""
+
+    def __init__(self):
+        self.killed = []
+
+    def is_command_allowed(self, command):
+        return True
+
+    def get_command_category(self, command):
+        return 'system'
+
+    def stream_command(self, command, timeout, heartbeat=None):
+        try:
+            while command == 'sleep':
+                time.sleep(heartbeat)
+                yield {'type': 'heartbeat'}
+            yield {'type': 'exit', 'success': True, 'exit_code': 0}
+        finally:
+            if command == 'sleep':
+                self.killed.append(command)
+
+def test_submit_rejects_past_max_pending():
+    queue = JobQueue(FakeExecutor(), workers=1, max_pending=2)
+    running = queue.submit('sleep')
+    while running.state != 'running':
+        time.sleep(0.01)
+    queue.submit('true')
+    queue.submit('true')
+
+    with pytest.raises(QueueFull):
+        queue.submit('true')
+    queue.shutdown(grace=0)
+
+def test_shutdown_cancels_queued_jobs_and_kills_running_ones():
+    executor = FakeExecutor()
+    queue = JobQueue(executor, workers=1)
+    running = queue.submit('sleep')
+    while running.state != 'running':
+        time.sleep(0.01)
+    queued = queue.submit('true')
+
+    queue.shutdown(grace=0.2)
+
+    assert queued.state == 'cancelled'
+    assert running.state == 'cancelled'
+    assert executor.killed == ['sleep']
+    with pytest.raises(QueueFull):
+        queue.submit('true')
+
+def test_shutdown_lets_running_jobs_finish_within_grace():
+    queue = JobQueue(FakeExecutor(), workers=1)
+    job = queue.submit('true')
+    job.done.wait(5)
+
+    queue.shutdown(grace=5)
+
+    assert job.state == 'finished' and job.success is True
+
+def test_full_queue_answers_429(agent, monkeypatch):
+    def full(command, timeout=30):
+        raise QueueFull('Job queue is full')
+    monkeypatch.setattr(agent.job_queue, 'submit', full)
+
+    response = agent.app.test_client().post('/api/jobs', json={'command': 'uptime'})
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert response.json['success'] is False
+
+def test_oldest_finished_jobs_are_evicted_past_max_retained():
+    queue = JobQueue(FakeExecutor(), workers=1, max_retained=3)
+    jobs = [queue.submit('true') for _ in range(6)]
+    for job in jobs:
+        job.done.wait(5)
+
+    assert [job.id for job in queue.list()] == [job.id for job in jobs[-3:]]
+    queue.shutdown(grace=0)
@@ -0,0 +1,27 @@
+import os
+
+from managed_config import ManagedConfigStore
+from conftest import WORKDIR
+
+def test_compressed_get_then_put_with_echoed_etag(agent, monkeypatch):
+    sites = os.path.join(WORKDIR, 'sites')
+    os.makedirs(sites, exist_ok=True)
+    path = os.path.join(sites, 'example.conf')
+    with open(path, 'w') as f:
+        f.write('# example site\n' * 200)
+    monkeypatch.setattr(agent, 'config_store', ManagedConfigStore(
+        [os.path.join(sites, '*.conf')], backup_store=agent.backup_store))
+    client = agent.app.test_client()
+
+    response = client.get(f'/api/config/file?path={path}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.put(f'/api/config/file?path={path}', data=b'# rewritten\n', headers={'If-Match': etag})
+    assert response.status_code == 200
+    assert response.json['data']['previous_sha256'] == etag[len('W/"'):-1]
+
+    # The old ETag no longer matches the rewritten file
+    response = client.put(f'/api/config/file?path={path}', data=b'# again\n', headers={'If-Match': etag})
+    assert response.status_code == 412
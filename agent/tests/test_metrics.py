@@ -0,0 +1,29 @@
+import threading
+
+import metrics
+
+def run_threads(count, target):
+    for _ in range(count):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+def test_shards_of_exited_threads_are_retired():
+    counter = metrics.Counter('test_requests_total', 'Test counter', ('route',))
+    run_threads(2000, lambda: counter.inc('/health'))
+    assert len(counter._shards) <= 1
+    assert counter.values() == {('/health',): 2000}
+
+def test_histogram_totals_survive_retirement():
+    histogram = metrics.Histogram('test_duration_seconds', 'Test histogram', buckets=(0.1, 1.0))
+    run_threads(500, lambda: histogram.observe(0.5))
+    histogram.observe(2.0)
+    assert len(histogram._shards) <= 2
+    assert histogram.values() == {(): [0, 500, 1, 252.0]}
+
+def test_gauge_inc_and_dec_on_different_threads():
+    gauge = metrics.Gauge('test_in_flight', 'Test gauge')
+    run_threads(100, gauge.inc)
+    run_threads(100, gauge.dec)
+    assert gauge.values() == {(): 0}
+    assert 'test_in_flight 0' in gauge.render()
@@ -0,0 +1,49 @@
+import os
+import stat
+import textwrap
+
+from php_inventory import PhpInventory
+
+# Stands in for a PHP binary: warns on stdout like a missing extension would, then
+# reports memory_limit from whichever php.ini it was pointed at
+FAKE_PHP = textwrap.dedent('''\
+    #!/bin/sh
+    echo "PHP Warning:  PHP Startup: Unable to load dynamic library 'missing.so'"
+    if [ "$1" = "-c" ]; then
+        limit=128M; ini="$2"; scan="$PHP_INI_SCAN_DIR"
+    else
+        limit=-1; ini=cli; scan=""
+    fi
+    printf '{"release": "8.3.0", "version_info": "PHP 8.3.0", "modules": ["json"], "zend_modules": [], '
+    printf '"ini": {"memory_limit": "%s"}, "ini_file": "%s", "ini_scanned_files": "%s"}\\n' "$limit" "$ini" "$scan"
+''')
+
+def make_inventory(tmp_path, fpm=True):
+    bin_dir, conf_dir = tmp_path / 'bin', tmp_path / 'etc'
+    bin_dir.mkdir()
+    (conf_dir / '8.3' / 'cli').mkdir(parents=True)
+    if fpm:
+        (conf_dir / '8.3' / 'fpm').mkdir()
+        (conf_dir / '8.3' / 'fpm' / 'php.ini').write_text('memory_limit = 128M\n')
+    php = bin_dir / 'php8.3'
+    php.write_text(FAKE_PHP)
+    php.chmod(php.stat().st_mode | stat.S_IEXEC)
+    return PhpInventory(bin_dir=str(bin_dir), conf_dir=str(conf_dir))
+
+def test_cli_and_fpm_settings_are_reported_separately(tmp_path):
+    info = make_inventory(tmp_path).get_info('8.3')
+
+    assert info['success'] is True
+    assert info['sapi'] == 'cli'
+    assert info['ini']['memory_limit'] == '-1'
+    fpm_dir = os.path.join(tmp_path, 'etc', '8.3', 'fpm')
+    assert info['fpm']['sapi'] == 'fpm'
+    assert info['fpm']['ini']['memory_limit'] == '128M'
+    assert info['fpm']['ini_file'] == os.path.join(fpm_dir, 'php.ini')
+    assert info['fpm']['ini_scanned_files'] == [os.path.join(fpm_dir, 'conf.d')]
+
+def test_cli_only_build_has_no_fpm_section(tmp_path):
+    info = make_inventory(tmp_path, fpm=False).get_info('8.3')
+
+    assert info['success'] is True
+    assert 'fpm' not in info
@@ -0,0 +1,17 @@
+import pytest
+
+@pytest.fixture
+def client(agent, monkeypatch):
+    monkeypatch.setattr(agent.Config, 'PROFILING_ENABLED', True)
+    return agent.app.test_client()
+
+@pytest.mark.parametrize('query', ['top=abc', 'top=-5', 'top=100000'])
+def test_bad_top_is_clamped(client, query):
+    response = client.get(f'/api/profile?{query}')
+    assert response.status_code == 200
+    assert response.json['success'] is True
+
+@pytest.mark.parametrize('sample_rate', ['abc', None, 2])
+def test_bad_sample_rate_is_rejected(client, sample_rate):
+    response = client.post('/api/profile', json={'sample_rate': sample_rate})
+    assert response.status_code == 400
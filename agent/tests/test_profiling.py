@@ -0,0 +1,27 @@
+import time
+
+from flask import Flask, request
+
+import profiling
+
+def profiled_app():
+    app = Flask(__name__)
+    profiler = profiling.RequestProfiler(sample_rate=0, interval=0.001)
+    profiling.init_app(app, profiler, lambda: request.headers.get('X-Signature') == 'valid')
+
+    @app.route('/work')
+    def work():
+        time.sleep(0.02)
+        return 'done'
+
+    return app.test_client(), profiler
+
+def test_profile_header_requires_a_verified_request():
+    client, profiler = profiled_app()
+
+    client.get('/work', headers={'X-Profile': '1'}).close()
+    client.get('/work', headers={'X-Profile': '1', 'X-Signature': 'forged'}).close()
+    assert profiler.routes == {}
+
+    client.get('/work', headers={'X-Profile': '1', 'X-Signature': 'valid'}).close()
+    assert profiler.routes['/work']['requests'] == 1
@@ -0,0 +1,22 @@
+def test_watch_past_the_waiter_limit_answers_429(agent, monkeypatch):
+    monkeypatch.setattr(agent.Config, 'SERVICE_WATCH_MAX_WAITERS', 0)
+    waits = []
+    monkeypatch.setattr(agent.service_watcher, 'wait', lambda since, timeout: waits.append(since) or {})
+    client = agent.app.test_client()
+
+    response = client.get('/api/services/watch?since=1&timeout=30')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert waits == []
+
+    # Fetching the current state never waits, so it is always served
+    assert client.get('/api/services/watch').status_code == 200
+
+def test_non_finite_timeout_is_rejected(agent, monkeypatch):
+    waits = []
+    monkeypatch.setattr(agent.service_watcher, 'wait', lambda since, timeout: waits.append(timeout) or {})
+    client = agent.app.test_client()
+
+    for timeout in ('nan', 'inf', '-inf'):
+        assert client.get(f'/api/services/watch?since=1&timeout={timeout}').status_code == 400
+    assert waits == []
@@ -0,0 +1,37 @@
+from collections import namedtuple
+
+import psutil
+
+from system_metrics import SystemMetrics
+
+cputimes = namedtuple('scputimes', 'user nice system idle iowait guest guest_nice')
+partition = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+usage = namedtuple('sdiskusage', 'total used free percent')
+
+def test_each_instance_keeps_its_own_cpu_baseline(monkeypatch):
+    samples = iter([
+        [cputimes(10, 0, 10, 80, 0, 0, 0)],
+        [cputimes(10, 0, 10, 80, 0, 0, 0)],
+        [cputimes(60, 0, 10, 130, 0, 0, 0)],
+        [cputimes(60, 0, 10, 230, 0, 0, 0)],
+    ])
+    monkeypatch.setattr(psutil, 'cpu_times', lambda percpu: next(samples))
+    info, telemetry = SystemMetrics(), SystemMetrics()
+    info.prime()
+    telemetry.prime()
+
+    # Another consumer sampling in between does not reset telemetry's window
+    assert info.get_cpu()['percent'] == 50.0
+    cpu = telemetry.get_cpu()
+    assert cpu['percent'] == 25.0
+    assert cpu['per_cpu'][0]['user'] == 25.0
+
+def test_overlay_is_only_kept_as_the_root_filesystem(monkeypatch):
+    monkeypatch.setattr(psutil, 'disk_partitions', lambda all: [
+        partition('overlay', '/', 'overlay', 'rw'),
+        partition('overlay', '/var/lib/docker/overlay2/abc/merged', 'overlay', 'rw'),
+        partition('/dev/sda1', '/boot', 'ext4', 'rw'),
+    ])
+    monkeypatch.setattr(psutil, 'disk_usage', lambda path: usage(100, 50, 50, 50.0))
+
+    assert [mount['mountpoint'] for mount in SystemMetrics().get_disk()] == ['/', '/boot']
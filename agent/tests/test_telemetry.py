@@ -0,0 +1,41 @@
+from telemetry import TelemetryHub
+
+class FakeHub(TelemetryHub):
+    def collect(self):
+        return {'metrics': {'cpu': self.seq}, 'services': {}}
+
+def test_subscribers_past_the_limit_are_refused():
+    hub = FakeHub(executor=None, interval=0.01, max_subscribers=1)
+    first = hub.subscribe()
+
+    assert hub.subscribe() is None
+    first.close()
+    first.close()
+    assert hub.subscribe() is not None
+
+def test_slot_is_released_when_the_stream_ends():
+    hub = FakeHub(executor=None, interval=0.01, max_subscribers=1)
+    frames = iter(hub.subscribe(heartbeat=1))
+
+    event, payload = next(frames)
+    assert event == 'snapshot'
+    frames.close()
+
+    assert hub.subscribe() is not None
+
+def test_stream_answers_429_when_full(agent, monkeypatch):
+    monkeypatch.setattr(agent.telemetry_hub, 'subscribe', lambda interval=None: None)
+
+    response = agent.app.test_client().get('/api/telemetry/stream')
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+
+def test_stream_rejects_bad_intervals(agent, monkeypatch):
+    subscribed = []
+    monkeypatch.setattr(agent.telemetry_hub, 'subscribe', lambda interval=None: subscribed.append(interval))
+    client = agent.app.test_client()
+
+    for interval in ('nan', 'inf', '0', '-5', '100000'):
+        assert client.get(f'/api/telemetry/stream?interval={interval}').status_code == 400
+    assert subscribed == []
@@ -0,0 +1,30 @@
+import pytest
+
+@pytest.mark.parametrize('path', ['/api/terminal/stream', '/api/terminal/execute', '/api/jobs'])
+@pytest.mark.parametrize('timeout', ['30', None, -1, 0, True, 10 ** 9])
+def test_bad_timeout_is_rejected_before_running(agent, monkeypatch, path, timeout):
+    started = []
+    monkeypatch.setattr(agent.command_executor, 'stream_command', lambda *args: started.append(args))
+    monkeypatch.setattr(agent.command_executor, 'execute_command', lambda *args: started.append(args))
+    monkeypatch.setattr(agent.job_queue, 'submit', lambda *args: started.append(args))
+
+    response = agent.app.test_client().post(path, json={'command': 'uptime', 'timeout': timeout})
+
+    assert response.status_code == 400
+    assert response.json['success'] is False
+    assert started == []
+
+def test_non_finite_timeout_is_rejected(agent):
+    response = agent.app.test_client().post(
+        '/api/terminal/stream', data='{"command": "uptime", "timeout": NaN}', content_type='application/json'
+    )
+    assert response.status_code == 400
+
+def test_valid_timeout_streams_to_an_exit_frame(agent, monkeypatch):
+    monkeypatch.setattr(agent.command_executor, 'stream_command',
+                        lambda command, timeout: iter([{'type': 'exit', 'success': True, 'exit_code': 0}]))
+
+    response = agent.app.test_client().post('/api/terminal/stream', json={'command': 'uptime', 'timeout': 2.5})
+
+    assert response.status_code == 200
+    assert b'event: exit' in response.data